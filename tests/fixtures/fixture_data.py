@@ -9,6 +9,9 @@ from posts.models import Post, Group
 def mock_media(settings):
     with tempfile.TemporaryDirectory() as temp_directory:
         settings.MEDIA_ROOT = temp_directory
+        # Миниатюры готовятся синхронно: фоновый поток не должен писать
+        # во временный MEDIA_ROOT, который уже удаляется.
+        settings.THUMBNAIL_WORKERS = 0
         yield temp_directory
 
 
@@ -0,0 +1,8 @@
+"""Локальный кеш процесса с учётом попаданий в метриках запроса."""
+from django.core.cache.backends import locmem
+
+from core.instrumentation import InstrumentedCacheMixin
+
+
+class LocMemCache(InstrumentedCacheMixin, locmem.LocMemCache):
+    pass
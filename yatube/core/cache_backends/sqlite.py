@@ -0,0 +1,243 @@
+"""Кеш в файле SQLite, общий для всех процессов на одном хосте.
+
+В отличие от LocMemCache, запись из одного воркера gunicorn сразу видна
+остальным, поэтому сброс версий лент доходит до всех процессов.
+"""
+import itertools
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from core.instrumentation import InstrumentedCacheMixin
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL'
+    ')',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+)
+
+# Время последнего обращения обновляется не чаще раза в секунду, чтобы
+# горячие ключи не превращали каждое чтение в запись.
+ACCESS_RESOLUTION = 1.0
+# COUNT(*) по таблице кеша стоит O(n), поэтому переполнение проверяется
+# не на каждой записи, а раз в столько записей процесса (OPTIONS
+# CULL_EVERY). Между проверками кеш может ненадолго превысить
+# MAX_ENTRIES.
+CULL_EVERY = 100
+
+
+class SQLiteCache(InstrumentedCacheMixin, BaseCache):
+    """Кеш с вытеснением давно не читанных ключей (LRU).
+
+    Целые числа хранятся как INTEGER, поэтому ``incr`` выполняется одним
+    UPDATE внутри транзакции и атомарен между процессами.
+    """
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = os.path.abspath(location)
+        self._local = threading.local()
+        options = params.get('OPTIONS', {})
+        self._cull_every = max(1, int(options.get('CULL_EVERY', CULL_EVERY)))
+        self._writes = itertools.count(1)
+
+    @property
+    def _connection(self):
+        # Соединение SQLite нельзя передавать через fork и между потоками.
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.connection = self._connect()
+            local.pid = os.getpid()
+        return local.connection
+
+    def _connect(self):
+        directory = os.path.dirname(self._path)
+        os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            self._path, timeout=30, isolation_level=None,
+            check_same_thread=False,
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        for statement in SCHEMA:
+            connection.execute(statement)
+        return connection
+
+    def _encode(self, value):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _decode(self, value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _write(self, sql, params=()):
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = connection.execute(sql, params)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return cursor.rowcount
+
+    def _fetch(self, key, now):
+        row = self._connection.execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?',
+            (key,),
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            return None
+        if now - row[2] > ACCESS_RESOLUTION:
+            self._write(
+                'UPDATE cache SET accessed = ? WHERE key = ?', (now, key)
+            )
+        return row
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._fetch(key, time.time())
+        if row is None:
+            return default
+        return self._decode(row[0])
+
+    def get_many(self, keys, version=None):
+        found = {}
+        now = time.time()
+        for original in keys:
+            key = self.make_key(original, version=version)
+            self.validate_key(key)
+            row = self._fetch(key, now)
+            if row is not None:
+                found[original] = self._decode(row[0])
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._write(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?)',
+            (key, self._encode(value), self.get_backend_timeout(timeout),
+             time.time()),
+        )
+        self._maybe_cull()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, now),
+            )
+            added = connection.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?)',
+                (key, self._encode(value), self.get_backend_timeout(timeout),
+                 now),
+            ).rowcount
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        if added:
+            self._maybe_cull()
+        return bool(added)
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            updated = connection.execute(
+                'UPDATE cache SET value = value + ?, accessed = ? '
+                'WHERE key = ? AND typeof(value) = \'integer\' '
+                'AND (expires IS NULL OR expires > ?)',
+                (delta, now, key, now),
+            ).rowcount
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        if not updated:
+            raise ValueError(f"Key '{key}' not found")
+        return row[0]
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        return bool(self._write(
+            'UPDATE cache SET expires = ?, accessed = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), now, key, now),
+        ))
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._write('DELETE FROM cache WHERE key = ?', (key,))
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._fetch(key, time.time()) is not None
+
+    def clear(self):
+        self._write('DELETE FROM cache')
+
+    def _maybe_cull(self):
+        if next(self._writes) % self._cull_every == 0:
+            self._cull()
+
+    def _cull(self):
+        """Удаляет просроченные ключи, а при переполнении — давно
+        не читанные."""
+        total = self._connection.execute(
+            'SELECT COUNT(*) FROM cache'
+        ).fetchone()[0]
+        if total <= self._max_entries:
+            return
+        self._write('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        total = self._connection.execute(
+            'SELECT COUNT(*) FROM cache'
+        ).fetchone()[0]
+        if total <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            self.clear()
+            return
+        excess = (total - self._max_entries
+                  + self._max_entries // self._cull_frequency)
+        self._write(
+            'DELETE FROM cache WHERE key IN ('
+            ' SELECT key FROM cache ORDER BY accessed LIMIT ?'
+            ')',
+            (excess,),
+        )
+
+    def close(self, **kwargs):
+        # Соединение живёт весь срок процесса, как и сам кеш.
+        pass
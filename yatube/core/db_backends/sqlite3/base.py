@@ -0,0 +1,34 @@
+"""SQLite с настройкой каждого нового соединения.
+
+В ``OPTIONS`` базы, помимо параметров ``sqlite3.connect``:
+
+* ``pragmas`` — PRAGMA, выполняемые при открытии соединения: журнал WAL,
+  при котором читатели не ждут писателя, ``busy_timeout``, ``mmap_size``
+  и ``cache_size``. Вместе с ``CONN_MAX_AGE`` соединение и его кеш
+  страниц живут между запросами воркера;
+* ``transaction_mode`` — как начинать транзакции ``atomic``. Отложенная
+  транзакция, которая сначала читает, а потом пишет, при занятой
+  блокировке записи сразу падает с «database is locked», не дожидаясь
+  ``busy_timeout``; ``IMMEDIATE`` берёт блокировку записи в начале
+  и ждёт её.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        pragmas = self.settings_dict['OPTIONS'].get('pragmas', {})
+        for name, value in pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
@@ -0,0 +1,121 @@
+"""Чтение с реплик базы.
+
+Представления, помеченные ``reads_replica``, читают со случайной реплики
+из ``DATABASE_REPLICAS``; всё остальное, включая любые записи, идёт в
+основную базу. Реплики отстают от основной базы, поэтому пользователь,
+который что-то записал в представлении с ``writes_primary``, ещё
+``REPLICA_STICKY_SECONDS`` читает с основной: свой пост или комментарий
+он видит сразу. Метка хранится в общем кеше, поэтому действует во всех
+воркерах.
+
+Фрагменты лент, отрендеренные по реплике, не должны попасть к тому, кто
+читает с основной базы, и не должны пережить следующую синхронизацию:
+``fragment_tag`` добавляет к их ключам поколение реплик, которое
+увеличивает ``sync_replicas``.
+"""
+import contextvars
+import functools
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+GENERATION_KEY = 'replica-generation'
+SAFE_METHODS = ('GET', 'HEAD')
+
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+# Модели, записанные в текущем представлении с ``writes_primary``.
+_writes = contextvars.ContextVar('writes', default=None)
+
+
+def sticky_key(user_id):
+    return f'replica-sticky:{user_id}'
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        writes = _writes.get()
+        if writes is not None:
+            writes.add(model._meta.label)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы: объекты с любой из них связаны.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема приходит на реплики вместе с данными.
+        return db == DEFAULT_DB_ALIAS
+
+
+def reads_replica(view):
+    """Читает запросы GET представления с реплики, если пользователь
+    недавно ничего не писал."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or request.method not in SAFE_METHODS:
+            return view(request, *args, **kwargs)
+        # Сессия и пользователь читаются с основной базы: новой сессии
+        # на реплике ещё может не быть.
+        user = request.user
+        if user.is_authenticated and cache.get(sticky_key(user.pk)):
+            return view(request, *args, **kwargs)
+        token = _read_alias.set(random.choice(replicas))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+    return wrapper
+
+
+def writes_primary(view):
+    """Если представление что-то записало, пользователь какое-то время
+    читает с основной базы, пока реплики не догонят его запись.
+
+    Записи замечает роутер, поэтому GET формы или повторная подписка без
+    изменений не привязывают пользователя к основной базе.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        writes = set()
+        token = _writes.set(writes)
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            _writes.reset(token)
+        if (
+            writes and settings.DATABASE_REPLICAS
+            and request.user.is_authenticated
+        ):
+            cache.set(
+                sticky_key(request.user.pk), True,
+                settings.REPLICA_STICKY_SECONDS,
+            )
+        return response
+    return wrapper
+
+
+def using_replica():
+    """Читает ли текущее представление с реплики."""
+    return _read_alias.get() is not None
+
+
+def fragment_tag():
+    """Часть ключа фрагмента: поколение реплик при чтении с реплики."""
+    if not using_replica():
+        return ''
+    return f'replica-{cache.get(GENERATION_KEY, 0)}'
+
+
+def advance_generation():
+    """Отмечает синхронизацию реплик: старые фрагменты по ним устарели."""
+    cache.add(GENERATION_KEY, 0, None)
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
@@ -0,0 +1,211 @@
+"""Замеры производительности запросов.
+
+На время запроса InstrumentationMiddleware заводит объект Metrics.
+SQL, рендер шаблонов и обращения к кешу записывают в него свои
+замеры; после ответа метрики попадают в заголовок Server-Timing и в
+гистограммы по представлениям. Гистограммы живут в памяти процесса
+и показываются администраторам на /admin/instrumentation/.
+"""
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+
+# Верхние границы корзин гистограмм времени, мс.
+TIME_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+# Верхние границы корзин гистограммы числа SQL-запросов.
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class Metrics:
+    __slots__ = (
+        'start', 'total', 'sql_count', 'sql_time', 'template_time',
+        'cache_hits', 'cache_misses', 'cache_paused',
+    )
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.total = 0.0
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_paused = False
+
+    def finish(self):
+        self.total = time.perf_counter() - self.start
+
+    def server_timing(self):
+        return ', '.join((
+            f'app;dur={self.total * 1000:.1f}',
+            f'db;dur={self.sql_time * 1000:.1f};'
+            f'desc="{self.sql_count} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="hit={self.cache_hits} miss={self.cache_misses}"',
+        ))
+
+
+def current():
+    return _current.get()
+
+
+@contextlib.contextmanager
+def collect():
+    """Собирает метрики внутри блока."""
+    metrics = Metrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        metrics.finish()
+        _current.reset(token)
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    """Обёртка для ``connection.execute_wrapper``: время и число запросов."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_time += time.perf_counter() - start
+        metrics.sql_count += 1
+
+
+@contextlib.contextmanager
+def template_timer():
+    metrics = _current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.template_time += time.perf_counter() - start
+
+
+class InstrumentedCacheMixin:
+    """Считает попадания и промахи кеша в метриках запроса."""
+
+    def get(self, key, default=None, version=None):
+        missing = object()
+        value = super().get(key, missing, version=version)
+        metrics = _current.get()
+        if metrics is not None and not metrics.cache_paused:
+            if value is missing:
+                metrics.cache_misses += 1
+            else:
+                metrics.cache_hits += 1
+        return default if value is missing else value
+
+    def get_many(self, keys, version=None):
+        # Базовый get_many вызывает get для каждого ключа: чтобы не
+        # посчитать ключи дважды, на это время учёт в get отключается.
+        keys = list(keys)
+        metrics = _current.get()
+        if metrics is None or metrics.cache_paused:
+            return super().get_many(keys, version=version)
+        metrics.cache_paused = True
+        try:
+            found = super().get_many(keys, version=version)
+        finally:
+            metrics.cache_paused = False
+        metrics.cache_hits += len(found)
+        metrics.cache_misses += len(keys) - len(found)
+        return found
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def buckets(self):
+        labels = [f'≤{bound}' for bound in self.bounds]
+        labels.append(f'>{self.bounds[-1]}')
+        return list(zip(labels, self.counts))
+
+    @property
+    def mean(self):
+        return self.sum / self.total if self.total else 0.0
+
+
+class ViewStats:
+    METRICS = (
+        ('total', 'Время ответа, мс', TIME_BUCKETS),
+        ('sql_time', 'Время SQL, мс', TIME_BUCKETS),
+        ('sql_count', 'Число SQL-запросов', COUNT_BUCKETS),
+        ('template_time', 'Рендер шаблонов, мс', TIME_BUCKETS),
+    )
+
+    def __init__(self):
+        self.histograms = {
+            name: Histogram(bounds) for name, _, bounds in self.METRICS
+        }
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add(self, metrics):
+        self.histograms['total'].add(metrics.total * 1000)
+        self.histograms['sql_time'].add(metrics.sql_time * 1000)
+        self.histograms['sql_count'].add(metrics.sql_count)
+        self.histograms['template_time'].add(metrics.template_time * 1000)
+        self.cache_hits += metrics.cache_hits
+        self.cache_misses += metrics.cache_misses
+
+    @property
+    def requests(self):
+        return self.histograms['total'].total
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'histograms': {
+                name: {
+                    'title': title,
+                    'mean': round(self.histograms[name].mean, 3),
+                    'buckets': self.histograms[name].buckets(),
+                }
+                for name, title, _ in self.METRICS
+            },
+        }
+
+
+_lock = threading.Lock()
+_views = {}
+
+
+def record(view_name, metrics):
+    with _lock:
+        stats = _views.get(view_name)
+        if stats is None:
+            stats = _views[view_name] = ViewStats()
+        stats.add(metrics)
+
+
+def snapshot():
+    """Гистограммы по представлениям, от самых частых к редким."""
+    with _lock:
+        views = sorted(
+            _views.items(), key=lambda item: item[1].requests, reverse=True
+        )
+        return {name: stats.as_dict() for name, stats in views}
+
+
+def reset():
+    with _lock:
+        _views.clear()
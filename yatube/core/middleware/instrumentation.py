@@ -0,0 +1,32 @@
+import contextlib
+
+from django.db import connections
+
+from core import instrumentation
+
+
+class InstrumentationMiddleware:
+    """Замеряет запрос: общее время, SQL, шаблоны и кеш.
+
+    Результат уходит в заголовок Server-Timing и в гистограммы
+    представления. Должен стоять первым в MIDDLEWARE, чтобы учесть
+    время остальных middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with instrumentation.collect() as metrics:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(
+                        instrumentation.sql_wrapper
+                    ))
+                response = self.get_response(request)
+        response['Server-Timing'] = metrics.server_timing()
+        match = request.resolver_match
+        instrumentation.record(
+            match.view_name if match else 'unresolved', metrics
+        )
+        return response
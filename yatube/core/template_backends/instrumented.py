@@ -0,0 +1,57 @@
+"""Шаблонизатор Django, замеряющий время рендера для Server-Timing."""
+import logging
+import os
+
+from django.template import TemplateDoesNotExist, TemplateSyntaxError
+from django.template.backends import django as django_backend
+from django.template.backends.django import reraise
+
+from core.instrumentation import template_timer
+
+logger = logging.getLogger(__name__)
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        with template_timer():
+            return super().render(context, request)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+    def template_names(self):
+        """Имена всех шаблонов из каталогов загрузчиков."""
+        names = set()
+        for loader in self.engine.template_loaders:
+            # Кеширующий загрузчик сам файлов не ищет.
+            for inner in getattr(loader, 'loaders', [loader]):
+                for directory in inner.get_dirs():
+                    for root, _, files in os.walk(directory):
+                        names.update(
+                            os.path.relpath(os.path.join(root, name),
+                                            directory)
+                            for name in files
+                        )
+        return sorted(names)
+
+    def precompile(self):
+        """Заранее компилирует все шаблоны в кеш загрузчика, чтобы
+        первые запросы воркера не разбирали их. Возвращает число
+        скомпилированных шаблонов."""
+        compiled = 0
+        for name in self.template_names():
+            try:
+                self.engine.get_template(name)
+            except (TemplateSyntaxError, UnicodeDecodeError) as error:
+                logger.warning('Шаблон %s не скомпилирован: %s', name, error)
+            else:
+                compiled += 1
+        return compiled
@@ -0,0 +1,376 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import DEFAULT_DB_ALIAS, connection, router
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import reverse
+
+from core import db_router, instrumentation, throttle
+from core.cache_backends.sqlite import SQLiteCache
+from core.template_backends.instrumented import DjangoTemplates
+
+from posts.management.commands.sync_replicas import copy_database
+from posts.models import Comment, Follow, Post
+
+User = get_user_model()
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(
+            f'{self.directory}/cache.sqlite3', {'OPTIONS': options}
+        )
+
+    def test_set_get_delete(self):
+        """Значения сохраняются, читаются и удаляются"""
+        self.cache.set('key', {'posts': [1, 2]})
+        self.assertEqual(self.cache.get('key'), {'posts': [1, 2]})
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_shared_between_instances(self):
+        """Запись одного экземпляра видна другому, как соседнему воркеру"""
+        self.cache.set('key', 'value')
+        self.assertEqual(self.make_cache().get('key'), 'value')
+
+    def test_add_and_incr(self):
+        """add не перезаписывает ключ, incr атомарно сдвигает число"""
+        self.assertTrue(self.cache.add('version', 1, DEFAULT_TIMEOUT))
+        self.assertFalse(self.cache.add('version', 5))
+        self.assertEqual(self.cache.incr('version'), 2)
+        self.assertEqual(self.make_cache().incr('version', 3), 5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_expiry(self):
+        """Просроченный ключ не возвращается"""
+        self.cache.set('key', 'value', 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+
+    def test_least_recently_used_is_evicted(self):
+        """При переполнении вытесняются давно не читанные ключи"""
+        cache = self.make_cache(
+            MAX_ENTRIES=2, CULL_FREQUENCY=10, CULL_EVERY=1
+        )
+        cache.set('old', 1)
+        cache.set('hot', 2)
+        cache._write('UPDATE cache SET accessed = 0 WHERE key LIKE ?',
+                     ('%old',))
+        cache.set('new', 3)
+        self.assertIsNone(cache.get('old'))
+        self.assertEqual(cache.get('hot'), 2)
+        self.assertEqual(cache.get('new'), 3)
+
+    def test_cull_runs_every_n_writes(self):
+        """Переполнение проверяется раз в CULL_EVERY записей"""
+        cache = self.make_cache(MAX_ENTRIES=2, CULL_EVERY=5)
+        for i in range(4):
+            cache.set(f'key_{i}', i)
+        self.assertEqual(cache.get('key_0'), 0)
+        cache.set('key_4', 4)
+        self.assertLessEqual(len(cache.get_many(
+            [f'key_{i}' for i in range(5)]
+        )), 2)
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        instrumentation.reset()
+
+    def test_server_timing_header(self):
+        """Ответ несёт замеры SQL, шаблонов и кеша в Server-Timing"""
+        response = self.client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        for part in ('app;dur=', 'db;dur=', 'queries', 'tpl;dur=',
+                     'cache;desc="hit='):
+            with self.subTest(part=part):
+                self.assertIn(part, timing)
+        response = self.client.get(reverse('posts:index'))
+        self.assertIn('miss=0', response['Server-Timing'])
+
+    def test_cache_get_many_counted_once(self):
+        """Промахи get_many не считаются повторно через get"""
+        with instrumentation.collect() as metrics:
+            cache.set('a', 1)
+            cache.get_many(['a', 'b'])
+            cache.get('b')
+        self.assertEqual((metrics.cache_hits, metrics.cache_misses), (1, 2))
+
+    def test_report_for_staff_only(self):
+        """Гистограммы доступны только администраторам"""
+        self.client.get(reverse('posts:index'))
+        url = reverse('instrumentation')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(
+            User.objects.create_user(username='admin', is_staff=True)
+        )
+        data = self.client.get(url, {'format': 'json'}).json()
+        self.assertEqual(data['posts:index']['requests'], 1)
+        sql_count = data['posts:index']['histograms']['sql_count']
+        self.assertEqual(sum(count for _, count in sql_count['buckets']), 1)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class TemplatePrecompileTests(SimpleTestCase):
+    def test_precompile_fills_cached_loader(self):
+        """Все шаблоны компилируются заранее в кеш загрузчика"""
+        engine = DjangoTemplates({
+            'NAME': 'precompiled',
+            'DIRS': [settings.TEMPLATES_DIR],
+            'APP_DIRS': False,
+            'OPTIONS': {'loaders': [(
+                'django.template.loaders.cached.Loader',
+                ['django.template.loaders.filesystem.Loader',
+                 'django.template.loaders.app_directories.Loader'],
+            )]},
+        })
+        self.assertEqual(
+            engine.precompile(), len(engine.template_names())
+        )
+        loader = engine.engine.template_loaders[0]
+        self.assertIn('posts/index.html', loader.get_template_cache)
+        self.assertIn('admin/base.html', loader.get_template_cache)
+
+
+@override_settings(THROTTLE_RATES={'add_comment': '2/m'})
+class ThrottleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.auth = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.auth)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.auth)
+        self.url = reverse('posts:add_comment', args=[self.post.pk])
+
+    def comment(self, client=None, **extra):
+        return (client or self.client).post(
+            self.url, {'text': 'Комментарий'}, **extra
+        )
+
+    def test_burst_then_429(self):
+        """Сверх ёмкости бакета — 429 с Retry-After, запись не создаётся"""
+        for _ in range(2):
+            self.assertEqual(self.comment().status_code, 302)
+        response = self.comment()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_ip_and_user_buckets(self):
+        """Бакет IP общий для всех пользователей с этого адреса"""
+        for _ in range(2):
+            self.comment()
+        other = self.client_class()
+        other.force_login(User.objects.create_user(username='other'))
+        self.assertEqual(self.comment(other).status_code, 429)
+        response = self.comment(other, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 302)
+        response = self.comment(REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 429)
+
+    def test_bucket_refills(self):
+        """Токены возвращаются равномерно за период"""
+        with mock.patch.object(throttle.time, 'time', return_value=1000.0):
+            self.assertEqual(throttle.take('bucket', '2/m'), 0)
+            self.assertEqual(throttle.take('bucket', '2/m'), 0)
+            self.assertEqual(throttle.take('bucket', '2/m'), 30)
+        with mock.patch.object(throttle.time, 'time', return_value=1030.0):
+            self.assertEqual(throttle.take('bucket', '2/m'), 0)
+            self.assertEqual(throttle.take('bucket', '2/m'), 30)
+
+    def test_idle_bucket_is_moved_once(self):
+        """Простаивавший бакет переносится на текущий момент один раз,
+        даже если его старое значение прочли два запроса"""
+        cache.set('bucket', 1000, None)
+        with mock.patch.object(throttle.time, 'time', return_value=1000.0):
+            self.assertEqual(throttle.take('bucket', '2/m'), 0)
+            # Второй запрос прочёл значение до переноса.
+            with mock.patch.object(throttle.cache, 'get', return_value=1000):
+                self.assertEqual(throttle.take('bucket', '2/m'), 0)
+            self.assertEqual(throttle.take('bucket', '2/m'), 30)
+
+    @override_settings(
+        THROTTLE_IP_HEADER='HTTP_X_FORWARDED_FOR', THROTTLE_TRUSTED_PROXIES=1
+    )
+    def test_client_ip_behind_proxy(self):
+        """За прокси бакет по IP строится по адресу клиента из заголовка"""
+        for _ in range(2):
+            self.comment(HTTP_X_FORWARDED_FOR='10.0.0.2')
+        other = self.client_class()
+        other.force_login(User.objects.create_user(username='other'))
+        response = self.comment(
+            other, HTTP_X_FORWARDED_FOR='1.2.3.4, 10.0.0.3'
+        )
+        self.assertEqual(response.status_code, 302)
+        response = self.comment(
+            other, HTTP_X_FORWARDED_FOR='10.0.0.3, 10.0.0.2'
+        )
+        self.assertEqual(response.status_code, 429)
+
+
+class SQLiteConnectionTests(TestCase):
+    def test_pragmas_applied(self):
+        """Новое соединение получает PRAGMA из OPTIONS базы"""
+        pragmas = settings.DATABASES['default']['OPTIONS']['pragmas']
+        with connection.cursor() as cursor:
+            # mmap_size у базы в памяти тестов не действует.
+            for name in ('busy_timeout', 'cache_size'):
+                with self.subTest(pragma=name):
+                    cursor.execute(f'PRAGMA {name}')
+                    self.assertEqual(cursor.fetchone()[0], pragmas[name])
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class ReplicaRouterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.auth = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    @staticmethod
+    @db_router.reads_replica
+    def read_view(request):
+        return HttpResponse(
+            f'{router.db_for_read(Post)} {db_router.fragment_tag()}'
+        )
+
+    @staticmethod
+    @db_router.writes_primary
+    def write_view(request):
+        return HttpResponse(router.db_for_write(Post))
+
+    @staticmethod
+    @db_router.writes_primary
+    def form_view(request):
+        return HttpResponse(router.db_for_read(Post))
+
+    def request(self, view, method='get', user=None):
+        request = getattr(self.factory, method)('/')
+        request.user = user or AnonymousUser()
+        return view(request).content.decode()
+
+    def test_reads_go_to_replica(self):
+        """Ленты читают с реплики, запросы POST и остальное — с основной"""
+        self.assertEqual(self.request(self.read_view), 'replica_1 replica-0')
+        self.assertEqual(
+            self.request(self.read_view, 'post'), 'default '
+        )
+        self.assertEqual(router.db_for_read(Post), 'default')
+        self.assertEqual(self.request(self.write_view), 'default')
+
+    def test_read_your_writes(self):
+        """После записи пользователь читает с основной базы"""
+        self.assertEqual(
+            self.request(self.read_view, user=self.auth),
+            'replica_1 replica-0',
+        )
+        self.request(self.write_view, user=self.auth)
+        self.assertEqual(
+            self.request(self.read_view, user=self.auth), 'default '
+        )
+        self.assertEqual(
+            self.request(self.read_view), 'replica_1 replica-0'
+        )
+
+    def test_no_write_no_stickiness(self):
+        """Представление без записей не привязывает к основной базе"""
+        self.request(self.form_view, user=self.auth)
+        self.assertEqual(
+            self.request(self.read_view, user=self.auth),
+            'replica_1 replica-0',
+        )
+
+    def test_sync_advances_generation(self):
+        """Синхронизация копирует базу и меняет ключи фрагментов реплик"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        source = os.path.join(directory, 'db.sqlite3')
+        target = os.path.join(directory, 'db.replica_1.sqlite3')
+        with sqlite3.connect(source) as db:
+            db.execute('CREATE TABLE post (text TEXT)')
+            db.execute("INSERT INTO post VALUES ('Тестовый текст')")
+        copy_database(source, target)
+        with sqlite3.connect(target) as db:
+            rows = db.execute('SELECT text FROM post').fetchall()
+        self.assertEqual(rows, [('Тестовый текст',)])
+        db_router.advance_generation()
+        self.assertEqual(self.request(self.read_view), 'replica_1 replica-1')
+
+
+# В тестах реплика — та же база, поэтому чтение с реплики видно только по
+# псевдониму, который роутер выбрал для запроса.
+@override_settings(DATABASE_REPLICAS=[DEFAULT_DB_ALIAS])
+class ReplicaViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.auth = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.auth)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.auth)
+
+    def replica_queries(self, url):
+        """Ответ на GET ``url`` и число запросов, прочитанных с реплики."""
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append(db_router.using_replica())
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            response = self.client.get(url)
+        return response, sum(queries)
+
+    def test_post_edit_then_detail(self):
+        """После правки пост читается с основной базы"""
+        detail = reverse('posts:post_detail', args=[self.post.pk])
+        edit = reverse('posts:post_edit', args=[self.post.pk])
+        self.assertGreater(self.replica_queries(detail)[1], 0)
+        # Открыть форму — ещё не запись.
+        self.client.get(edit)
+        self.assertGreater(self.replica_queries(detail)[1], 0)
+        self.client.post(edit, {'text': 'Новый текст'})
+        response, replica = self.replica_queries(detail)
+        self.assertEqual(replica, 0)
+        self.assertContains(response, 'Новый текст')
+
+    def test_unfollow_then_profile(self):
+        """После отписки профиль читается с основной базы"""
+        Follow.objects.create(user=self.auth, author=self.author)
+        profile = reverse('posts:profile', args=[self.author.username])
+        self.assertGreater(self.replica_queries(profile)[1], 0)
+        self.client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username])
+        )
+        response, replica = self.replica_queries(profile)
+        self.assertEqual(replica, 0)
+        self.assertFalse(response.context['following'])
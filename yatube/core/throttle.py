@@ -0,0 +1,130 @@
+"""Ограничение частоты записей: token bucket в общем кеше.
+
+Каждый бакет — одно целое в кеше: теоретическое время прихода
+следующего запроса (GCRA) в миллисекундах. Запрос сдвигает его
+атомарным ``incr`` на интервал между токенами; если время ушло дальше
+ёмкости бакета, запрос отклоняется, а сдвиг откатывается. Поэтому
+воркеры с общим кешем (sqlite) делят один бакет без блокировок.
+Простаивавший бакет переносится на текущий момент тоже через ``incr``,
+а переносит его только запрос, первым занявший ключ ``add``.
+
+За обратным прокси адрес клиента берётся из заголовка
+``THROTTLE_IP_HEADER``, иначе все клиенты делили бы бакет прокси.
+
+Лимиты задаются в ``THROTTLE_RATES`` по имени представления строкой
+``'<число>/<s|m|h|d>'``: бакет вмещает всё число запросов и
+наполняется равномерно за период.
+"""
+import functools
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import views
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    """``'10/m'`` -> (10, 60): ёмкость бакета и период в секундах."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+def take(key, rate):
+    """Берёт токен из бакета ``key``.
+
+    Возвращает 0, если токен есть, иначе сколько секунд ждать.
+    """
+    burst, period = parse_rate(rate)
+    interval = math.ceil(period * 1000 / burst)
+    now = int(time.time() * 1000)
+    # Без срока жизни: incr его не продлевает, а простаивающий бакет
+    # полон и без ключа, так что его можно отдать вытеснению LRU.
+    cache.add(key, now, None)
+    start = cache.get(key)
+    if (
+        start is not None and start < now
+        and cache.add(f'{key}:from:{start}', 1, period)
+    ):
+        # Бакет простаивал и полон: отсчёт переносится на текущий
+        # момент. Сдвиг прибавляется, а не записывается поверх, чтобы не
+        # потерять токены параллельных запросов, и делается один раз.
+        try:
+            cache.incr(key, now - start)
+        except ValueError:
+            pass
+    try:
+        arrival = cache.incr(key, interval)
+    except ValueError:
+        # Ключ вытеснен между add и incr: бакет снова полон.
+        arrival = now + interval
+    wait = arrival - now - burst * interval
+    if wait > 0:
+        cache.decr(key, interval)
+        return wait / 1000
+    return 0
+
+
+def refund(key, rate):
+    """Возвращает токен, взятый запросом, который всё равно отклонён."""
+    burst, period = parse_rate(rate)
+    try:
+        cache.decr(key, math.ceil(period * 1000 / burst))
+    except ValueError:
+        pass
+
+
+def client_ip(request):
+    """Адрес клиента для бакета по IP.
+
+    Начало заголовка вроде X-Forwarded-For клиент может прислать сам,
+    поэтому из списка берётся адрес, который дописал ближайший к нему
+    доверенный прокси: ``THROTTLE_TRUSTED_PROXIES``-й с конца.
+    """
+    header = settings.THROTTLE_IP_HEADER
+    forwarded = request.META.get(header, '') if header else ''
+    addresses = [
+        address.strip() for address in forwarded.split(',')
+        if address.strip()
+    ]
+    if addresses:
+        depth = min(settings.THROTTLE_TRUSTED_PROXIES, len(addresses))
+        return addresses[-depth]
+    return request.META.get('REMOTE_ADDR')
+
+
+def client_keys(request, scope):
+    keys = [f'throttle:{scope}:ip:{client_ip(request)}']
+    if request.user.is_authenticated:
+        keys.append(f'throttle:{scope}:user:{request.user.pk}')
+    return keys
+
+
+def throttle(scope, methods=('POST',)):
+    """Ограничивает запросы к представлению по пользователю и по IP.
+
+    ``methods`` — какие методы пишут в базу; None — все. При исчерпании
+    бакета ответ 429 с заголовком Retry-After.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            rate = settings.THROTTLE_RATES.get(scope)
+            if rate is None or (
+                methods is not None and request.method not in methods
+            ):
+                return view(request, *args, **kwargs)
+            taken = []
+            for key in client_keys(request, scope):
+                wait = take(key, rate)
+                if wait:
+                    for taken_key in taken:
+                        refund(taken_key, rate)
+                    return views.too_many_requests(request, wait)
+                taken.append(key)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,5 +1,11 @@
+import math
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from . import instrumentation
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -13,5 +19,19 @@ def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
 
 
+def too_many_requests(request, retry_after):
+    response = render(request, 'core/429.html', status=429)
+    response['Retry-After'] = math.ceil(retry_after)
+    return response
+
+
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def instrumentation_report(request):
+    views = instrumentation.snapshot()
+    if request.GET.get('format') == 'json':
+        return JsonResponse(views)
+    return render(request, 'core/instrumentation.html', {'views': views})
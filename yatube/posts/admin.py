@@ -1,4 +1,6 @@
 from django.contrib import admin
+from django.conf import settings
+from . import search
 from .models import Group, Post
 
 
@@ -16,5 +18,14 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск через полнотекстовый индекс вместо LIKE по всей таблице.
+        if not search_term or not search.is_available():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        ids = search.post_ids(search_term, settings.SEARCH_RESULTS_LIMIT)
+        return queryset.filter(pk__in=ids), False
+
 
 admin.site.register(Group)
@@ -0,0 +1,233 @@
+"""JSON API лент и массовой подписки.
+
+Каждый ответ лент несёт сильный ETag и Last-Modified. Они считаются по
+версиям областей кеша лент (см. feed_cache) и дате новейшего поста или
+комментария, поэтому неизменившаяся лента отвечает 304 одним
+агрегирующим запросом, не загружая строк.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_POST, require_safe
+
+from core.db_router import writes_primary
+from core.throttle import throttle
+
+from . import feed_cache
+from .func import CursorPaginator, make_comments_page
+from .models import Follow, Group, Post, TimelineEntry, User
+
+JSON_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params=JSON_PARAMS)
+
+
+def make_etag(request, scopes, last_modified):
+    parts = [
+        f'{scope}={version}'
+        for scope, version in zip(scopes, feed_cache.get_versions(*scopes))
+    ]
+    parts.append(last_modified.isoformat() if last_modified else '')
+    parts.append(request.GET.get('cursor', ''))
+    return quote_etag(hashlib.md5(':'.join(parts).encode()).hexdigest())
+
+
+def conditional(state):
+    """Отвечает 304, если клиент уже видел текущее состояние ресурса.
+
+    ``state(request, **kwargs)`` возвращает области кеша лент, дату
+    последнего изменения и объект, который получит представление.
+    """
+    def decorator(view):
+        @wraps(view)
+        def inner(request, **kwargs):
+            scopes, last_modified, obj = state(request, **kwargs)
+            etag = make_etag(request, scopes, last_modified)
+            timestamp = (
+                int(last_modified.timestamp()) if last_modified else None
+            )
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp
+            )
+            if response is None:
+                response = view(request, obj)
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            return response
+        return require_safe(inner)
+    return decorator
+
+
+def newest(posts):
+    return posts.aggregate(newest=Max('pub_date'))['newest']
+
+
+def serialize_post(post):
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'author': post.author.username,
+        'group': post.group.slug if post.group_id else None,
+        'image': post.image.url if post.image else None,
+        'comments': post.comments_count,
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+    }
+
+
+def feed_response(request, posts):
+    paginator = CursorPaginator(posts.feed(), settings.POSTS_COUNT)
+    page = paginator.get_page(request.GET.get('cursor'))
+    return json_response({
+        'results': [serialize_post(post) for post in page],
+        'next': paginator.next_cursor,
+        'previous': paginator.previous_cursor,
+    })
+
+
+def index_state(request):
+    posts = Post.objects.all()
+    return [feed_cache.INDEX], newest(posts), posts
+
+
+def group_state(request, slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    posts = Post.objects.filter(group=group)
+    return [feed_cache.group_scope(group.pk)], newest(posts), posts
+
+
+def profile_state(request, username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    posts = Post.objects.filter(author=author)
+    return [feed_cache.author_scope(author.pk)], newest(posts), posts
+
+
+def post_state(request, post_id):
+    # Комментарии сбрасывают область автора поста, правки поста — тоже.
+    row = Post.objects.filter(pk=post_id).values(
+        'pk', 'author_id', 'pub_date'
+    ).annotate(last_comment=Max('comments__created')).first()
+    if row is None:
+        raise Http404
+    last_modified = max(filter(None, (row['pub_date'], row['last_comment'])))
+    return [feed_cache.author_scope(row['author_id'])], last_modified, row
+
+
+def follow_state(request):
+    # В ленту подписок попадают посты любых авторов, поэтому её версия
+    # зависит от общей ленты и от подписок самого читателя.
+    posts = TimelineEntry.objects.posts_for(request.user)
+    scopes = [feed_cache.INDEX, feed_cache.author_scope(request.user.pk)]
+    return scopes, posts.newest(), posts
+
+
+@conditional(index_state)
+def index(request, posts):
+    return feed_response(request, posts)
+
+
+@conditional(group_state)
+def group_posts(request, posts):
+    return feed_response(request, posts)
+
+
+@conditional(profile_state)
+def profile(request, posts):
+    return feed_response(request, posts)
+
+
+@conditional(post_state)
+def post_detail(request, row):
+    post = Post.objects.feed().get(pk=row['pk'])
+    comments = make_comments_page(request, post)
+    return json_response({
+        'post': serialize_post(post),
+        'comments': [serialize_comment(comment) for comment in comments],
+        'next': comments.paginator.next_cursor,
+    })
+
+
+def unauthorized():
+    return json_response({'detail': 'Требуется авторизация'}, status=401)
+
+
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return unauthorized()
+    return _follow_index(request)
+
+
+@conditional(follow_state)
+def _follow_index(request, posts):
+    return feed_response(request, posts)
+
+
+def username_list(data, key):
+    names = data.get(key, [])
+    if not isinstance(names, list) or not all(
+        isinstance(name, str) for name in names
+    ):
+        raise ValueError(f'{key}: ожидается список имён пользователей')
+    return names
+
+
+@require_POST
+@throttle('follow_bulk')
+@writes_primary
+def follow_bulk(request):
+    """Подписка и отписка списком: ``{"follow": [...], "unfollow": [...]}``.
+
+    Имена разрешаются одним запросом, подписки вставляются одним
+    bulk_create с ignore_conflicts.
+    """
+    if not request.user.is_authenticated:
+        return unauthorized()
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ValueError('Ожидается объект JSON')
+        follow = username_list(data, 'follow')
+        unfollow = username_list(data, 'unfollow')
+    except ValueError as error:
+        return json_response({'detail': str(error)}, status=400)
+    if len(follow) + len(unfollow) > settings.BULK_FOLLOW_LIMIT:
+        return json_response({
+            'detail': f'Не больше {settings.BULK_FOLLOW_LIMIT} имён за раз'
+        }, status=400)
+    names = set(follow) | set(unfollow)
+    users = dict(User.objects.filter(
+        username__in=names
+    ).values_list('username', 'pk'))
+    with transaction.atomic():
+        followed = Follow.objects.add_edges(
+            (request.user.pk, users[name])
+            for name in follow if name in users
+        )
+        unfollowed = Follow.objects.remove_edges(
+            request.user.pk,
+            [users[name] for name in unfollow if name in users],
+        )
+    return json_response({
+        'followed': len(followed),
+        'unfollowed': len(unfollowed),
+        'missing': sorted(names - users.keys()),
+    })
@@ -0,0 +1,123 @@
+"""Общие инструменты для команд замера производительности."""
+import contextlib
+import itertools
+import os
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connections
+
+from .models import Post
+
+User = get_user_model()
+
+SYLLABLES = ('ка', 'ро', 'ми', 'ту', 'ле', 'со', 'на', 'ви', 'до', 'пе',
+             'ло', 'гу', 'ры', 'за', 'бе', 'чи')
+ENDINGS = ('', 'а', 'ы', 'ом', 'ами', 'ах', 'у', 'е')
+VOCABULARY = [
+    ''.join(parts) + 'т' for parts in itertools.product(SYLLABLES, repeat=3)
+]
+
+
+def zipf_weights(count, exponent=1.0):
+    """Накопленные веса закона Ципфа: вес i-го элемента ~ 1 / i^exponent.
+
+    Подходят для ``random.choices(cum_weights=...)``: небольшая часть
+    авторов пишет большую часть постов и собирает большую часть
+    подписчиков, частые слова встречаются чаще редких.
+    """
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+VOCABULARY_WEIGHTS = zipf_weights(len(VOCABULARY))
+
+
+def random_text(rng, min_words=5, max_words=30):
+    words = rng.choices(
+        VOCABULARY, cum_weights=VOCABULARY_WEIGHTS,
+        k=rng.randint(min_words, max_words),
+    )
+    return ' '.join(word + rng.choice(ENDINGS) for word in words)
+
+
+@contextlib.contextmanager
+def temporary_database():
+    """Подменяет базу default временным файлом SQLite с миграциями.
+
+    Замеры не трогают рабочую базу, а дочерние процессы, запущенные
+    внутри блока, открывают тот же временный файл.
+    """
+    settings_dict = connections.databases['default']
+    old_name = settings_dict['NAME']
+    fd, path = tempfile.mkstemp(suffix='.sqlite3')
+    os.close(fd)
+    connections['default'].close()
+    settings_dict['NAME'] = path
+    try:
+        call_command('migrate', verbosity=0, interactive=False)
+        yield path
+    finally:
+        connections['default'].close()
+        settings_dict['NAME'] = old_name
+        for suffix in ('', '-wal', '-shm'):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path + suffix)
+
+
+def seed_posts(count, authors=10, batch_size=1000, text=None):
+    """Быстро создаёт ``count`` постов через bulk_create.
+
+    ``text`` — функция, возвращающая текст i-го поста.
+    """
+    text = text or (lambda i: f'Пост {i}')
+    User.objects.bulk_create(
+        User(username=f'bench_{i}') for i in range(authors)
+    )
+    users = list(User.objects.filter(username__startswith='bench_'))
+    for start in range(0, count, batch_size):
+        Post.objects.bulk_create(
+            Post(text=text(i), author=users[i % len(users)])
+            for i in range(start, min(start + batch_size, count))
+        )
+    return users
+
+
+def measure(func, repeat):
+    """Возвращает время каждого из ``repeat`` вызовов в секундах."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def percentile(values, q):
+    """Перцентиль ``q`` (0..100) методом ближайшего ранга."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summary(timings):
+    """Сводка по замерам в миллисекундах."""
+    return {
+        'p50': percentile(timings, 50) * 1000,
+        'p95': percentile(timings, 95) * 1000,
+        'p99': percentile(timings, 99) * 1000,
+        'mean': sum(timings) / len(timings) * 1000 if timings else 0.0,
+    }
+
+
+def format_summary(label, timings):
+    stats = summary(timings)
+    return (
+        f'{label:<30} p50={stats["p50"]:8.2f}ms p95={stats["p95"]:8.2f}ms '
+        f'p99={stats["p99"]:8.2f}ms mean={stats["mean"]:8.2f}ms'
+    )
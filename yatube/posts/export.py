@@ -0,0 +1,154 @@
+"""Потоковая выгрузка архива пользователя: посты, комментарии, подписки.
+
+Записи читаются через ``iterator(chunk_size=...)`` и сразу отдаются
+клиенту, поэтому память не зависит от числа постов автора. Архив
+доступен как NDJSON (по объекту JSON на строку, поле ``type`` задаёт вид
+записи) или как ZIP с теми же файлами NDJSON и картинками постов. ZIP
+пишется в поток без перемотки: zipfile ставит дескрипторы данных после
+каждого файла.
+"""
+import json
+import zipfile
+
+from django.contrib.auth.decorators import login_required
+from django.core.files.storage import default_storage
+from django.http import StreamingHttpResponse
+
+from .models import Comment, Follow, Post
+
+CHUNK_SIZE = 2000
+FILE_CHUNK_SIZE = 64 * 1024
+JSON_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+FORMATS = ('ndjson', 'zip')
+
+
+def posts(user):
+    rows = Post.objects.filter(author=user).order_by('pk').values_list(
+        'pk', 'text', 'pub_date', 'group__slug', 'image'
+    )
+    for pk, text, pub_date, group, image in rows.iterator(CHUNK_SIZE):
+        yield {
+            'type': 'post',
+            'id': pk,
+            'text': text,
+            'pub_date': pub_date.isoformat(),
+            'group': group,
+            'image': image or None,
+        }
+
+
+def comments(user):
+    rows = Comment.objects.filter(author=user).order_by('pk').values_list(
+        'pk', 'post_id', 'text', 'created'
+    )
+    for pk, post_id, text, created in rows.iterator(CHUNK_SIZE):
+        yield {
+            'type': 'comment',
+            'id': pk,
+            'post': post_id,
+            'text': text,
+            'created': created.isoformat(),
+        }
+
+
+def follows(user):
+    following = Follow.objects.filter(user=user).order_by('pk').values_list(
+        'author__username', flat=True
+    )
+    for username in following.iterator(CHUNK_SIZE):
+        yield {'type': 'following', 'username': username}
+    followers = Follow.objects.filter(author=user).order_by('pk').values_list(
+        'user__username', flat=True
+    )
+    for username in followers.iterator(CHUNK_SIZE):
+        yield {'type': 'follower', 'username': username}
+
+
+SECTIONS = (
+    ('posts.ndjson', posts),
+    ('comments.ndjson', comments),
+    ('follows.ndjson', follows),
+)
+
+
+def lines(records):
+    for record in records:
+        yield (json.dumps(record, **JSON_PARAMS) + '\n').encode()
+
+
+def ndjson(user):
+    """Весь архив одним потоком строк NDJSON."""
+    for _, section in SECTIONS:
+        yield from lines(section(user))
+
+
+class Sink:
+    """Файл для zipfile, который копит записанное до выдачи клиенту."""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+
+def zip_archive(user):
+    """Архив ZIP кусками по мере записи: NDJSON и картинки постов."""
+    sink = Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, section in SECTIONS:
+            with archive.open(name, 'w', force_zip64=True) as entry:
+                for line in lines(section(user)):
+                    entry.write(line)
+                    if sink.size >= FILE_CHUNK_SIZE:
+                        yield sink.drain()
+        images = Post.objects.filter(author=user).exclude(
+            image=''
+        ).order_by('image').values_list('image', flat=True).distinct()
+        for image in images.iterator(CHUNK_SIZE):
+            if not default_storage.exists(image):
+                continue
+            # Картинки уже сжаты: храним их как есть.
+            info = zipfile.ZipInfo(image)
+            info.compress_type = zipfile.ZIP_STORED
+            with default_storage.open(image) as source, \
+                    archive.open(info, 'w', force_zip64=True) as entry:
+                for chunk in source.chunks(FILE_CHUNK_SIZE):
+                    entry.write(chunk)
+                    yield sink.drain()
+    yield sink.drain()
+
+
+def stream(user, format):
+    if format == 'zip':
+        return zip_archive(user)
+    return ndjson(user)
+
+
+@login_required
+def export_data(request):
+    format = request.GET.get('format')
+    if format not in FORMATS:
+        format = 'ndjson'
+    content_type = (
+        'application/zip' if format == 'zip' else 'application/x-ndjson'
+    )
+    response = StreamingHttpResponse(
+        stream(request.user, format), content_type=content_type
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{request.user.username}.{format}"'
+    )
+    return response
@@ -0,0 +1,120 @@
+"""Версионированный кеш фрагментов лент.
+
+У каждой области (вся лента, группа, автор) есть номер версии в кеше.
+Номера версий входят в ключ фрагмента, поэтому запись в базу лишь
+увеличивает версию, а старые фрагменты перестают совпадать по ключу и
+вытесняются сами.
+
+Карточки постов кешируются отдельно от страниц: версия карточки — хеш
+всего, что она показывает, поэтому сдвиг страниц новым постом не
+заставляет заново рендерить уже виденные карточки.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from core import db_router
+
+INDEX = 'index'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def _version_key(scope):
+    return f'feed-version:{scope}'
+
+
+def _initial_version():
+    # После вытеснения версия не должна совпасть с прежней, поэтому
+    # отсчёт начинается с текущего времени, а не с единицы.
+    return time.time_ns()
+
+
+def get_versions(*scopes):
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(*scopes):
+    """Сбрасывает фрагменты областей ``scopes``."""
+    for scope in scopes:
+        if scope is None:
+            continue
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+
+
+def bump_on_commit(*scopes):
+    """bump сейчас и ещё раз после коммита текущей транзакции.
+
+    Между ними читатель ещё видит базу без записи и может закешировать
+    её под новой версией; второй сброс убирает такой фрагмент.
+    """
+    bump(*scopes)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: bump(*scopes))
+
+
+def post_scopes(author_id, *group_ids):
+    """Области, которые затрагивает изменение поста."""
+    groups = dict.fromkeys(group_id for group_id in group_ids if group_id)
+    return [INDEX, author_scope(author_id)] + [
+        group_scope(group_id) for group_id in groups
+    ]
+
+
+def fragment_key(request, *scopes):
+    """Часть ключа фрагмента для ``{% cache %}``: версии областей
+    и параметры страницы."""
+    parts = [
+        f'{scope}={version}'
+        for scope, version in zip(scopes, get_versions(*scopes))
+    ]
+    parts.append(request.GET.get('page', ''))
+    parts.append(request.GET.get('cursor', ''))
+    tag = db_router.fragment_tag()
+    if tag:
+        parts.append(tag)
+    return ':'.join(parts)
+
+
+def fragment_context(request, *scopes):
+    return {
+        'feed_key': fragment_key(request, *scopes),
+        'feed_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
+
+
+def card_key(post, **flags):
+    """Ключ отрендеренной карточки поста: id и версия её содержимого."""
+    author, group = post.author, post.group
+    state = (
+        post.text,
+        post.pub_date.isoformat(),
+        post.image.name,
+        author.username,
+        author.get_full_name(),
+        group and (group.slug, group.title),
+        getattr(post, 'comments_count', None),
+        getattr(post, 'thumbnail_status', None),
+        sorted(flags.items()),
+    )
+    version = hashlib.md5(repr(state).encode()).hexdigest()
+    return f'post-card:{post.pk}:{version}'
@@ -1,12 +1,50 @@
 from django import forms
+from django.conf import settings
+from django.template.defaultfilters import filesizeformat
+
+from . import thumbnails
 from .models import Post, Comment
 
 
+def check_image(image):
+    """Отсекает слишком большие картинки до фоновой обработки.
+
+    Размеры в пикселях берутся из заголовка, который уже прочитало поле
+    ImageField: картинка целиком не распаковывается.
+    """
+    limit = settings.POST_IMAGE_MAX_UPLOAD_SIZE
+    if image.size > limit:
+        raise forms.ValidationError(
+            f'Файл больше {filesizeformat(limit)}'
+        )
+    header = getattr(image, 'image', None)
+    if header is not None:
+        width, height = header.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise forms.ValidationError(
+                f'Картинка {width}×{height} слишком велика'
+            )
+    return image
+
+
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        # Новая загрузка, а не уже сохранённый файл поста.
+        if image and 'image' in self.changed_data:
+            check_image(image)
+        return image
+
+    def save(self, commit=True):
+        post = super().save(commit)
+        if commit and post.image and 'image' in self.changed_data:
+            thumbnails.enqueue(post)
+        return post
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
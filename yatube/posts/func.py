@@ -1,9 +1,306 @@
+import base64
+import copy
+import heapq
+from collections.abc import Sequence
+
 from django.conf import settings
+from django.core.cache import cache
 from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from . import feed_cache
+
+AFTER = 'a'
+BEFORE = 'b'
+
+
+def encode_cursor(direction, value, pk):
+    """Упаковывает позицию (значение поля, id) в непрозрачный токен."""
+    raw = f'{direction}{value.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен; для битого токена возвращает None."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, rest = raw[:1].decode(), raw[1:].decode()
+        value, pk = rest.rsplit('|', 1)
+        value = parse_datetime(value)
+        if direction not in (AFTER, BEFORE) or value is None:
+            return None
+        return direction, value, int(pk)
+    except (TypeError, ValueError):
+        return None
+
+
+def seek(queryset, direction, value, pk, field='pub_date', id_field='id'):
+    """Записи после позиции (value, pk) в порядке ``-field``, ``-id_field``;
+    для BEFORE — записи перед ней, в обратном порядке."""
+    # Нестрогая граница по полю отдельным условием: без неё SQLite
+    # не видит диапазона в OR и проходит индекс с самого начала.
+    if direction == BEFORE:
+        return queryset.filter(**{f'{field}__gte': value}).filter(
+            Q(**{f'{field}__gt': value})
+            | Q(**{field: value, f'{id_field}__gt': pk})
+        ).reverse()
+    if value is None:
+        return queryset
+    return queryset.filter(**{f'{field}__lte': value}).filter(
+        Q(**{f'{field}__lt': value})
+        | Q(**{field: value, f'{id_field}__lt': pk})
+    )
+
+
+class MergedFeed:
+    """Лента, слитая из нескольких упорядоченных источников.
+
+    Источник — пара (запрос, поле id поста): запрос по своему индексу
+    отдаёт пары (дата, id поста) в порядке ``-field``, ``-id``. С каждого
+    источника берётся не больше записей, чем нужно странице, пары
+    сливаются здесь же, а посты загружаются по id одним запросом. Так
+    объединение источников не сортируется во временном B-дереве.
+
+    ``members`` — все посты ленты одним запросом, для count(). Поддержано
+    то, что нужно пагинаторам: срезы, count() и seek() для курсора.
+    """
+    ordered = True
+
+    def __init__(self, members, sources, field='pub_date'):
+        self.members = members
+        self.sources = sources
+        self.field = field
+        self.rows = members.model._default_manager.all()
+        self.cursor = (AFTER, None, None)
+
+    def _clone(self, **changes):
+        clone = copy.copy(self)
+        clone.__dict__.update(changes)
+        return clone
+
+    def feed(self):
+        return self._clone(rows=self.rows.feed())
+
+    def order_by(self, *fields):
+        if fields != (f'-{self.field}', '-id'):
+            raise ValueError(f'Лента упорядочена только по -{self.field}, -id')
+        return self
+
+    def seek(self, direction, value, pk):
+        return self._clone(cursor=(direction, value, pk))
+
+    def count(self):
+        return self.members.count()
+
+    def keys(self, stop=None):
+        """Первые ``stop`` пар (дата, id поста) без повторов."""
+        direction, value, pk = self.cursor
+        sources = [
+            seek(
+                queryset.order_by(f'-{self.field}', f'-{id_field}'),
+                direction, value, pk, self.field, id_field,
+            ).values_list(self.field, id_field)[:stop]
+            for queryset, id_field in self.sources
+        ]
+        keys, seen = [], set()
+        for key in heapq.merge(*sources, reverse=direction != BEFORE):
+            if key[1] in seen:
+                continue
+            seen.add(key[1])
+            keys.append(key)
+            if len(keys) == stop:
+                break
+        return keys
+
+    def newest(self):
+        """Дата новейшего поста ленты или None."""
+        keys = self.keys(1)
+        return keys[0][0] if keys else None
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        ids = [pk for _, pk in self.keys(index.stop)][index.start:]
+        rows = self.rows.order_by().in_bulk(ids)
+        return [rows[pk] for pk in ids if pk in rows]
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+class CursorWindow(Sequence):
+    """Ленивое окно записей одной страницы курсорной пагинации.
+
+    Запрос выполняется при первом обращении: выбираем на одну запись
+    больше, чем помещается на странице, чтобы узнать о следующей странице
+    без COUNT(*).
+    """
+
+    def __init__(self, paginator, cursor):
+        self.paginator = paginator
+        self.cursor = cursor
+
+    @cached_property
+    def _state(self):
+        paginator = self.paginator
+        queryset = paginator.object_list
+        direction, value, pk = self.cursor or (AFTER, None, None)
+        if isinstance(queryset, MergedFeed):
+            queryset = queryset.seek(direction, value, pk)
+        else:
+            queryset = seek(queryset, direction, value, pk, paginator.field)
+        items = list(queryset[:paginator.per_page + 1])
+        more = len(items) > paginator.per_page
+        items = items[:paginator.per_page]
+        if direction == BEFORE:
+            items.reverse()
+            return items, True, more
+        return items, more, value is not None
+
+    @property
+    def items(self):
+        return self._state[0]
+
+    @property
+    def has_next(self):
+        return self._state[1] and bool(self.items)
+
+    @property
+    def has_previous(self):
+        return self._state[2] and bool(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+    def __len__(self):
+        return len(self.items)
+
+    def _cursor_for(self, direction, obj):
+        return encode_cursor(
+            direction, getattr(obj, self.paginator.field), obj.pk
+        )
+
+    @property
+    def next_cursor(self):
+        if self.has_next:
+            return self._cursor_for(AFTER, self.items[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous:
+            return self._cursor_for(BEFORE, self.items[0])
+        return None
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу (field, id) вместо OFFSET.
+
+    Не считает общее количество записей, поэтому глубокие страницы
+    открываются так же быстро, как первая. Порядок совпадает с
+    сортировкой ``-field``, ``-id``.
+    """
+    cursor_mode = True
+
+    def __init__(self, object_list, per_page, field='pub_date'):
+        self.field = field
+        super().__init__(object_list.order_by(f'-{field}', '-id'), per_page)
+        self.window = None
+
+    def page(self, cursor=None):
+        if cursor is not None and not isinstance(cursor, tuple):
+            cursor = decode_cursor(cursor)
+        self.window = CursorWindow(self, cursor)
+        return self._get_page(self.window, 1, self)
+
+    def get_page(self, cursor=None):
+        return self.page(cursor or None)
+
+    @property
+    def next_cursor(self):
+        return self.window.next_cursor if self.window else None
+
+    @property
+    def previous_cursor(self):
+        return self.window.previous_cursor if self.window else None
+
+
+class CountedPaginator(Paginator):
+    """Пагинация по номерам с заранее известным числом записей.
+
+    Число берётся из счётчиков или кеша вместо COUNT(*) по всей ленте и
+    может немного отставать: последняя страница тогда короче или длиннее.
+    """
+
+    def __init__(self, object_list, per_page, count):
+        super().__init__(object_list, per_page)
+        self.known_count = count
+
+    @cached_property
+    def count(self):
+        return self.known_count
+
+
+def cached_count(queryset, scope):
+    """Число постов ленты ``scope``: COUNT(*) один раз на версию ленты."""
+    version, = feed_cache.get_versions(scope)
+    return cache.get_or_set(
+        f'feed-count:{scope}:{version}',
+        queryset.count,
+        settings.FEED_CACHE_TIMEOUT,
+    )
+
+
+def elided_page_range(page, on_each_side=2, on_ends=1):
+    """Номера страниц для навигации: края и окно вокруг текущей.
+
+    Пропуски обозначены None, поэтому ссылок не больше
+    ``2 * (on_each_side + on_ends) + 3`` при любом числе страниц.
+    """
+    number, num_pages = page.number, page.paginator.num_pages
+    if num_pages <= (on_each_side + on_ends) * 2:
+        return list(range(1, num_pages + 1))
+    pages = []
+    if number > on_each_side + on_ends + 2:
+        pages.extend(range(1, on_ends + 1))
+        pages.append(None)
+        pages.extend(range(number - on_each_side, number + 1))
+    else:
+        pages.extend(range(1, number + 1))
+    if number < num_pages - on_each_side - on_ends - 1:
+        pages.extend(range(number + 1, number + on_each_side + 1))
+        pages.append(None)
+        pages.extend(range(num_pages - on_ends + 1, num_pages + 1))
+    else:
+        pages.extend(range(number + 1, num_pages + 1))
+    return pages
+
+
+def make_paginator(request, post_list, per_page=None, count=None):
+    """Курсорная пагинация по умолчанию, номера страниц — по ?page=.
+
+    ``count`` — функция, возвращающая известное число записей; её
+    вызывают только для номеров страниц вместо COUNT(*).
+    """
+    per_page = per_page or settings.POSTS_COUNT
+    if 'page' in request.GET:
+        if count is None:
+            paginator = Paginator(post_list, per_page)
+        else:
+            paginator = CountedPaginator(post_list, per_page, count())
+        return paginator.get_page(request.GET.get('page'))
+    paginator = CursorPaginator(post_list, per_page)
+    return paginator.get_page(request.GET.get('cursor'))
 
 
-def make_paginator(request, list):
-    paginator = Paginator(list, settings.POSTS_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+def make_comments_page(request, post):
+    """Страница комментариев поста, от новых к старым."""
+    comments = post.comments.select_related('author').only(
+        'post', 'text', 'created', 'author__username'
+    )
+    paginator = CursorPaginator(
+        comments, settings.COMMENTS_COUNT, field='created'
+    )
+    return paginator.get_page(request.GET.get('cursor'))
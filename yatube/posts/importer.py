@@ -0,0 +1,428 @@
+"""Массовый импорт постов и комментариев из дампов других площадок.
+
+Дамп — NDJSON (объект JSON на строку, как в выгрузке export) или CSV с
+заголовком. Поле ``type`` записи: ``post`` или ``comment``; остальные
+записи пропускаются. Пост: ``id`` в источнике, ``author``, ``text``,
+необязательные ``group`` (slug), ``pub_date`` (ISO 8601) и ``image``
+(путь внутри каталога картинок). Комментарий: ``post`` — ``id`` поста
+в источнике, ``author``, ``text``, необязательный ``created``.
+
+Записи читаются потоково и пишутся пачками: проверка теми же правилами,
+что у PostForm и CommentForm, bulk_create в транзакции, картинки — в
+пуле процессов до транзакции. Вместе с пачкой в той же транзакции
+сохраняется контрольная точка и соответствие ``id`` источника новым
+постам, поэтому прерванный импорт продолжается с места остановки, а
+пост с уже импортированным ``id`` не создаётся повторно. Если пачка
+не записалась, её картинки удаляются из хранилища.
+"""
+import csv
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import feed_cache, search, thumbnails, trending
+from .forms import CommentForm, PostForm, check_image
+from .models import (AuthorStats, Comment, Group, GroupStats,
+                     ImportCheckpoint, ImportedPost, Post, TimelineEntry, User)
+
+
+class RowError(Exception):
+    pass
+
+
+def read_records(path):
+    """Записи дампа по одной: CSV по расширению, иначе NDJSON.
+
+    Строка, которую не удалось разобрать, приходит как RowError, чтобы
+    позиция в дампе не сбивалась.
+    """
+    with open(path, newline='', encoding='utf-8') as file:
+        if path.endswith('.csv'):
+            yield from csv.DictReader(file)
+            return
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                record = RowError(f'Некорректный JSON: {error}')
+            if not isinstance(record, (dict, RowError)):
+                record = RowError('Ожидается объект JSON')
+            yield record
+
+
+def store_image(path):
+    """Проверяет картинку правилами поля PostForm и кладёт в хранилище.
+
+    Выполняется в дочернем процессе: возвращает имя файла или ошибку.
+    """
+    field = Post._meta.get_field('image')
+    try:
+        with open(path, 'rb') as source:
+            image = File(source, name=os.path.basename(path))
+            check_image(field.formfield().clean(image))
+            image.seek(0)
+            return default_storage.save(
+                field.generate_filename(None, image.name), image
+            ), None
+    except OSError as error:
+        return None, f'Картинка {path}: {error.strerror}'
+    except Exception as error:
+        messages = getattr(error, 'messages', [str(error)])
+        return None, f'Картинка {path}: {" ".join(messages)}'
+
+
+def form_errors(form):
+    return '; '.join(
+        f'{field}: {" ".join(errors)}' for field, errors in form.errors.items()
+    )
+
+
+def source_key(record, field):
+    value = record.get(field)
+    return '' if value is None else str(value).strip()
+
+
+def parse_date(value):
+    if not value:
+        return None
+    date = parse_datetime(value)
+    if date is None:
+        raise RowError(f'Некорректная дата: {value}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def set_dates(model, field, rows):
+    """Проставляет даты по парам (объект, дата) одним executemany:
+    поля с auto_now_add bulk_create перезаписывает текущим временем."""
+    field = model._meta.get_field(field)
+    params = []
+    for obj, date in rows:
+        if date:
+            setattr(obj, field.attname, date)
+            params.append((field.get_db_prep_value(date, connection), obj.pk))
+    if not params:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {model._meta.db_table} SET {field.column} = %s '
+            f'WHERE {model._meta.pk.column} = %s',
+            params,
+        )
+
+
+def allocate_ids(model, count):
+    """Первичные ключи для bulk_create, если база не возвращает их сама.
+
+    Вызывается внутри транзакции после первой записи в ней: в SQLite
+    запись уже держит блокировку, и новых строк до коммита не появится.
+    Отсчёт ведётся от sqlite_sequence, как у AUTOINCREMENT: ключи
+    удалённых строк повторно не выдаются.
+    """
+    last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT seq FROM sqlite_sequence WHERE name = %s',
+                [model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row is not None:
+            last = max(last, row[0])
+    return range(last + 1, last + 1 + count)
+
+
+class Importer:
+    def __init__(self, source, images_dir=None, batch_size=1000, workers=0,
+                 create_missing=False, default_author=None, log=None):
+        self.source = source
+        self.images_dir = images_dir
+        self.batch_size = batch_size
+        self.workers = workers
+        self.create_missing = create_missing
+        self.default_author = default_author
+        self.log = log or (lambda message: None)
+        self.pool = None
+        self.counts = dict.fromkeys(
+            ('posts', 'comments', 'duplicates', 'skipped', 'errors'), 0
+        )
+
+    def run(self, records):
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(
+            source=self.source
+        )
+        records = itertools.islice(
+            enumerate(records, 1), checkpoint.position, None
+        )
+        try:
+            while True:
+                batch = list(itertools.islice(records, self.batch_size))
+                if not batch:
+                    break
+                self.import_batch(checkpoint, batch)
+                self.log(
+                    f'Записей: {checkpoint.position}, постов: '
+                    f'{self.counts["posts"]}, комментариев: '
+                    f'{self.counts["comments"]}'
+                )
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+        return self.counts
+
+    def error(self, position, message):
+        self.counts['errors'] += 1
+        self.log(f'Запись {position}: {message}')
+
+    def import_batch(self, checkpoint, batch):
+        posts, comments = [], []
+        for position, record in batch:
+            if isinstance(record, RowError):
+                self.error(position, record)
+            elif record.get('type') == 'post':
+                posts.append((position, record))
+            elif record.get('type') == 'comment':
+                comments.append((position, record))
+            else:
+                self.counts['skipped'] += 1
+        users = self.resolve_users(posts + comments)
+        groups = self.resolve_groups(posts)
+        posts = self.validate_posts(posts, users, groups)
+        comments = self.validate_comments(comments, users)
+        posts = self.store_images(posts)
+        try:
+            with transaction.atomic():
+                # Первой пишется контрольная точка: в SQLite она берёт
+                # блокировку записи до выделения ключей.
+                checkpoint.position = batch[-1][0]
+                checkpoint.save()
+                created_posts = self.create_posts(posts)
+                created_comments = self.create_comments(comments)
+                self.refresh(created_posts, created_comments)
+        except BaseException:
+            # Пачка будет импортирована заново, вместе с картинками.
+            for _, _, post, _, _ in posts:
+                if post.image:
+                    default_storage.delete(post.image.name)
+            raise
+        self.counts['posts'] += len(created_posts)
+        self.counts['comments'] += len(created_comments)
+
+    def username(self, record):
+        return (record.get('author') or self.default_author or '').strip()
+
+    def resolve_users(self, records):
+        names = {self.username(record) for _, record in records} - {''}
+        users = dict(User.objects.filter(
+            username__in=names
+        ).values_list('username', 'pk'))
+        missing = names - users.keys()
+        if missing and self.create_missing:
+            # Перенесённые авторы входят через сброс пароля.
+            password = make_password(None)
+            User.objects.bulk_create(
+                (User(username=name, password=password) for name in missing),
+                ignore_conflicts=True,
+            )
+            users.update(User.objects.filter(
+                username__in=missing
+            ).values_list('username', 'pk'))
+        return users
+
+    def resolve_groups(self, posts):
+        slugs = {record.get('group') for _, record in posts} - {None, ''}
+        groups = dict(Group.objects.filter(
+            slug__in=slugs
+        ).values_list('slug', 'pk'))
+        missing = slugs - groups.keys()
+        if missing and self.create_missing:
+            Group.objects.bulk_create(
+                (Group(title=slug, slug=slug, description='')
+                 for slug in missing),
+                ignore_conflicts=True,
+            )
+            groups.update(Group.objects.filter(
+                slug__in=missing
+            ).values_list('slug', 'pk'))
+        return groups
+
+    def validate_posts(self, posts, users, groups):
+        source_ids = {source_key(record, 'id') for _, record in posts}
+        imported = set(ImportedPost.objects.filter(
+            source=self.source, source_id__in=source_ids
+        ).values_list('source_id', flat=True))
+        valid = []
+        for position, record in posts:
+            source_id = source_key(record, 'id')
+            if source_id in imported:
+                self.counts['duplicates'] += 1
+                continue
+            try:
+                if not source_id:
+                    raise RowError('Не указан id поста в источнике')
+                author = users.get(self.username(record))
+                if author is None:
+                    raise RowError(
+                        f'Неизвестный автор: {self.username(record)}'
+                    )
+                slug = record.get('group') or None
+                if slug and slug not in groups:
+                    raise RowError(f'Неизвестная группа: {slug}')
+                form = PostForm(data={'text': record.get('text', '')})
+                if not form.is_valid():
+                    raise RowError(form_errors(form))
+                pub_date = parse_date(record.get('pub_date'))
+            except RowError as error:
+                self.error(position, error)
+                continue
+            imported.add(source_id)
+            post = form.instance
+            post.author_id = author
+            post.group_id = groups.get(slug)
+            valid.append((position, source_id, post, pub_date,
+                          record.get('image') or None))
+        return valid
+
+    def validate_comments(self, comments, users):
+        valid = []
+        for position, record in comments:
+            try:
+                author = users.get(self.username(record))
+                if author is None:
+                    raise RowError(
+                        f'Неизвестный автор: {self.username(record)}'
+                    )
+                source_id = source_key(record, 'post')
+                if not source_id:
+                    raise RowError('Не указан id поста в источнике')
+                form = CommentForm(data={'text': record.get('text', '')})
+                if not form.is_valid():
+                    raise RowError(form_errors(form))
+                created = parse_date(record.get('created'))
+            except RowError as error:
+                self.error(position, error)
+                continue
+            comment = form.instance
+            comment.author_id = author
+            valid.append((position, source_id, comment, created))
+        return valid
+
+    def store_images(self, posts):
+        failed = set()
+        jobs = []
+        root = self.images_dir and os.path.realpath(self.images_dir)
+        for item in posts:
+            position, image = item[0], item[4]
+            if not image:
+                continue
+            if not root:
+                self.error(position, 'Не указан каталог картинок')
+                failed.add(position)
+                continue
+            path = os.path.realpath(os.path.join(root, image))
+            if not path.startswith(root + os.sep):
+                self.error(position, f'Картинка вне каталога: {image}')
+                failed.add(position)
+                continue
+            jobs.append((item, path))
+        if jobs and self.workers:
+            if self.pool is None:
+                # Дочерние процессы не должны наследовать открытые
+                # соединения с базой.
+                connections.close_all()
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            results = self.pool.map(store_image, [path for _, path in jobs])
+        else:
+            results = map(store_image, [path for _, path in jobs])
+        for (item, _), (name, error) in zip(jobs, results):
+            if error:
+                self.error(item[0], error)
+                failed.add(item[0])
+            else:
+                item[2].image = name
+        return [item for item in posts if item[0] not in failed]
+
+    def create_posts(self, posts):
+        if not posts:
+            return []
+        objects = [post for _, _, post, _, _ in posts]
+        if not connection.features.can_return_ids_from_bulk_insert:
+            for post, pk in zip(objects, allocate_ids(Post, len(objects))):
+                post.pk = pk
+        Post.objects.bulk_create(objects, batch_size=500)
+        set_dates(Post, 'pub_date', (
+            (post, pub_date) for _, _, post, pub_date, _ in posts
+        ))
+        ImportedPost.objects.bulk_create(
+            (
+                ImportedPost(
+                    source=self.source, source_id=source_id, post_id=post.pk
+                )
+                for _, source_id, post, _, _ in posts
+            ),
+            batch_size=500,
+        )
+        search.index_many((post.pk, post.text) for post in objects)
+        thumbnails.enqueue_many([post.pk for post in objects if post.image])
+        return objects
+
+    def create_comments(self, comments):
+        post_ids = dict(ImportedPost.objects.filter(
+            source=self.source,
+            source_id__in={source_id for _, source_id, _, _ in comments},
+        ).values_list('source_id', 'post_id'))
+        objects, dates = [], []
+        for position, source_id, comment, created in comments:
+            if source_id not in post_ids:
+                self.error(position, f'Неизвестный пост: {source_id}')
+                continue
+            comment.post_id = post_ids[source_id]
+            objects.append(comment)
+            dates.append(created)
+        if not objects:
+            return []
+        if not connection.features.can_return_ids_from_bulk_insert:
+            for comment, pk in zip(
+                objects, allocate_ids(Comment, len(objects))
+            ):
+                comment.pk = pk
+        Comment.objects.bulk_create(objects, batch_size=500)
+        set_dates(Comment, 'created', zip(objects, dates))
+        return objects
+
+    def refresh(self, posts, comments):
+        """Счётчики, ленты подписок и кеш лент: bulk_create не шлёт
+        сигналов, которые поддерживают их при обычном сохранении."""
+        authors = {post.author_id for post in posts}
+        if not authors and not comments:
+            return
+        AuthorStats.objects.rebuild(
+            authors | {comment.author_id for comment in comments}
+        )
+        # Только новые посты: ленты подписчиков целиком не пересобираются.
+        TimelineEntry.objects.fan_out_many(posts)
+        groups = {post.group_id for post in posts} - {None}
+        if groups:
+            GroupStats.objects.rebuild(groups)
+        trending.record(comments)
+        # Комментарии меняют счётчики в лентах своих постов.
+        touched = {(post.author_id, post.group_id) for post in posts}
+        touched.update(Post.objects.filter(
+            pk__in={comment.post_id for comment in comments}
+        ).values_list('author_id', 'group_id').distinct())
+        scopes = {feed_cache.INDEX}
+        for author_id, group_id in touched:
+            scopes.update(feed_cache.post_scopes(author_id, group_id))
+        transaction.on_commit(lambda: feed_cache.bump(*scopes))
@@ -0,0 +1,105 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from posts.bench import format_summary, seed_posts, temporary_database
+from posts.models import Post
+
+
+def reset_caches():
+    # Экземпляры кешей создаются лениво в каждом потоке; после смены
+    # settings.CACHES старые экземпляры нужно забыть.
+    for cache in caches.all():
+        cache.close()
+    caches._caches.caches = {}
+
+
+def reader(requests, results):
+    connections.close_all()
+    reset_caches()
+    client = Client()
+    timings, hits, stale = [], 0, 0
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get('/')
+            timings.append(time.perf_counter() - start)
+        if not any('posts_post' in query['sql'] for query in queries):
+            hits += 1
+        newest = Post.objects.order_by('-pk').values_list('pk', flat=True)[0]
+        if f'/posts/{newest}/'.encode() not in response.content:
+            stale += 1
+    results.put((timings, hits, stale))
+
+
+def writer(interval, stop):
+    connections.close_all()
+    reset_caches()
+    author = Post.objects.values_list('author_id', flat=True)[0]
+    while not stop.is_set():
+        Post.objects.create(text='Новый пост', author_id=author)
+        time.sleep(interval * random.uniform(0.5, 1.5))
+
+
+class Command(BaseCommand):
+    help = ('Замеряет долю попаданий в кеш и p99 страницы index '
+            'при нескольких процессах-воркерах')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--write-interval', type=float, default=0.5)
+        parser.add_argument(
+            '--backend', action='append', choices=settings.CACHE_BACKENDS,
+        )
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        old_caches = settings.CACHES
+        with temporary_database(), tempfile.TemporaryDirectory() as tmp:
+            seed_posts(options['posts'])
+            connections.close_all()
+            for name in options['backend'] or settings.CACHE_BACKENDS:
+                backend = dict(settings.CACHE_BACKENDS[name])
+                if 'LOCATION' in backend:
+                    backend['LOCATION'] = os.path.join(tmp, f'{name}.db')
+                settings.CACHES = {'default': backend}
+                reset_caches()
+                results, stop = context.Queue(), context.Event()
+                writer_process = context.Process(
+                    target=writer, args=(options['write_interval'], stop)
+                )
+                writer_process.start()
+                readers = [
+                    context.Process(
+                        target=reader, args=(options['requests'], results)
+                    )
+                    for _ in range(options['workers'])
+                ]
+                for process in readers:
+                    process.start()
+                collected = [results.get() for _ in readers]
+                for process in readers:
+                    process.join()
+                stop.set()
+                writer_process.join()
+                timings = [t for result in collected for t in result[0]]
+                hits = sum(result[1] for result in collected)
+                stale = sum(result[2] for result in collected)
+                self.stdout.write(format_summary(name, timings))
+                self.stdout.write(
+                    f'{"":<30} hit rate={hits / len(timings):.1%} '
+                    f'stale={stale / len(timings):.1%}'
+                )
+        settings.CACHES = old_caches
+        reset_caches()
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from posts.bench import format_summary, measure, seed_posts, summary
+from posts.bench import temporary_database
+from posts.management.commands.bench_cache import reset_caches
+from posts.models import Post
+
+MIDDLEWARE = 'core.middleware.instrumentation.InstrumentationMiddleware'
+
+
+def plain_settings():
+    """Настройки без замеров: обычные шаблонизатор, кеш и middleware."""
+    templates = [dict(settings.TEMPLATES[0])]
+    templates[0]['BACKEND'] = (
+        'django.template.backends.django.DjangoTemplates'
+    )
+    return override_settings(
+        MIDDLEWARE=[name for name in settings.MIDDLEWARE
+                    if name != MIDDLEWARE],
+        TEMPLATES=templates,
+        CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }},
+    )
+
+
+class Command(BaseCommand):
+    help = 'Замеряет накладные расходы middleware замеров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--rounds', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=100)
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            seed_posts(options['posts'])
+            post = Post.objects.order_by('-pk').first()
+            urls = ('/', f'/posts/{post.pk}/')
+            for url in urls:
+                client = Client()
+                timings = {'off': [], 'on': []}
+
+                def get():
+                    client.get(url)
+
+                # Прогоны чередуются, чтобы дрейф машины влиял на оба.
+                for _ in range(options['rounds']):
+                    with plain_settings():
+                        reset_caches()
+                        get()
+                        timings['off'] += measure(get, options['requests'])
+                    reset_caches()
+                    get()
+                    timings['on'] += measure(get, options['requests'])
+                for label, values in timings.items():
+                    self.stdout.write(format_summary(f'{url} {label}', values))
+                off, on = summary(timings['off']), summary(timings['on'])
+                p50 = on['p50'] / off['p50'] - 1
+                mean = on['mean'] / off['mean'] - 1
+                self.stdout.write(
+                    f'{url:<30} overhead p50={p50:+.2%} mean={mean:+.2%}'
+                )
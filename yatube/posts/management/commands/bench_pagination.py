@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+
+from posts.bench import (format_summary, measure, seed_posts, summary,
+                         temporary_database)
+from posts.func import AFTER, CursorPaginator, encode_cursor
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает OFFSET- и курсорную пагинацию ленты на глубокой '
+            'странице: до и после перехода на курсоры')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--page', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        per_page = settings.POSTS_COUNT
+        number = options['page']
+        with temporary_database():
+            seed_posts(max(options['posts'], number * per_page))
+            # Тот же запрос, что у лент: с автором, группой, числом
+            # комментариев и статусом миниатюры.
+            posts = Post.objects.feed()
+            token = None
+            if number > 1:
+                anchor = posts.order_by('-pub_date', '-id')[
+                    (number - 1) * per_page - 1
+                ]
+                token = encode_cursor(AFTER, anchor.pub_date, anchor.pk)
+
+            def offset_page():
+                page = Paginator(posts, per_page).page(number)
+                list(page)
+                page.has_next()
+
+            def cursor_page():
+                page = CursorPaginator(posts, per_page).page(token)
+                list(page)
+                page.paginator.next_cursor
+
+            before = measure(offset_page, options['repeat'])
+            after = measure(cursor_page, options['repeat'])
+            self.stdout.write(format_summary(f'offset page {number}', before))
+            self.stdout.write(format_summary(f'cursor page {number}', after))
+            speedup = summary(before)['p50'] / (summary(after)['p50'] or 1)
+            self.stdout.write(f'до/после (p50): в {speedup:.1f} раза быстрее')
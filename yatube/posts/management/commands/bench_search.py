@@ -0,0 +1,48 @@
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import search
+from posts.bench import (VOCABULARY, format_summary, measure, random_text,
+                         seed_posts, temporary_database)
+from posts.models import Post
+
+QUERY_RANKS = (1, 10, 100, 1000)
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает поиск через LIKE и через полнотекстовый индекс'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        limit = settings.SEARCH_RESULTS_LIMIT
+        queries = [
+            (f'ранг {rank}', VOCABULARY[rank - 1] + 'ами')
+            for rank in QUERY_RANKS
+        ]
+        queries.append(('два слова', f'{VOCABULARY[9]} {VOCABULARY[99]}'))
+        rng = random.Random(0)
+        with temporary_database():
+            seed_posts(
+                options['posts'], batch_size=5000,
+                text=lambda i: random_text(rng),
+            )
+            search.rebuild(batch_size=5000)
+            for label, query in queries:
+                def like():
+                    # Как поиск админки: счётчик и первая страница.
+                    found = Post.objects.filter(text__icontains=query)
+                    found.count()
+                    list(found.values_list('pk', flat=True)[:limit])
+
+                def fts():
+                    search.post_ids(query, limit)
+
+                for method, func in (('like', like), ('fts', fts)):
+                    self.stdout.write(format_summary(
+                        f'{method} {label}', measure(func, options['repeat'])
+                    ))
@@ -0,0 +1,124 @@
+import logging
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from django.test import Client
+from django.urls import reverse
+
+from posts.bench import format_summary, seed_posts, temporary_database
+from posts.management.commands.bench_cache import reset_caches
+from posts.models import Post
+
+User = get_user_model()
+
+# Без кеша каждое чтение доходит до базы.
+DUMMY_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+def client_loop(user_id, post_id, seconds, results):
+    connections.close_all()
+    reset_caches()
+    # Каждая ошибка «database is locked» пишется в лог django.request.
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    client = Client()
+    if user_id is None:
+        url, data = reverse('posts:index'), None
+    else:
+        client.force_login(User.objects.get(pk=user_id))
+        url = reverse('posts:add_comment', args=[post_id])
+        data = {'text': 'Комментарий'}
+    timings, errors = [], 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            if data is None:
+                client.get(url)
+            else:
+                client.post(url, data)
+        except OperationalError:
+            errors += 1
+            continue
+        timings.append(time.perf_counter() - start)
+    results.put((user_id is not None, timings, errors))
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность чтения и записи при '
+            'одновременных клиентах: SQLite по умолчанию и с настройками '
+            'из DATABASES (PRAGMA, IMMEDIATE, CONN_MAX_AGE)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--posts', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        old = settings.CACHES, settings.THROTTLE_RATES
+        database = connections.databases['default']
+        old_options = database['OPTIONS']
+        old_max_age = database['CONN_MAX_AGE']
+        scenarios = (
+            # Режим журнала хранится в файле, поэтому его нужно вернуть.
+            ('по умолчанию', {'pragmas': {'journal_mode': 'DELETE'}}, 0),
+            ('PRAGMA и CONN_MAX_AGE', old_options, old_max_age),
+        )
+        settings.CACHES = DUMMY_CACHE
+        settings.THROTTLE_RATES = {}
+        with temporary_database():
+            seed_posts(options['posts'])
+            post_id = Post.objects.values_list('pk', flat=True).first()
+            writers = [
+                User.objects.create_user(username=f'writer_{i}').pk
+                for i in range(options['writers'])
+            ]
+            for label, db_options, max_age in scenarios:
+                database['OPTIONS'] = db_options
+                database['CONN_MAX_AGE'] = max_age
+                connections.close_all()
+                # Новое соединение переключает режим журнала файла.
+                connections['default'].ensure_connection()
+                connections.close_all()
+                reset_caches()
+                results = context.Queue()
+                clients = [None] * options['readers'] + writers
+                processes = [
+                    context.Process(
+                        target=client_loop,
+                        args=(user_id, post_id, options['seconds'], results),
+                    )
+                    for user_id in clients
+                ]
+                for process in processes:
+                    process.start()
+                collected = [results.get() for _ in processes]
+                for process in processes:
+                    process.join()
+                for is_writer, kind in ((False, 'чтение'), (True, 'запись')):
+                    timings = [
+                        t for writer, result, _ in collected
+                        if writer == is_writer for t in result
+                    ]
+                    errors = sum(
+                        count for writer, _, count in collected
+                        if writer == is_writer
+                    )
+                    self.stdout.write(
+                        format_summary(f'{label}: {kind}', timings)
+                    )
+                    self.stdout.write(
+                        f'{"":<30} {len(timings) / options["seconds"]:.1f} '
+                        f'запросов/с, ошибок блокировки: {errors}'
+                    )
+        database['OPTIONS'] = old_options
+        database['CONN_MAX_AGE'] = old_max_age
+        settings.CACHES, settings.THROTTLE_RATES = old
+        reset_caches()
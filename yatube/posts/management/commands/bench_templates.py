@@ -0,0 +1,80 @@
+import copy
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.template.loader import render_to_string
+from django.test import RequestFactory, override_settings
+
+from posts import feed_cache
+from posts.bench import (format_summary, measure, seed_posts,
+                         temporary_database)
+from posts.func import make_paginator
+from posts.models import Post
+
+PLAIN_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+CACHED_LOADERS = [('django.template.loaders.cached.Loader', PLAIN_LOADERS)]
+
+
+def templates_with(loaders):
+    templates = copy.deepcopy(settings.TEMPLATES)
+    templates[0]['OPTIONS']['loaders'] = loaders
+    return templates
+
+
+class Command(BaseCommand):
+    help = ('Замеряет рендер index.html при разном числе постов на '
+            'странице: без кеша шаблонов, с кешем шаблонов и с '
+            'кешем карточек')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--per-page', type=int, action='append',
+            help='Постов на странице; по умолчанию 10, 50 и 200',
+        )
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        sizes = options['per_page'] or [10, 50, 200]
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        modes = (
+            ('без кеша', PLAIN_LOADERS, False),
+            ('кеш шаблонов', CACHED_LOADERS, False),
+            ('кеш шаблонов и карточек', CACHED_LOADERS, True),
+        )
+        with temporary_database():
+            seed_posts(max(sizes))
+            for per_page in sizes:
+                page = make_paginator(request, Post.objects.feed(), per_page)
+                # Запрос к базе — не часть рендера.
+                list(page)
+                page.paginator.next_cursor
+                for label, loaders, warm_cards in modes:
+                    with override_settings(TEMPLATES=templates_with(loaders)):
+                        engines.all()[0].precompile()
+                        cache.clear()
+
+                        def render():
+                            if not warm_cards:
+                                cache.clear()
+                            # Страница ленты всегда рендерится заново.
+                            feed_cache.bump(feed_cache.INDEX)
+                            render_to_string('posts/index.html', {
+                                'page_obj': page,
+                                **feed_cache.fragment_context(
+                                    request, feed_cache.INDEX
+                                ),
+                            }, request)
+
+                        render()
+                        self.stdout.write(format_summary(
+                            f'{per_page}: {label}',
+                            measure(render, options['repeat']),
+                        ))
+        cache.clear()
@@ -0,0 +1,124 @@
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from django.test import Client
+from django.urls import reverse
+
+from posts.bench import format_summary, seed_posts, temporary_database
+from posts.management.commands.bench_cache import reset_caches
+from posts.models import Post
+
+User = get_user_model()
+
+
+def reader(requests, results):
+    connections.close_all()
+    reset_caches()
+    client = Client()
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        client.get(reverse('posts:index'))
+        timings.append(time.perf_counter() - start)
+    results.put(timings)
+
+
+def writer(user_id, post_id, stop, results):
+    connections.close_all()
+    reset_caches()
+    client = Client()
+    client.force_login(User.objects.get(pk=user_id))
+    # Каждый ответ 429 и «database is locked» пишется в лог django.request.
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    url = reverse('posts:add_comment', args=[post_id])
+    accepted = throttled = locked = 0
+    while not stop.is_set():
+        try:
+            response = client.post(url, {'text': 'Спам'})
+        except OperationalError:
+            # «database is locked»: запись не дождалась блокировки.
+            locked += 1
+            continue
+        if response.status_code == 429:
+            throttled += 1
+        else:
+            accepted += 1
+    results.put((accepted, throttled, locked))
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку чтения index, пока несколько клиентов '
+            'заваливают сайт комментариями, с лимитом записей и без')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=300)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--rate', default='10/m')
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        old_caches, old_rates = settings.CACHES, settings.THROTTLE_RATES
+        scenarios = (
+            ('без записей', 0, {}),
+            ('поток записей без лимита', options['writers'], {}),
+            (
+                f'поток записей, {options["rate"]}',
+                options['writers'],
+                {'add_comment': options['rate']},
+            ),
+        )
+        with temporary_database(), tempfile.TemporaryDirectory() as tmp:
+            seed_posts(options['posts'])
+            post_id = Post.objects.values_list('pk', flat=True).first()
+            spammers = [
+                User.objects.create_user(username=f'spammer_{i}').pk
+                for i in range(options['writers'])
+            ]
+            connections.close_all()
+            # Бакеты общие для процессов только в общем кеше.
+            backend = dict(settings.CACHE_BACKENDS['sqlite'])
+            for label, writers, rates in scenarios:
+                backend['LOCATION'] = os.path.join(tmp, f'{len(rates)}.db')
+                settings.CACHES = {'default': backend}
+                settings.THROTTLE_RATES = rates
+                reset_caches()
+                results, written, stop = (
+                    context.Queue(), context.Queue(), context.Event()
+                )
+                flood = [
+                    context.Process(
+                        target=writer,
+                        args=(spammers[i], post_id, stop, written),
+                    )
+                    for i in range(writers)
+                ]
+                for process in flood:
+                    process.start()
+                measuring = context.Process(
+                    target=reader, args=(options['requests'], results)
+                )
+                measuring.start()
+                timings = results.get()
+                measuring.join()
+                stop.set()
+                counts = [written.get() for _ in flood]
+                for process in flood:
+                    process.join()
+                self.stdout.write(format_summary(label, timings))
+                if counts:
+                    self.stdout.write(
+                        f'{"":<30} записей: '
+                        f'{sum(c[0] for c in counts)}, '
+                        f'отклонено: {sum(c[1] for c in counts)}, '
+                        f'ошибок блокировки: {sum(c[2] for c in counts)}'
+                    )
+        settings.CACHES, settings.THROTTLE_RATES = old_caches, old_rates
+        reset_caches()
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.bench import (format_summary, measure, seed_posts,
+                         temporary_database)
+from posts.func import CursorPaginator
+from posts.models import Follow, Post, TimelineEntry, User
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает чтение ленты подписок через JOIN и через timeline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=2000)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            authors = seed_posts(options['posts'], options['authors'])
+            reader = User.objects.create(username='reader')
+            Follow.objects.bulk_create(
+                Follow(user=reader, author=author)
+                for author in authors[::2]
+            )
+            TimelineEntry.objects.rebuild([reader.pk])
+
+            def read(queryset):
+                def page():
+                    paginator = CursorPaginator(
+                        queryset.feed(), settings.POSTS_COUNT
+                    )
+                    list(paginator.page())
+                return page
+
+            join = Post.objects.filter(author__following__user=reader)
+            timeline = TimelineEntry.objects.posts_for(reader)
+            for label, queryset in (('join', join), ('timeline', timeline)):
+                self.stdout.write(format_summary(
+                    label, measure(read(queryset), options['repeat'])
+                ))
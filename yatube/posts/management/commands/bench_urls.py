@@ -0,0 +1,207 @@
+import json
+import os
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db.models import Count
+from django.test import Client
+from django.urls import URLPattern, reverse
+
+from posts import urls as posts_urls
+from posts.bench import summary
+from posts.models import Group, Post, User
+
+RESULTS_DIR = os.path.join(settings.BASE_DIR, 'bench_results')
+# Маршруты, которые пишут в базу или принимают только POST: GET к ним
+# мерил бы редиректы, 405 и ответы 429 ограничителя, а не чтение.
+WRITE_ROUTES = {
+    'add_comment', 'profile_follow', 'profile_unfollow', 'api_follow_bulk',
+}
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет адреса чтения posts.urls через тестовый клиент или '
+            'локальный WSGI-сервер и сохраняет пропускную способность и '
+            'перцентили задержки для сравнения между коммитами')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument(
+            '--wsgi', action='store_true',
+            help='Гонять запросы через локальный WSGI-сервер',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Число параллельных клиентов в режиме --wsgi',
+        )
+        parser.add_argument('--output', help='Файл для результатов (JSON)')
+        parser.add_argument(
+            '--compare', help='Файл прошлых результатов для сравнения',
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.annotate(
+            total=Count('follower')
+        ).order_by('-total').first()
+        if user is None or not Post.objects.exists():
+            raise CommandError('База пуста: сначала запустите seed_data')
+        client = Client()
+        client.force_login(user)
+        targets = self.targets(user)
+        if options['wsgi']:
+            results = self.run_wsgi(client, targets, options)
+        else:
+            results = self.run_client(client, targets, options['requests'])
+        report = {
+            'revision': git_revision(),
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'mode': 'wsgi' if options['wsgi'] else 'client',
+            'requests': options['requests'],
+            'results': results,
+        }
+        previous = None
+        if options['compare']:
+            with open(options['compare']) as file:
+                previous = json.load(file)['results']
+        for name, result in results.items():
+            self.stdout.write(self.format_result(
+                name, result, previous.get(name) if previous else None
+            ))
+        path = options['output'] or os.path.join(
+            RESULTS_DIR, f'{report["revision"]}-{report["mode"]}.json'
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты сохранены в {path}')
+
+    def targets(self, user):
+        """Адреса маршрутов чтения posts.urls с подставленными данными."""
+        post = Post.objects.filter(author=user).first()
+        if post is None:
+            post = Post.objects.annotate(
+                total=Count('comments')
+            ).order_by('-total').first()
+        author = User.objects.exclude(pk=user.pk).annotate(
+            total=Count('following')
+        ).order_by('-total').first() or user
+        group = Group.objects.annotate(
+            total=Count('group_of_posts')
+        ).order_by('-total').first()
+        values = {
+            'post_id': post.pk,
+            'username': author.username,
+            'slug': group.slug if group else 'missing',
+        }
+        targets = {}
+        for pattern in posts_urls.urlpatterns:
+            if (
+                not isinstance(pattern, URLPattern)
+                or pattern.name in WRITE_ROUTES
+            ):
+                continue
+            kwargs = {
+                name: values[name]
+                for name in pattern.pattern.converters
+            }
+            targets[pattern.name] = reverse(
+                f'{posts_urls.app_name}:{pattern.name}', kwargs=kwargs
+            )
+        return targets
+
+    def run_client(self, client, targets, requests):
+        results = {}
+        for name, url in targets.items():
+            client.get(url)
+            timings = []
+            start = time.perf_counter()
+            for _ in range(requests):
+                began = time.perf_counter()
+                client.get(url)
+                timings.append(time.perf_counter() - began)
+            results[name] = self.result(url, timings, start)
+        return results
+
+    def run_wsgi(self, client, targets, options):
+        server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler)
+        server.set_app(WSGIHandler())
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        host, port = server.server_address
+        cookie = f'{settings.SESSION_COOKIE_NAME}=' + client.cookies[
+            settings.SESSION_COOKIE_NAME
+        ].value
+
+        def fetch(url):
+            request = urllib.request.Request(
+                f'http://{host}:{port}{url}', headers={'Cookie': cookie}
+            )
+            began = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+            except urllib.error.HTTPError:
+                pass
+            return time.perf_counter() - began
+
+        results = {}
+        try:
+            with ThreadPoolExecutor(options['concurrency']) as pool:
+                for name, url in targets.items():
+                    fetch(url)
+                    start = time.perf_counter()
+                    timings = list(pool.map(
+                        fetch, [url] * options['requests']
+                    ))
+                    results[name] = self.result(url, timings, start)
+        finally:
+            server.shutdown()
+            server.server_close()
+        return results
+
+    def result(self, url, timings, start):
+        elapsed = time.perf_counter() - start
+        return {
+            'url': url,
+            'rps': round(len(timings) / elapsed, 2),
+            **{
+                key: round(value, 3)
+                for key, value in summary(timings).items()
+            },
+        }
+
+    def format_result(self, name, result, previous):
+        line = (
+            f'{name:<20} {result["rps"]:8.1f} rps '
+            f'p50={result["p50"]:8.2f}ms p95={result["p95"]:8.2f}ms '
+            f'p99={result["p99"]:8.2f}ms'
+        )
+        if previous:
+            change = result['p50'] / previous['p50'] - 1
+            line += f'  p50 {change:+.1%}'
+        return line
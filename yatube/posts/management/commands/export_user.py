@@ -0,0 +1,46 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = ('Выгружает архив пользователя (посты, комментарии, подписки) '
+            'в NDJSON или ZIP потоково, не загружая его целиком')
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument(
+            '--format', choices=export.FORMATS, default='ndjson'
+        )
+        parser.add_argument(
+            '--output', '-o',
+            help='Файл архива; по умолчанию — стандартный вывод',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(
+                f'Пользователь {options["username"]} не найден'
+            )
+        chunks = export.stream(user, options['format'])
+        if not options['output']:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            return
+        try:
+            file = open(options['output'], 'wb')
+        except OSError as error:
+            raise CommandError(error)
+        written = 0
+        with file:
+            for chunk in chunks:
+                file.write(chunk)
+                written += len(chunk)
+        self.stderr.write(self.style.SUCCESS(
+            f'Архив {options["output"]}: {written} байт'
+        ))
@@ -0,0 +1,64 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts.models import Follow, User
+
+
+def chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = ('Импортирует подписки из CSV со столбцами user,author '
+            '(имена пользователей). Файл читается потоково, пачками')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument(
+            '--no-header', action='store_true',
+            help='В первой строке файла нет заголовка',
+        )
+
+    def handle(self, *args, **options):
+        added = skipped = rows_total = 0
+        missing = set()
+        try:
+            file = open(options['path'], newline='', encoding='utf-8')
+        except OSError as error:
+            raise CommandError(error)
+        with file:
+            reader = csv.reader(file)
+            if not options['no_header']:
+                next(reader, None)
+            for chunk in chunks(reader, options['chunk_size']):
+                pairs = [row[:2] for row in chunk if len(row) >= 2]
+                skipped += len(chunk) - len(pairs)
+                rows_total += len(chunk)
+                names = {name for pair in pairs for name in pair}
+                users = dict(User.objects.filter(
+                    username__in=names
+                ).values_list('username', 'pk'))
+                missing |= names - users.keys()
+                with transaction.atomic():
+                    added += len(Follow.objects.add_edges(
+                        (users[user], users[author])
+                        for user, author in pairs
+                        if user in users and author in users
+                    ))
+                self.stdout.write(
+                    f'Строк: {rows_total}, новых подписок: {added}'
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: строк {rows_total}, новых подписок {added}, '
+            f'пропущено строк {skipped}, неизвестных имён {len(missing)}'
+        ))
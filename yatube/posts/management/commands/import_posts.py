@@ -0,0 +1,57 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.importer import Importer, read_records
+
+
+class Command(BaseCommand):
+    help = ('Импортирует посты и комментарии из дампа NDJSON или CSV '
+            'потоково, пачками. Прерванный импорт продолжается с '
+            'контрольной точки')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--source',
+            help='Имя источника для контрольной точки и поиска дублей; '
+                 'по умолчанию — имя файла',
+        )
+        parser.add_argument(
+            '--images-dir',
+            help='Каталог, относительно которого указаны картинки постов',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Процессов для картинок; 0 — обрабатывать на месте',
+        )
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Создавать неизвестных авторов и группы',
+        )
+        parser.add_argument(
+            '--author',
+            help='Автор записей, в которых он не указан',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f'Файл {path} не найден')
+        importer = Importer(
+            source=options['source'] or os.path.basename(path),
+            images_dir=options['images_dir'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            create_missing=options['create_missing'],
+            default_author=options['author'],
+            log=self.stderr.write,
+        )
+        counts = importer.run(read_records(path))
+        self.stdout.write(self.style.SUCCESS(
+            'Готово: постов {posts}, комментариев {comments}, дублей '
+            '{duplicates}, пропущено {skipped}, ошибок {errors}'.format(
+                **counts
+            )
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import AuthorStats
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает статистику авторов по постам, комментариям '
+        'и подпискам'
+    )
+
+    def handle(self, *args, **options):
+        rebuilt = AuthorStats.objects.rebuild()
+        self.stdout.write(f'Пересчитана статистика {rebuilt} авторов')
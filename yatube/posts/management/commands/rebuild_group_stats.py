@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import GroupStats
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает статистику групп: число постов, дату '
+            'последнего и самых активных авторов')
+
+    def handle(self, *args, **options):
+        rebuilt = GroupStats.objects.rebuild()
+        self.stdout.write(f'Пересчитана статистика {rebuilt} групп')
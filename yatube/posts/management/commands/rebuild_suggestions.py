@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import SuggestedAuthor
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рекомендации авторов по графу подписок и группам'
+
+    def handle(self, *args, **options):
+        rebuilt = SuggestedAuthor.objects.rebuild()
+        self.stdout.write(f'Сохранено рекомендаций: {rebuilt}')
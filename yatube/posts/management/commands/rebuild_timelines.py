@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Заново собирает материализованные ленты подписок'
+
+    def handle(self, *args, **options):
+        TimelineEntry.objects.rebuild()
+        self.stdout.write(
+            f'Записей в лентах: {TimelineEntry.objects.count()}'
+        )
@@ -0,0 +1,76 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.template.defaultfilters import filesizeformat
+
+from posts import thumbnails
+from posts.models import Post, ThumbnailJob
+
+# Номеров постов в одном запросе: меньше лимита переменных SQLite.
+CHUNK_SIZE = 500
+
+
+def post_chunks(pending):
+    """Номера постов с картинками порциями по CHUNK_SIZE в порядке pk.
+
+    С ``pending`` — только незавершённые задачи: в очереди и с ошибкой.
+    """
+    if pending:
+        field = 'post_id'
+        queryset = ThumbnailJob.objects.exclude(status=ThumbnailJob.DONE)
+    else:
+        field = 'pk'
+        queryset = Post.objects.exclude(image='')
+    queryset = queryset.order_by(field).values_list(field, flat=True)
+    last = 0
+    while True:
+        chunk = list(queryset.filter(**{f'{field}__gt': last})[:CHUNK_SIZE])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Параллельно сжимает картинки постов и готовит их миниатюры '
+        'на всех ядрах. Задачи, прерванные перезапуском сервера, сами '
+        'не возобновляются: их доделывает запуск с --pending'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pending', action='store_true',
+            help='Только задачи, оставшиеся в очереди или с ошибкой',
+        )
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        total = failed = saved = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for post_ids in post_chunks(options['pending']):
+                # Готовые задачи не сбрасываются: до замены оригинала
+                # ленты показывают старые миниатюры, а не заглушки.
+                ThumbnailJob.objects.bulk_create(
+                    (ThumbnailJob(post_id=pk) for pk in post_ids),
+                    ignore_conflicts=True,
+                )
+                # Дочерние процессы не должны наследовать открытые
+                # соединения.
+                connections.close_all()
+                chunksize = max(1, len(post_ids) // (workers * 4))
+                for _ in pool.map(
+                    thumbnails.run, post_ids, chunksize=chunksize
+                ):
+                    pass
+                jobs = ThumbnailJob.objects.filter(post_id__in=post_ids)
+                failed += jobs.filter(status=ThumbnailJob.FAILED).count()
+                saved += jobs.bytes_saved()
+                total += len(post_ids)
+        self.stdout.write(
+            f'Обработано картинок: {total}, с ошибкой: {failed}, '
+            f'сжатие сэкономило: {filesizeformat(saved)}'
+        )
@@ -0,0 +1,227 @@
+import io
+import os
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from posts import search, trending
+from posts.bench import random_text, zipf_weights
+from posts.importer import set_dates
+from posts.models import (AuthorStats, Comment, Follow, Group, GroupStats,
+                          Post, TimelineEntry, User)
+
+IMAGE_COLORS = ('#4682b4', '#b22222', '#228b22', '#daa520', '#6a5acd',
+                '#2f4f4f', '#ff7f50', '#708090')
+
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими данными реалистичного объёма: '
+            'пользователи, группы, посты с картинками, комментарии и '
+            'граф подписок со степенным распределением')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=200000)
+        parser.add_argument('--comments', type=int, default=500000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок одного пользователя',
+        )
+        parser.add_argument(
+            '--images', type=float, default=0.2,
+            help='Доля постов с картинкой',
+        )
+        parser.add_argument(
+            '--days', type=float, default=365,
+            help='За сколько дней до запуска разнести даты постов',
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--password', default='seed-password',
+            help='Пароль всех созданных пользователей',
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.span = timedelta(days=options['days']).total_seconds()
+        users = self.seed_users(options['users'], options['password'])
+        groups = self.seed_groups(options['groups'])
+        # Порядок пользователей задаёт их популярность: первые пишут
+        # больше и собирают больше подписчиков.
+        self.user_weights = zipf_weights(len(users))
+        posts = self.seed_posts(
+            options['posts'], users, groups, options['images']
+        )
+        self.seed_comments(options['comments'], users, posts)
+        self.seed_follows(options['follows'], users)
+        self.stdout.write(
+            'Пересчёт счётчиков, лент, поискового индекса и популярного...'
+        )
+        AuthorStats.objects.rebuild()
+        GroupStats.objects.rebuild()
+        TimelineEntry.objects.rebuild()
+        search.rebuild()
+        trending.rebuild()
+        # bulk_create не шлёт сигналов, поэтому версии кеша лент не
+        # сдвигались: сбрасываем кеш целиком.
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def insert(self, model, objects, **kwargs):
+        total = 0
+        for batch in batched(objects, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch, **kwargs)
+            total += len(batch)
+        self.stdout.write(f'{model.__name__}: {total}')
+
+    def spread_dates(self, model, field, start, dates):
+        """Проставляет даты строкам ``model`` с pk больше ``start``
+        по возрастанию pk: bulk_create ставит полям с auto_now_add одно
+        и то же «сейчас», а лентам и популярному нужен разброс."""
+        rows = zip(
+            model.objects.filter(pk__gt=start).order_by('pk').values_list(
+                'pk', flat=True
+            ).iterator(),
+            dates,
+        )
+        for batch in batched(rows, self.batch_size):
+            with transaction.atomic():
+                set_dates(model, field, (
+                    (model(pk=pk), date) for pk, date in batch
+                ))
+
+    def seed_users(self, count, password):
+        start = User.objects.filter(username__startswith='seed_').count()
+        password = make_password(password)
+        self.insert(User, (
+            User(username=f'seed_{i}', first_name=f'Автор {i}',
+                 password=password)
+            for i in range(start, start + count)
+        ))
+        return list(User.objects.filter(
+            username__startswith='seed_'
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def seed_groups(self, count):
+        start = Group.objects.filter(slug__startswith='seed-').count()
+        self.insert(Group, (
+            Group(title=f'Группа {i}', slug=f'seed-{i}',
+                  description=random_text(self.rng))
+            for i in range(start, start + count)
+        ))
+        return list(Group.objects.filter(
+            slug__startswith='seed-'
+        ).values_list('pk', flat=True))
+
+    def seed_images(self):
+        """Несколько картинок, общих для всех постов с картинкой."""
+        directory = os.path.join(settings.MEDIA_ROOT, 'posts')
+        os.makedirs(directory, exist_ok=True)
+        names = []
+        for i, color in enumerate(IMAGE_COLORS):
+            name = f'posts/seed_{i}.jpg'
+            path = os.path.join(settings.MEDIA_ROOT, name)
+            if not os.path.exists(path):
+                buffer = io.BytesIO()
+                Image.new('RGB', (1280, 720), color).save(
+                    buffer, 'JPEG', quality=85
+                )
+                with open(path, 'wb') as file:
+                    file.write(buffer.getvalue())
+            names.append(name)
+        return names
+
+    def seed_posts(self, count, users, groups, image_share):
+        images = self.seed_images() if image_share else []
+        authors = self.rng.choices(
+            users, cum_weights=self.user_weights, k=count
+        )
+
+        def posts():
+            for author in authors:
+                has_image = images and self.rng.random() < image_share
+                yield Post(
+                    text=random_text(self.rng),
+                    author_id=author,
+                    group_id=(
+                        self.rng.choice(groups)
+                        if groups and self.rng.random() < 0.6 else None
+                    ),
+                    image=self.rng.choice(images) if has_image else '',
+                )
+
+        start = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        self.insert(Post, posts())
+        # Посты равномерно разбросаны по периоду и идут по времени в
+        # порядке вставки.
+        offsets = sorted(self.rng.uniform(0, self.span) for _ in authors)
+        self.spread_dates(Post, 'pub_date', start, (
+            self.now - timedelta(seconds=self.span - offset)
+            for offset in offsets
+        ))
+        return dict(Post.objects.values_list('pk', 'pub_date'))
+
+    def seed_comments(self, count, users, posts):
+        if not posts:
+            return
+        # Комментируют в основном свежие посты.
+        post_weights = zipf_weights(len(posts), exponent=0.8)
+        newest_first = sorted(posts, reverse=True)
+        commented = self.rng.choices(
+            newest_first, cum_weights=post_weights, k=count
+        )
+        start = Comment.objects.aggregate(last=Max('pk'))['last'] or 0
+        self.insert(Comment, (
+            Comment(
+                post_id=post_id,
+                author_id=self.rng.choice(users),
+                text=random_text(self.rng, 1, 15),
+            )
+            for post_id in commented
+        ))
+        # Комментарий пишут после поста, в среднем через сутки.
+        self.spread_dates(Comment, 'created', start, (
+            min(posts[post_id] + timedelta(days=self.rng.expovariate(1)),
+                self.now)
+            for post_id in commented
+        ))
+
+    def seed_follows(self, mean, users):
+        # Число подписок пользователя распределено экспоненциально,
+        # выбор автора — по закону Ципфа: у немногих авторов огромное
+        # число подписчиков, у большинства — единицы.
+        def edges():
+            for user in users:
+                count = min(int(self.rng.expovariate(1 / mean)), len(users))
+                authors = set(self.rng.choices(
+                    users, cum_weights=self.user_weights, k=count
+                ))
+                authors.discard(user)
+                for author in authors:
+                    yield Follow(user_id=user, author_id=author)
+
+        self.insert(Follow, edges(), ignore_conflicts=True)
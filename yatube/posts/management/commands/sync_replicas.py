@@ -0,0 +1,51 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core import db_router
+
+
+def copy_database(source, target):
+    """Согласованный снимок файла SQLite ``source`` в ``target``.
+
+    Backup API копирует страницы под блокировками SQLite, поэтому
+    читатели реплики не видят наполовину записанный файл.
+    """
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+class Command(BaseCommand):
+    help = ('Заменяет репликацию при локальном запуске: копирует основную '
+            'базу SQLite в файлы реплик')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять каждые N секунд; 0 — один раз',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            self.stdout.write('Реплики не настроены: задайте YATUBE_REPLICAS')
+            return
+        source = connections.databases[DEFAULT_DB_ALIAS]['NAME']
+        while True:
+            start = time.perf_counter()
+            for alias in settings.DATABASE_REPLICAS:
+                copy_database(source, connections.databases[alias]['NAME'])
+            db_router.advance_generation()
+            self.stdout.write(
+                f'Реплик обновлено: {len(settings.DATABASE_REPLICAS)} '
+                f'за {time.perf_counter() - start:.2f} с'
+            )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = ('Переносит точку отсчёта популярности в настоящее и убирает '
+            'угасшие посты из ленты популярного. Запускать периодически, '
+            'например раз в час')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Пересчитать оценки по таблице комментариев',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = trending.rebuild()
+            self.stdout.write(f'Постов с недавними комментариями: {count}')
+        else:
+            count = trending.decay()
+            self.stdout.write(f'Выпало из ленты популярного: {count}')
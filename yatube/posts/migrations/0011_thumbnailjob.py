@@ -0,0 +1,32 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThumbnailJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('post', models.OneToOneField(help_text='Пост, для картинки которого готовится миниатюра', on_delete=django.db.models.deletion.CASCADE, related_name='thumbnail_job', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Задача миниатюры',
+                'verbose_name_plural': 'Задачи миниатюр',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='thumbnailjob',
+            index=models.Index(fields=['status'], name='posts_thumb_status_62a987_idx'),
+        ),
+    ]
@@ -0,0 +1,111 @@
+import itertools
+import re
+
+from django.db import migrations
+
+# Копия таблицы и стеммера из posts.search на момент миграции: миграция
+# не должна зависеть от кода приложения, который потом будет меняться.
+FTS_TABLE = 'posts_post_fts'
+BATCH_SIZE = 1000
+
+WORD = re.compile(r'\w+')
+RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+REFLEXIVE = re.compile(r'(с[яь])$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|'
+    r'ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    r'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|'
+    r'((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|'
+    r'ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+DERIVATIONAL = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+
+
+def stem(word):
+    """Основа слова по алгоритму Snowball для русского языка.
+
+    Окончания ищутся в RV — части слова после первой гласной; более
+    длинное окончание группы имеет приоритет.
+    """
+    word = word.lower().replace('ё', 'е')
+    match = RV.match(word)
+    if match is None:
+        return word
+    start, rv = match.groups()
+    stripped = PERFECTIVE_GERUND.sub('', rv, 1)
+    if stripped == rv:
+        rv = REFLEXIVE.sub('', rv, 1)
+        stripped = ADJECTIVE.sub('', rv, 1)
+        if stripped != rv:
+            rv = PARTICIPLE.sub('', stripped, 1)
+        else:
+            stripped = VERB.sub('', rv, 1)
+            rv = NOUN.sub('', rv, 1) if stripped == rv else stripped
+    else:
+        rv = stripped
+    rv = re.sub('и$', '', rv, 1)
+    if DERIVATIONAL.match(rv):
+        rv = re.sub('ость?$', '', rv, 1)
+    stripped = re.sub('ь$', '', rv, 1)
+    if stripped == rv:
+        rv = SUPERLATIVE.sub('', rv, 1)
+        rv = re.sub('нн$', 'н', rv, 1)
+    else:
+        rv = stripped
+    return start + rv
+
+
+def stems(text):
+    return [stem(word) for word in WORD.findall(text)]
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Post = apps.get_model('posts', 'Post')
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+        f'USING fts5(stems, tokenize="unicode61")'
+    )
+    rows = Post.objects.values_list('pk', 'text').iterator(
+        chunk_size=BATCH_SIZE
+    )
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            batch = [
+                (pk, ' '.join(stems(text)))
+                for pk, text in itertools.islice(rows, BATCH_SIZE)
+            ]
+            if not batch:
+                break
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, stems) VALUES (%s, %s)',
+                batch,
+            )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_thumbnailjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0012_post_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SuggestedAuthor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Оценка')),
+                ('reason', models.CharField(choices=[('friends', 'Читают ваши авторы'), ('cofollow', 'Читают похожие на вас читатели'), ('groups', 'Пишет в близких вам группах'), ('popular', 'Популярный автор')], max_length=10, verbose_name='Причина')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('author', models.ForeignKey(help_text='Рекомендуемый автор', on_delete=django.db.models.deletion.CASCADE, related_name='suggested_to', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('user', models.ForeignKey(help_text='Кому рекомендуем автора', on_delete=django.db.models.deletion.CASCADE, related_name='suggestions', to=settings.AUTH_USER_MODEL, verbose_name='Читатель')),
+            ],
+            options={
+                'verbose_name': 'Рекомендация автора',
+                'verbose_name_plural': 'Рекомендации авторов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='suggestedauthor',
+            index=models.Index(fields=['user', 'rank'], name='posts_sugge_user_id_b1aba9_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='suggestedauthor',
+            unique_together={('user', 'author')},
+        ),
+    ]
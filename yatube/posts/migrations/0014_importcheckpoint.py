@@ -0,0 +1,41 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_suggestedauthor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(help_text='Имя импортируемого дампа', max_length=255, unique=True, verbose_name='Источник')),
+                ('position', models.PositiveIntegerField(default=0, help_text='Сколько записей дампа уже обработано', verbose_name='Позиция')),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Контрольная точка импорта',
+                'verbose_name_plural': 'Контрольные точки импорта',
+            },
+        ),
+        migrations.CreateModel(
+            name='ImportedPost',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, verbose_name='Источник')),
+                ('source_id', models.CharField(max_length=64, verbose_name='Идентификатор в источнике')),
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='import_source', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Импортированный пост',
+                'verbose_name_plural': 'Импортированные посты',
+                'unique_together': {('source', 'source_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingEpoch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('epoch', models.DateTimeField(help_text='Момент, относительно которого считаются веса популярности', verbose_name='Точка отсчёта')),
+            ],
+            options={
+                'verbose_name': 'Точка отсчёта популярности',
+                'verbose_name_plural': 'Точки отсчёта популярности',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, help_text='Сумма затухающих весов комментариев, см. posts.trending', verbose_name='Популярность'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(trending_score__gt=0), fields=['-trending_score', '-id'], name='posts_post_trending_idx'),
+        ),
+    ]
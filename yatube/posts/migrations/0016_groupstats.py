@@ -0,0 +1,107 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import json
+
+
+def fill_group_stats(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    GroupAuthorStats = apps.get_model('posts', 'GroupAuthorStats')
+    Post = apps.get_model('posts', 'Post')
+
+    posts = Post.objects.filter(group__isnull=False).order_by()
+    totals = {
+        row['group_id']: row
+        for row in posts.values('group_id').annotate(
+            total=models.Count('pk'), last=models.Max('pub_date')
+        )
+    }
+    authors = posts.values('group_id', 'author_id', 'author__username')
+    authors = authors.annotate(total=models.Count('pk'))
+    GroupAuthorStats.objects.bulk_create(
+        (
+            GroupAuthorStats(
+                group_id=row['group_id'],
+                author_id=row['author_id'],
+                posts_count=row['total'],
+            )
+            for row in authors
+        ),
+        batch_size=500,
+    )
+    top = {}
+    ranked = sorted(
+        authors, key=lambda row: (-row['total'], row['author_id'])
+    )
+    for row in ranked:
+        group_top = top.setdefault(row['group_id'], [])
+        if len(group_top) < settings.GROUP_TOP_AUTHORS:
+            group_top.append(
+                {'username': row['author__username'], 'posts': row['total']}
+            )
+    GroupStats.objects.bulk_create(
+        (
+            GroupStats(
+                group_id=pk,
+                posts_count=totals.get(pk, {}).get('total', 0),
+                last_post_at=totals.get(pk, {}).get('last'),
+                top_authors=json.dumps(top.get(pk, []), ensure_ascii=False),
+            )
+            for pk in Group.objects.values_list('pk', flat=True)
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0015_trending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('last_post_at', models.DateTimeField(blank=True, null=True, verbose_name='Последний пост')),
+                ('top_authors', models.TextField(default='[]', help_text='JSON: самые пишущие в группе авторы и число их постов', verbose_name='Активные авторы')),
+                ('group', models.OneToOneField(help_text='Группа, к которой относится статистика', on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='posts.Group', verbose_name='Группа')),
+            ],
+            options={
+                'verbose_name': 'Статистика группы',
+                'verbose_name_plural': 'Статистика групп',
+            },
+        ),
+        migrations.CreateModel(
+            name='GroupAuthorStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='group_stats', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='author_stats', to='posts.Group', verbose_name='Группа')),
+            ],
+            options={
+                'verbose_name': 'Статистика автора в группе',
+                'verbose_name_plural': 'Статистика авторов в группах',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='groupstats',
+            index=models.Index(fields=['-posts_count', 'group'], name='posts_group_posts_c_2ba5f0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupauthorstats',
+            index=models.Index(fields=['group', '-posts_count'], name='posts_group_group_i_105f81_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='groupauthorstats',
+            unique_together={('group', 'author')},
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
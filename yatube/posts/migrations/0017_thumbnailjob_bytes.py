@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_groupstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thumbnailjob',
+            name='optimized_bytes',
+            field=models.PositiveIntegerField(blank=True, help_text='Размер оригинала после сжатия; пусто, пока не сжат', null=True, verbose_name='Байт после обработки'),
+        ),
+        migrations.AddField(
+            model_name='thumbnailjob',
+            name='original_bytes',
+            field=models.PositiveIntegerField(blank=True, help_text='Размер загруженного оригинала', null=True, verbose_name='Байт до обработки'),
+        ),
+    ]
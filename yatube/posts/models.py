@@ -1,9 +1,49 @@
-from django.db import models
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import models, router, transaction
+from django.db.models import (Count, F, IntegerField, Max, OuterRef, Q,
+                              Subquery, Sum, Value)
+from django.db.models.functions import Coalesce, Greatest
 from django.contrib.auth import get_user_model
 
+from . import feed_cache, recommendations
+from .func import MergedFeed
+
 User = get_user_model()
 
 
+def count_of(model, field):
+    """Коррелированный подзапрос с числом строк ``model``,
+    у которых ``field`` ссылается на текущую запись."""
+    rows = (
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+class AtomicSaveMixin:
+    """Сохраняет строку и выполняет обработчики post_save в одной
+    транзакции: счётчики, которые ведут сигналы, не расходятся с
+    таблицей при сбое между записью и обработчиком.
+
+    Удалению это не нужно: Collector и так шлёт post_delete внутри
+    своей транзакции.
+    """
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self
+        )
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
+
 class Group(models.Model):
     title = models.CharField(
         max_length=200,
@@ -20,7 +60,44 @@ class Group(models.Model):
         return self.title
 
 
-class Post(models.Model):
+class PostQuerySet(models.QuerySet):
+    FEED_FIELDS = (
+        'text',
+        'pub_date',
+        'image',
+        'author__username',
+        'author__first_name',
+        'author__last_name',
+        'group__title',
+        'group__slug',
+    )
+
+    def feed(self):
+        """Посты для лент: автор и группа в том же запросе,
+        только нужные шаблонам поля и число комментариев."""
+        return (
+            self.select_related('author', 'group')
+            .only(*self.FEED_FIELDS)
+            .annotate(comments_count=count_of(Comment, 'post'))
+            .with_thumbnail_state()
+        )
+
+    def trending(self):
+        """Посты с недавними комментариями, самые обсуждаемые первыми."""
+        return self.filter(trending_score__gt=0).order_by(
+            '-trending_score', '-id'
+        )
+
+    def with_thumbnail_state(self):
+        """Статус задачи миниатюры поста; None, если задачи ещё нет."""
+        return self.annotate(thumbnail_status=Subquery(
+            ThumbnailJob.objects.filter(post=OuterRef('pk')).values(
+                'status'
+            )[:1]
+        ))
+
+
+class Post(AtomicSaveMixin, models.Model):
     text = models.TextField(
         verbose_name='Текст поста',
         help_text='Текст нового поста',
@@ -47,15 +124,53 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    trending_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Популярность',
+        help_text='Сумма затухающих весов комментариев, см. posts.trending',
+    )
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self) -> str:
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # Популярность меняют только UPDATE с F() из posts.trending:
+        # сохранение поста, прочитанного раньше, не должно их затирать.
+        if (
+            not self._state.adding
+            and not args
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.name != 'trending_score'
+            ]
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id']),
+            models.Index(fields=['author', '-pub_date', '-id']),
+            models.Index(fields=['group', '-pub_date', '-id']),
+            # Только посты с комментариями за последние дни: индекс
+            # маленький, а лента популярного читает его начало.
+            models.Index(
+                fields=['-trending_score', '-id'],
+                name='posts_post_trending_idx',
+                condition=Q(trending_score__gt=0),
+            ),
+        ]
 
 
-class Comment(models.Model):
+class Comment(AtomicSaveMixin, models.Model):
     post = models.ForeignKey(
         Post,
         verbose_name='Пост',
@@ -78,9 +193,72 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created']
+        indexes = [models.Index(fields=['post', '-created', '-id'])]
+
+
+class FollowManager(models.Manager):
+    def add_edges(self, edges):
+        """Добавляет подписки пачкой и возвращает новые пары
+        (user_id, author_id).
+
+        bulk_create не шлёт сигналов, поэтому счётчики, ленты и кеш
+        обновляются здесь же — по одному запросу на пачку.
+        """
+        edges = {(user, author) for user, author in edges if user != author}
+        if not edges:
+            return []
+        existing = set(self.filter(
+            user_id__in={user for user, _ in edges},
+            author_id__in={author for _, author in edges},
+        ).values_list('user_id', 'author_id'))
+        new = sorted(edges - existing)
+        self.bulk_create(
+            (self.model(user_id=user, author_id=author)
+             for user, author in new),
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+        authors_by_user = {}
+        for user, author in new:
+            authors_by_user.setdefault(user, []).append(author)
+        for user, authors in authors_by_user.items():
+            TimelineEntry.objects.backfill_many(user, authors)
+        self._edges_changed(new)
+        return new
+
+    def remove_edges(self, user_id, author_ids):
+        """Удаляет подписки ``user_id`` на авторов ``author_ids``."""
+        follows = self.filter(user_id=user_id, author_id__in=author_ids)
+        removed = list(follows.values_list('author_id', flat=True))
+        prolific = TimelineEntry.objects.prolific_among(removed)
+        # Обход delete() нужен: у Follow есть обработчик post_delete
+        # (signals.follow_deleted), который на каждую строку обновляет два
+        # счётчика, чистит ленту и сбрасывает кеш — до четырёх тысяч
+        # запросов на BULK_FOLLOW_LIMIT имён. Здесь то же делается одним
+        # пересчётом на пачку. Каскадов у Follow нет, а _raw_delete —
+        # единственный способ Django удалить строки без сигналов.
+        follows._raw_delete(follows.db)
+        TimelineEntry.objects.filter(
+            user_id=user_id, post__author_id__in=removed
+        ).delete()
+        self._edges_changed([(user_id, author) for author in removed])
+        # Авторы, которые после отписок перестали быть популярными.
+        dropped = prolific - TimelineEntry.objects.prolific_among(prolific)
+        for author_id in dropped:
+            TimelineEntry.objects.backfill_followers(author_id)
+        return removed
 
+    def _edges_changed(self, edges):
+        if not edges:
+            return
+        affected = {user_id for edge in edges for user_id in edge}
+        AuthorStats.objects.rebuild(author_ids=affected)
+        feed_cache.bump(*(
+            feed_cache.author_scope(user_id) for user_id in affected
+        ))
 
-class Follow(models.Model):
+
+class Follow(AtomicSaveMixin, models.Model):
     user = models.ForeignKey(
         User,
         verbose_name='follower',
@@ -98,5 +276,654 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
     )
 
+    objects = FollowManager()
+
+    class Meta:
+        unique_together = ['user', 'author']
+        indexes = [models.Index(fields=['author', 'user'])]
+
+
+class AuthorStatsManager(models.Manager):
+    COUNTERS = (
+        'posts_count',
+        'comments_count',
+        'followers_count',
+        'following_count',
+    )
+
+    def for_author(self, author):
+        """Статистика автора; без активности — пустая запись."""
+        return self.filter(author=author).first() or self.model(author=author)
+
+    def bump(self, author_id, create=True, **deltas):
+        """Атомарно сдвигает счётчики автора на ``deltas``."""
+        with transaction.atomic():
+            if create:
+                self.get_or_create(author_id=author_id)
+            self.filter(author_id=author_id).update(**{
+                field: Greatest(F(field) + delta, 0)
+                for field, delta in deltas.items()
+            })
+
+    def rebuild(self, author_ids=None):
+        """Пересчитывает счётчики по исходным таблицам."""
+        users = User.objects.annotate(
+            posts_total=count_of(Post, 'author'),
+            comments_total=count_of(Comment, 'author'),
+            followers_total=count_of(Follow, 'author'),
+            following_total=count_of(Follow, 'user'),
+        )
+        if author_ids is not None:
+            users = users.filter(pk__in=author_ids)
+        stats = [
+            self.model(
+                author_id=user.pk,
+                posts_count=user.posts_total,
+                comments_count=user.comments_total,
+                followers_count=user.followers_total,
+                following_count=user.following_total,
+            )
+            for user in users.iterator()
+        ]
+        with transaction.atomic():
+            stale = self.all()
+            if author_ids is not None:
+                stale = stale.filter(author_id__in=author_ids)
+            stale.delete()
+            self.bulk_create(stats, batch_size=500)
+        return len(stats)
+
+
+class AuthorStats(models.Model):
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Автор',
+        help_text='Автор, к которому относится статистика',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Постов',
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Комментариев',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок',
+    )
+
+    objects = AuthorStatsManager()
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+        indexes = [models.Index(fields=['followers_count'])]
+
+
+class GroupStatsManager(models.Manager):
+    def post_added(self, group_id, author_id, pub_date):
+        """Учитывает новый пост группы (или пост, перенесённый в неё)."""
+        pub_date = Value(pub_date, output_field=models.DateTimeField())
+        with transaction.atomic():
+            updated = self.filter(group_id=group_id).update(
+                posts_count=F('posts_count') + 1,
+                last_post_at=Greatest(
+                    Coalesce(F('last_post_at'), pub_date), pub_date
+                ),
+            )
+            if not updated:
+                self.rebuild([group_id])
+                return
+            GroupAuthorStats.objects.bump(group_id, author_id, 1)
+            self.refresh_top_authors(group_id)
+
+    def post_removed(self, group_id, author_id):
+        """Учитывает удаление поста группы или его перенос из неё."""
+        with transaction.atomic():
+            self.filter(group_id=group_id).update(
+                posts_count=Greatest(F('posts_count') - 1, 0),
+                last_post_at=Subquery(
+                    Post.objects.filter(group_id=OuterRef('group_id'))
+                    .order_by('-pub_date')
+                    .values('pub_date')[:1]
+                ),
+            )
+            GroupAuthorStats.objects.bump(group_id, author_id, -1)
+            self.refresh_top_authors(group_id)
+
+    def refresh_top_authors(self, group_id):
+        top = GroupAuthorStats.objects.filter(
+            group_id=group_id, posts_count__gt=0
+        ).order_by('-posts_count', 'author_id').values_list(
+            'author__username', 'posts_count'
+        )[:settings.GROUP_TOP_AUTHORS]
+        self.filter(group_id=group_id).update(top_authors=json.dumps(
+            [{'username': name, 'posts': count} for name, count in top],
+            ensure_ascii=False,
+        ))
+
+    def rebuild(self, group_ids=None):
+        """Пересчитывает статистику групп по таблице постов."""
+        groups = Group.objects.all()
+        posts = Post.objects.filter(group__isnull=False)
+        if group_ids is not None:
+            groups = groups.filter(pk__in=group_ids)
+            posts = posts.filter(group_id__in=group_ids)
+        authors = posts.order_by().values('group_id', 'author_id').annotate(
+            total=Count('pk')
+        ).values_list('group_id', 'author_id', 'total')
+        totals = posts.order_by().values('group_id').annotate(
+            total=Count('pk'), last=Max('pub_date')
+        ).values_list('group_id', 'total', 'last')
+        totals = {group: (total, last) for group, total, last in totals}
+        with transaction.atomic():
+            stale = self.all()
+            author_stale = GroupAuthorStats.objects.all()
+            if group_ids is not None:
+                stale = stale.filter(group_id__in=group_ids)
+                author_stale = author_stale.filter(group_id__in=group_ids)
+            stale.delete()
+            author_stale.delete()
+            GroupAuthorStats.objects.bulk_create(
+                (
+                    GroupAuthorStats(
+                        group_id=group, author_id=author, posts_count=total
+                    )
+                    for group, author, total in authors.iterator()
+                ),
+                batch_size=500,
+            )
+            stats = [
+                self.model(
+                    group_id=pk,
+                    posts_count=totals.get(pk, (0, None))[0],
+                    last_post_at=totals.get(pk, (0, None))[1],
+                )
+                for pk in groups.values_list('pk', flat=True)
+            ]
+            self.bulk_create(stats, batch_size=500)
+            for stat in stats:
+                if stat.posts_count:
+                    self.refresh_top_authors(stat.group_id)
+        return len(stats)
+
+
+class GroupStats(models.Model):
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Группа',
+        help_text='Группа, к которой относится статистика',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Постов',
+    )
+    last_post_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Последний пост',
+    )
+    top_authors = models.TextField(
+        default='[]',
+        verbose_name='Активные авторы',
+        help_text='JSON: самые пишущие в группе авторы и число их постов',
+    )
+
+    objects = GroupStatsManager()
+
+    class Meta:
+        verbose_name = 'Статистика группы'
+        verbose_name_plural = 'Статистика групп'
+        indexes = [models.Index(fields=['-posts_count', 'group'])]
+
+    def top_authors_list(self):
+        return json.loads(self.top_authors)
+
+
+class GroupAuthorStatsManager(models.Manager):
+    def bump(self, group_id, author_id, delta):
+        rows = self.filter(group_id=group_id, author_id=author_id)
+        if not rows.update(posts_count=Greatest(F('posts_count') + delta, 0)):
+            if delta > 0:
+                self.create(
+                    group_id=group_id, author_id=author_id, posts_count=delta
+                )
+            return
+        if delta < 0:
+            rows.filter(posts_count=0).delete()
+
+
+class GroupAuthorStats(models.Model):
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='author_stats',
+        verbose_name='Группа',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='group_stats',
+        verbose_name='Автор',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Постов',
+    )
+
+    objects = GroupAuthorStatsManager()
+
+    class Meta:
+        verbose_name = 'Статистика автора в группе'
+        verbose_name_plural = 'Статистика авторов в группах'
+        unique_together = ['group', 'author']
+        indexes = [models.Index(fields=['group', '-posts_count'])]
+
+
+class TimelineManager(models.Manager):
+    def prolific_authors(self):
+        """Авторы, чьи посты подмешиваются в ленты при чтении."""
+        return AuthorStats.objects.filter(
+            followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+        ).values('author_id')
+
+    def is_prolific(self, author_id):
+        return self.prolific_authors().filter(author_id=author_id).exists()
+
+    def prolific_among(self, author_ids):
+        return set(self.prolific_authors().filter(
+            author_id__in=author_ids
+        ).values_list('author_id', flat=True))
+
+    def posts_for(self, user):
+        """Посты ленты подписок: материализованная часть и посты
+        популярных авторов, на которых подписан пользователь.
+
+        Источники сливаются по дате, каждый читается по своему индексу
+        не дальше нужной страницы: посты популярных авторов не
+        сортируются целиком.
+        """
+        prolific = list(Follow.objects.filter(
+            user=user, author__in=self.prolific_authors()
+        ).values_list('author_id', flat=True))
+        timeline = self.filter(user=user)
+        return MergedFeed(
+            Post.objects.filter(
+                Q(pk__in=timeline.values('post_id'))
+                | Q(author_id__in=prolific)
+            ),
+            [(timeline, 'post_id')] + [
+                (Post.objects.filter(author_id=author_id), 'id')
+                for author_id in prolific
+            ],
+        )
+
+    def fan_out(self, post):
+        """Раскладывает новый пост по лентам подписчиков автора."""
+        if self.is_prolific(post.author_id):
+            return
+        followers = list(Follow.objects.filter(
+            author_id=post.author_id
+        ).values_list('user_id', flat=True))
+        self.bulk_create(
+            (
+                self.model(user_id=user_id, post=post, pub_date=post.pub_date)
+                for user_id in followers
+            ),
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+        self.trim(followers)
+
+    def fan_out_many(self, posts):
+        """То же для пачки новых постов: подписчики всех авторов одним
+        запросом, ленты обрезаются один раз на пачку."""
+        by_author = defaultdict(list)
+        for post in posts:
+            by_author[post.author_id].append(post)
+        prolific = self.prolific_authors().filter(author_id__in=by_author)
+        follows = Follow.objects.filter(author_id__in=by_author).exclude(
+            author_id__in=prolific
+        ).values_list('user_id', 'author_id')
+        readers = set()
+
+        def entries():
+            for user_id, author_id in follows.iterator():
+                readers.add(user_id)
+                for post in by_author[author_id]:
+                    yield self.model(
+                        user_id=user_id, post=post, pub_date=post.pub_date
+                    )
+
+        self.bulk_create(entries(), batch_size=500, ignore_conflicts=True)
+        readers = sorted(readers)
+        for start in range(0, len(readers), 500):
+            self.trim(readers[start:start + 500])
+
+    def backfill(self, user_id, author_id):
+        """Добавляет в ленту последние посты нового избранного автора."""
+        self.backfill_many(user_id, [author_id])
+
+    def backfill_many(self, user_id, author_ids):
+        """То же для нескольких авторов одним запросом: в ленту всё
+        равно попадут лишь TIMELINE_LENGTH новейших постов."""
+        posts = Post.objects.filter(author_id__in=author_ids).exclude(
+            author_id__in=self.prolific_authors()
+        ).order_by('-pub_date').values_list(
+            'pk', 'pub_date'
+        )[:settings.TIMELINE_LENGTH]
+        self.bulk_create(
+            (
+                self.model(user_id=user_id, post_id=pk, pub_date=pub_date)
+                for pk, pub_date in posts
+            ),
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+        self.trim([user_id])
+
+    def backfill_followers(self, author_id):
+        """Раскладывает последние посты автора по лентам всех его
+        подписчиков, когда он перестаёт быть популярным: посты, которые
+        он написал популярным, в ленты не попадали."""
+        posts = list(
+            Post.objects.filter(author_id=author_id)
+            .order_by('-pub_date', '-id')
+            .values_list('pk', 'pub_date')[:settings.TIMELINE_LENGTH]
+        )
+        followers = list(Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True))
+        for start in range(0, len(followers), 500):
+            chunk = followers[start:start + 500]
+            self.bulk_create(
+                (
+                    self.model(user_id=user_id, post_id=pk, pub_date=pub_date)
+                    for user_id in chunk
+                    for pk, pub_date in posts
+                ),
+                batch_size=500,
+                ignore_conflicts=True,
+            )
+            self.trim(chunk)
+
+    def remove(self, user_id, author_id):
+        self.filter(user_id=user_id, post__author_id=author_id).delete()
+
+    def trim(self, user_ids):
+        """Оставляет в лентах не больше TIMELINE_LENGTH новейших записей."""
+        overflow = (
+            self.filter(user_id__in=user_ids)
+            .values('user_id')
+            .annotate(total=Count('pk'))
+            .filter(total__gt=settings.TIMELINE_LENGTH)
+            .values_list('user_id', flat=True)
+        )
+        for user_id in list(overflow):
+            stale = list(
+                self.filter(user_id=user_id)
+                .order_by('-pub_date', '-post_id')
+                .values_list('pk', flat=True)[settings.TIMELINE_LENGTH:]
+            )
+            self.filter(pk__in=stale).delete()
+
+    def rebuild(self, user_ids=None):
+        """Заново собирает ленты по таблице подписок."""
+        follows = Follow.objects.exclude(author__in=self.prolific_authors())
+        if user_ids is not None:
+            follows = follows.filter(user_id__in=user_ids)
+        with transaction.atomic():
+            stale = self.all()
+            if user_ids is not None:
+                stale = stale.filter(user_id__in=user_ids)
+            stale.delete()
+            authors = defaultdict(list)
+            for user_id, author_id in follows.values_list(
+                'user_id', 'author_id'
+            ).iterator():
+                authors[user_id].append(author_id)
+            for user_id, author_ids in authors.items():
+                self.backfill_many(user_id, author_ids)
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+        help_text='Владелец ленты подписок',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+        help_text='Пост в ленте подписок',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+        help_text='Копия даты публикации поста для сортировки ленты',
+    )
+
+    objects = TimelineManager()
+
     class Meta:
+        unique_together = ['user', 'post']
+        indexes = [models.Index(fields=['user', '-pub_date', '-post'])]
+
+
+class ThumbnailJobQuerySet(models.QuerySet):
+    def bytes_saved(self):
+        """Сколько байт сэкономило сжатие оригиналов."""
+        totals = self.filter(optimized_bytes__isnull=False).aggregate(
+            before=Sum('original_bytes'), after=Sum('optimized_bytes')
+        )
+        return (totals['before'] or 0) - (totals['after'] or 0)
+
+
+class ThumbnailJob(models.Model):
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='thumbnail_job',
+        verbose_name='Пост',
+        help_text='Пост, для картинки которого готовится миниатюра',
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Статус',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток',
+    )
+    original_bytes = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Байт до обработки',
+        help_text='Размер загруженного оригинала',
+    )
+    optimized_bytes = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Байт после обработки',
+        help_text='Размер оригинала после сжатия; пусто, пока не сжат',
+    )
+    updated = models.DateTimeField(auto_now=True)
+
+    objects = ThumbnailJobQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Задача миниатюры'
+        verbose_name_plural = 'Задачи миниатюр'
+        indexes = [models.Index(fields=['status'])]
+
+
+class SuggestedAuthorManager(models.Manager):
+    def for_user(self, user, limit=None):
+        """Готовые рекомендации читателя: один запрос по индексу
+        (user, rank). Авторы, на которых читатель подписался после
+        расчёта, отбрасываются."""
+        limit = limit or settings.SUGGESTIONS_SHOWN
+        return list(
+            self.filter(user=user)
+            .exclude(author__in=Follow.objects.filter(
+                user=user
+            ).values('author_id'))
+            .select_related('author')
+            .only(
+                'reason',
+                'author__username',
+                'author__first_name',
+                'author__last_name',
+            )
+            .order_by('rank')[:limit]
+        )
+
+    def rebuild(self):
+        """Пересчитывает рекомендации по всему графу подписок."""
+        follow_edges = list(
+            Follow.objects.values_list('user_id', 'author_id').iterator()
+        )
+        post_groups = list(
+            Post.objects.filter(group__isnull=False)
+            .values('author_id', 'group_id')
+            .annotate(count=Count('pk'))
+            .values_list('author_id', 'group_id', 'count')
+            .order_by()
+        )
+        # Запас на случай, когда популярные авторы уже в подписках.
+        popular = list(AuthorStats.objects.filter(
+            followers_count__gt=0
+        ).order_by('-followers_count').values_list(
+            'author_id', 'followers_count'
+        )[:settings.SUGGESTIONS_PER_USER * 5])
+        users = User.objects.values_list('pk', flat=True).iterator()
+        computed = recommendations.compute(
+            follow_edges, post_groups, users, popular
+        )
+        rows = [
+            self.model(
+                user_id=user, author_id=author, score=score,
+                reason=reason, rank=rank,
+            )
+            for user, suggestions in computed.items()
+            for rank, (author, score, reason) in enumerate(suggestions)
+        ]
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(rows, batch_size=500)
+        return len(rows)
+
+
+class SuggestedAuthor(models.Model):
+    FRIENDS = 'friends'
+    COFOLLOW = 'cofollow'
+    GROUPS = 'groups'
+    POPULAR = 'popular'
+    REASONS = (
+        (FRIENDS, 'Читают ваши авторы'),
+        (COFOLLOW, 'Читают похожие на вас читатели'),
+        (GROUPS, 'Пишет в близких вам группах'),
+        (POPULAR, 'Популярный автор'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='suggestions',
+        verbose_name='Читатель',
+        help_text='Кому рекомендуем автора',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='suggested_to',
+        verbose_name='Автор',
+        help_text='Рекомендуемый автор',
+    )
+    score = models.FloatField(verbose_name='Оценка')
+    reason = models.CharField(
+        max_length=10,
+        choices=REASONS,
+        verbose_name='Причина',
+    )
+    rank = models.PositiveSmallIntegerField(verbose_name='Место')
+
+    objects = SuggestedAuthorManager()
+
+    class Meta:
+        verbose_name = 'Рекомендация автора'
+        verbose_name_plural = 'Рекомендации авторов'
         unique_together = ['user', 'author']
+        indexes = [models.Index(fields=['user', 'rank'])]
+
+
+class TrendingEpoch(models.Model):
+    epoch = models.DateTimeField(
+        verbose_name='Точка отсчёта',
+        help_text='Момент, относительно которого считаются веса популярности',
+    )
+
+    class Meta:
+        verbose_name = 'Точка отсчёта популярности'
+        verbose_name_plural = 'Точки отсчёта популярности'
+
+
+class ImportCheckpoint(models.Model):
+    source = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Источник',
+        help_text='Имя импортируемого дампа',
+    )
+    position = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Позиция',
+        help_text='Сколько записей дампа уже обработано',
+    )
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Контрольная точка импорта'
+        verbose_name_plural = 'Контрольные точки импорта'
+
+
+class ImportedPost(models.Model):
+    source = models.CharField(max_length=255, verbose_name='Источник')
+    source_id = models.CharField(
+        max_length=64,
+        verbose_name='Идентификатор в источнике',
+    )
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='import_source',
+        verbose_name='Пост',
+    )
+
+    class Meta:
+        verbose_name = 'Импортированный пост'
+        verbose_name_plural = 'Импортированные посты'
+        unique_together = ['source', 'source_id']
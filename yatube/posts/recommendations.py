@@ -0,0 +1,162 @@
+"""Офлайн-расчёт рекомендаций авторов («на кого подписаться»).
+
+Пакетное задание читает весь граф подписок и группы постов и считает
+три разреженных сигнала для каждого читателя u:
+
+* друзья друзей — (F·F)[u, b]: сколько авторов из подписок u читают b;
+* совместные подписки — (F·C)[u, b], где C = Fᵀ·F — матрица
+  «читатели a также читают b», урезанная до ближайших соседей;
+* общие группы — (G·Wᵀ)[u, b]: насколько группы, в которых пишет u и
+  его авторы, совпадают с группами b.
+
+Матрицы хранятся как словари множеств и Counter — numpy/scipy в
+проекте нет, а на разреженном графе это те же умножения без нулей.
+Недостающие места добиваются популярными авторами. Результат — топ
+авторов для каждого читателя в SuggestedAuthor; запрос страницы читает
+готовые строки одним запросом по индексу.
+"""
+import heapq
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+# Веса сигналов после нормировки каждого на максимум у читателя.
+WEIGHTS = {
+    'friends': 1.0,
+    'cofollow': 0.6,
+    'groups': 0.3,
+}
+# Ограничения, держащие умножения разреженными на степенном графе:
+# у популярного автора десятки тысяч читателей, а для похожести
+# хватает ближайших соседей.
+MAX_FOLLOWS_PER_USER = 200
+NEIGHBOURS_PER_AUTHOR = 50
+AUTHORS_PER_GROUP = 50
+
+
+def top(counter, count):
+    return heapq.nlargest(count, counter.items(), key=lambda item: item[1])
+
+
+def normalized(counter):
+    peak = max(counter.values(), default=0)
+    if not peak:
+        return {}
+    return {key: value / peak for key, value in counter.items()}
+
+
+def follow_matrix(edges):
+    """F: читатель → множество авторов."""
+    follows = defaultdict(set)
+    for user, author in edges:
+        if user != author:
+            follows[user].add(author)
+    return follows
+
+
+def cofollow_matrix(follows):
+    """C = Fᵀ·F: автор → Counter похожих авторов, по числу общих
+    читателей; у каждого автора остаются ближайшие соседи."""
+    cooccurrence = defaultdict(Counter)
+    for authors in follows.values():
+        authors = sorted(authors)[:MAX_FOLLOWS_PER_USER]
+        for a in authors:
+            row = cooccurrence[a]
+            for b in authors:
+                if a != b:
+                    row[b] += 1
+    return {
+        author: dict(top(row, NEIGHBOURS_PER_AUTHOR))
+        for author, row in cooccurrence.items()
+    }
+
+
+def group_matrices(post_groups):
+    """W: автор → Counter групп его постов и
+    группа → топ авторов по числу постов в ней."""
+    author_groups = defaultdict(Counter)
+    group_authors = defaultdict(Counter)
+    for author, group, count in post_groups:
+        author_groups[author][group] += count
+        group_authors[group][author] += count
+    return author_groups, {
+        group: dict(top(row, AUTHORS_PER_GROUP))
+        for group, row in group_authors.items()
+    }
+
+
+def graph_signals(followed, follows, cofollow):
+    """Друзья друзей и соподписки для авторов из ``followed``."""
+    friends = Counter()
+    similar = Counter()
+    for author in followed:
+        for candidate in follows.get(author, ()):
+            friends[candidate] += 1
+        for candidate, weight in cofollow.get(author, {}).items():
+            similar[candidate] += weight
+    return friends, similar
+
+
+def group_signal(user, followed, author_groups, group_authors):
+    """Авторы из групп, интересных читателю."""
+    # Группы читателя: свои посты и посты авторов из подписок.
+    interests = Counter(author_groups.get(user, {}))
+    for author in followed:
+        for group, count in author_groups.get(author, {}).items():
+            interests[group] += count * 0.5
+    groups = Counter()
+    for group, interest in interests.items():
+        for candidate, count in group_authors.get(group, {}).items():
+            groups[candidate] += interest * count
+    return groups
+
+
+def score_user(user, follows, cofollow, author_groups, group_authors,
+               popular):
+    followed = follows.get(user, set())
+    friends, similar = graph_signals(followed, follows, cofollow)
+    signals = {
+        'friends': normalized(friends),
+        'cofollow': normalized(similar),
+        'groups': normalized(
+            group_signal(user, followed, author_groups, group_authors)
+        ),
+    }
+    scores = Counter()
+    reasons = {}
+    for name, values in signals.items():
+        for candidate, value in values.items():
+            if candidate == user or candidate in followed:
+                continue
+            weighted = WEIGHTS[name] * value
+            scores[candidate] += weighted
+            if weighted > reasons.get(candidate, (None, 0))[1]:
+                reasons[candidate] = (name, weighted)
+    suggestions = [
+        (candidate, score, reasons[candidate][0])
+        for candidate, score in top(scores, settings.SUGGESTIONS_PER_USER)
+    ]
+    for candidate, followers in popular:
+        if len(suggestions) >= settings.SUGGESTIONS_PER_USER:
+            break
+        if (candidate == user or candidate in followed
+                or candidate in scores):
+            continue
+        suggestions.append((candidate, 0.0, 'popular'))
+    return suggestions
+
+
+def compute(follow_edges, post_groups, users, popular):
+    """Рекомендации для ``users``: {user: [(author, score, reason)]}.
+
+    ``popular`` — пары (автор, число подписчиков) по убыванию.
+    """
+    follows = follow_matrix(follow_edges)
+    cofollow = cofollow_matrix(follows)
+    author_groups, group_authors = group_matrices(post_groups)
+    return {
+        user: score_user(
+            user, follows, cofollow, author_groups, group_authors, popular
+        )
+        for user in users
+    }
@@ -0,0 +1,157 @@
+"""Полнотекстовый поиск по постам.
+
+Индекс — виртуальная таблица SQLite FTS5 ``posts_post_fts``, rowid
+которой совпадает с id поста. В неё пишутся не исходные слова, а их
+основы по алгоритму Snowball для русского языка, поэтому «котами» находит
+«кот» и «коты». Индекс обновляется сигналами при сохранении и удалении
+поста; на других СУБД поиск откатывается к ``icontains``.
+"""
+import re
+from functools import lru_cache
+
+from django.db import connection
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+
+WORD = re.compile(r'\w+')
+RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+REFLEXIVE = re.compile(r'(с[яь])$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|'
+    r'ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    r'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|'
+    r'((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|'
+    r'ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+DERIVATIONAL = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+
+
+# Словарь постов подчиняется закону Ципфа: основы частых слов
+# считаются один раз.
+@lru_cache(maxsize=100000)
+def stem(word):
+    """Основа слова по алгоритму Snowball для русского языка.
+
+    Окончания ищутся в RV — части слова после первой гласной; более
+    длинное окончание группы имеет приоритет.
+    """
+    word = word.lower().replace('ё', 'е')
+    match = RV.match(word)
+    if match is None:
+        return word
+    start, rv = match.groups()
+    stripped = PERFECTIVE_GERUND.sub('', rv, 1)
+    if stripped == rv:
+        rv = REFLEXIVE.sub('', rv, 1)
+        stripped = ADJECTIVE.sub('', rv, 1)
+        if stripped != rv:
+            rv = PARTICIPLE.sub('', stripped, 1)
+        else:
+            stripped = VERB.sub('', rv, 1)
+            rv = NOUN.sub('', rv, 1) if stripped == rv else stripped
+    else:
+        rv = stripped
+    rv = re.sub('и$', '', rv, 1)
+    if DERIVATIONAL.match(rv):
+        rv = re.sub('ость?$', '', rv, 1)
+    stripped = re.sub('ь$', '', rv, 1)
+    if stripped == rv:
+        rv = SUPERLATIVE.sub('', rv, 1)
+        rv = re.sub('нн$', 'н', rv, 1)
+    else:
+        rv = stripped
+    return start + rv
+
+
+def stems(text):
+    return [stem(word) for word in WORD.findall(text)]
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def index_post(post):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, stems) VALUES (%s, %s)',
+            [post.pk, ' '.join(stems(post.text))],
+        )
+
+
+def remove_post(post_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+
+def index_many(rows):
+    """Добавляет в индекс новые посты по парам (pk, текст)."""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, stems) VALUES (%s, %s)',
+            [(pk, ' '.join(stems(text))) for pk, text in rows],
+        )
+
+
+def rebuild(batch_size=1000):
+    """Заново строит индекс по всем постам."""
+    if not is_available():
+        return 0
+    total = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    batch = []
+    for row in Post.objects.values_list('pk', 'text').iterator():
+        batch.append(row)
+        if len(batch) == batch_size:
+            index_many(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        index_many(batch)
+        total += len(batch)
+    return total
+
+
+def match_expression(query):
+    """Запрос FTS5: все основы слов должны встретиться, как префиксы."""
+    terms = [term for term in stems(query) if term]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def post_ids(query, limit):
+    """id постов по убыванию релевантности (bm25)."""
+    expression = match_expression(query)
+    if not expression:
+        return []
+    if not is_available():
+        return list(Post.objects.filter(text__icontains=query).values_list(
+            'pk', flat=True
+        )[:limit])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY rank LIMIT %s',
+            [expression, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,145 @@
+from django.conf import settings
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from . import feed_cache, search, trending
+from .models import (AuthorStats, Comment, Follow, Group, GroupStats, Post,
+                     TimelineEntry)
+
+
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    # Группа на момент загрузки: при смене группы сбрасываются обе ленты.
+    # Через __dict__, чтобы не подгружать отложенное поле.
+    instance._loaded_group_id = instance.__dict__.get('group_id')
+
+
+def group_moved(instance, update_fields):
+    """Правка перенесла пост в другую группу или убрала из группы."""
+    # Для отложенных полей Django сам передаёт update_fields — имена
+    # столбцов (group_id); вручную их задают именами полей (group).
+    if update_fields is not None and not {'group', 'group_id'} & set(
+        update_fields
+    ):
+        return False
+    return instance._loaded_group_id != instance.group_id
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, update_fields=None,
+               **kwargs):
+    if raw:
+        return
+    if created:
+        AuthorStats.objects.bump(instance.author_id, posts_count=1)
+        TimelineEntry.objects.fan_out(instance)
+    moved = not created and group_moved(instance, update_fields)
+    if moved and instance._loaded_group_id:
+        GroupStats.objects.post_removed(
+            instance._loaded_group_id, instance.author_id
+        )
+    if instance.group_id and (created or moved):
+        GroupStats.objects.post_added(
+            instance.group_id, instance.author_id, instance.pub_date
+        )
+    if update_fields is None or 'text' in update_fields:
+        search.index_post(instance)
+    feed_cache.bump_on_commit(*feed_cache.post_scopes(
+        instance.author_id, instance.group_id, instance._loaded_group_id
+    ))
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    AuthorStats.objects.bump(
+        instance.author_id, create=False, posts_count=-1
+    )
+    search.remove_post(instance.pk)
+    if instance.group_id:
+        GroupStats.objects.post_removed(instance.group_id, instance.author_id)
+    feed_cache.bump_on_commit(*feed_cache.post_scopes(
+        instance.author_id, instance.group_id
+    ))
+
+
+@receiver(post_save, sender=Group)
+def group_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        GroupStats.objects.create(group=instance)
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # Посты группы остаются без группы (SET_NULL) одним UPDATE, без
+    # сигналов: статистика группы удаляется каскадно, а ленты авторов,
+    # где у постов была подпись группы, сбрасываем здесь.
+    authors = Post.objects.filter(group=instance).order_by().values_list(
+        'author_id', flat=True
+    ).distinct()
+    feed_cache.bump_on_commit(
+        feed_cache.INDEX,
+        feed_cache.group_scope(instance.pk),
+        *(feed_cache.author_scope(author_id) for author_id in authors),
+    )
+
+
+def comment_changed(comment):
+    post = Post.objects.filter(pk=comment.post_id).values(
+        'author_id', 'group_id'
+    ).first()
+    if post:
+        feed_cache.bump_on_commit(*feed_cache.post_scopes(
+            post['author_id'], post['group_id']
+        ))
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        AuthorStats.objects.bump(instance.author_id, comments_count=1)
+        trending.record([instance])
+        comment_changed(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    AuthorStats.objects.bump(
+        instance.author_id, create=False, comments_count=-1
+    )
+    trending.record([instance], sign=-1)
+    comment_changed(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        AuthorStats.objects.bump(instance.author_id, followers_count=1)
+        AuthorStats.objects.bump(instance.user_id, following_count=1)
+        TimelineEntry.objects.backfill(instance.user_id, instance.author_id)
+        feed_cache.bump_on_commit(
+            feed_cache.author_scope(instance.author_id),
+            feed_cache.author_scope(instance.user_id),
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    AuthorStats.objects.bump(
+        instance.author_id, create=False, followers_count=-1
+    )
+    AuthorStats.objects.bump(
+        instance.user_id, create=False, following_count=-1
+    )
+    TimelineEntry.objects.remove(instance.user_id, instance.author_id)
+    if AuthorStats.objects.filter(
+        author_id=instance.author_id,
+        followers_count=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists():
+        # Автор только что перестал быть популярным.
+        TimelineEntry.objects.backfill_followers(instance.author_id)
+    feed_cache.bump_on_commit(
+        feed_cache.author_scope(instance.author_id),
+        feed_cache.author_scope(instance.user_id),
+    )
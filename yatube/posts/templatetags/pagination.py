@@ -0,0 +1,11 @@
+from django import template
+
+from posts.func import elided_page_range
+
+register = template.Library()
+
+
+@register.filter
+def page_window(page):
+    """Номера страниц вокруг текущей; None — пропуск."""
+    return elided_page_range(page)
@@ -0,0 +1,26 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+from posts import feed_cache
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_output.html'
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post, **flags):
+    """Карточка поста из кеша; при промахе рендерится и сохраняется.
+
+    Карточка не зависит от читателя, поэтому общая для всех.
+    """
+    key = feed_cache.card_key(post, **flags)
+    html = cache.get(key)
+    if html is None:
+        card = context.template.engine.get_template(CARD_TEMPLATE)
+        with context.push(post=post, **flags):
+            html = card.render(context)
+        cache.set(key, html, settings.FEED_CACHE_TIMEOUT)
+    return mark_safe(html)
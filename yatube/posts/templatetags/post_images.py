@@ -0,0 +1,40 @@
+import logging
+
+from django import template
+
+from posts import thumbnails
+from posts.models import ThumbnailJob
+
+register = template.Library()
+logger = logging.getLogger(__name__)
+
+
+@register.simple_tag
+def post_thumbnail(post):
+    """Готовая миниатюра картинки поста или None, пока она в очереди.
+
+    В ``srcset`` — миниатюры всех ширин для ``<img srcset>``.
+    """
+    if not post.image:
+        return None
+    status = getattr(post, 'thumbnail_status', ThumbnailJob.DONE)
+    if status is None:
+        # Миниатюру готовит фоновая задача, а не этот запрос.
+        thumbnails.enqueue_missing(post)
+        return None
+    if status == ThumbnailJob.PENDING:
+        return None
+    try:
+        image = thumbnails.thumbnail(post.image)
+        # Размеры и адреса читаются здесь, чтобы ошибка не всплыла
+        # посреди шаблона.
+        image.url, image.width, image.height
+        image.srcset = ', '.join(
+            f'{variant.url} {variant.width}w'
+            for variant in thumbnails.variants(post.image)
+        )
+        return image
+    except Exception:
+        # Как и тег sorl, битая картинка не должна ронять страницу.
+        logger.exception('Не удалось получить миниатюру поста %s', post.pk)
+        return None
@@ -0,0 +1,194 @@
+import json
+
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import (AuthorStats, Comment, Follow, Group, Post,
+                          TimelineEntry)
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Тестовый текст {i}', author=cls.auth, group=cls.group)
+            for i in range(12)
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.auth, group=cls.group
+        )
+        Follow.objects.create(user=cls.reader, author=cls.auth)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_feeds_return_json_pages(self):
+        """Ленты API отдают страницу постов и курсор следующей"""
+        urls = (
+            reverse('posts:api_index'),
+            reverse('posts:api_group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:api_profile', kwargs={'username': 'auth'}),
+            reverse('posts:api_follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                self.assertEqual(len(data['results']), 10)
+                self.assertEqual(data['results'][0]['id'], self.post.pk)
+                self.assertEqual(data['results'][0]['group'], 'test-slug')
+                rest = self.client.get(url, {'cursor': data['next']}).json()
+                self.assertEqual(len(rest['results']), 3)
+                self.assertIsNone(rest['next'])
+
+    def test_post_detail_returns_comments(self):
+        """Пост в API отдаётся вместе с комментариями"""
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        url = reverse(
+            'posts:api_post_detail', kwargs={'post_id': self.post.pk}
+        )
+        data = self.client.get(url).json()
+        self.assertEqual(data['post']['text'], 'Тестовый пост')
+        self.assertEqual(data['post']['comments'], 1)
+        self.assertEqual(data['comments'][0]['author'], 'reader')
+
+    def test_unchanged_feed_answers_not_modified(self):
+        """Неизменившаяся лента отвечает 304 одним запросом"""
+        url = reverse('posts:api_index')
+        response = self.client.get(url)
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_update_etag(self):
+        """Правка поста и новый комментарий меняют ETag"""
+        urls = (
+            reverse('posts:api_index'),
+            reverse('posts:api_post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        changes = (
+            lambda: Post.objects.get(pk=self.post.pk).save(),
+            lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'
+            ),
+        )
+        for change in changes:
+            for url in urls:
+                etag = self.client.get(url)['ETag']
+                change()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                with self.subTest(url=url):
+                    self.assertEqual(response.status_code, 200)
+                    self.assertNotEqual(response['ETag'], etag)
+
+    def test_follow_requires_login(self):
+        """Лента подписок API без авторизации отвечает 401"""
+        response = Client().get(reverse('posts:api_follow_index'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_unknown_post_not_found(self):
+        response = self.client.get(
+            reverse('posts:api_post_detail', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class FollowBulkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        User.objects.bulk_create(
+            User(username=f'author_{i}') for i in range(50)
+        )
+        cls.authors = list(User.objects.filter(username__startswith='author_'))
+        Post.objects.bulk_create(
+            Post(text='Тестовый текст', author=author)
+            for author in cls.authors
+        )
+        Follow.objects.create(user=cls.reader, author=cls.authors[0])
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def post(self, data):
+        return self.client.post(
+            reverse('posts:api_follow_bulk'),
+            json.dumps(data),
+            content_type='application/json',
+        )
+
+    def test_bulk_follow(self):
+        """Подписка на список авторов не зависит от их числа по запросам"""
+        names = [author.username for author in self.authors]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post({'follow': names + ['ghost', 'reader']})
+        self.assertLess(len(queries), 20)
+        data = response.json()
+        self.assertEqual(data['followed'], 49)
+        self.assertEqual(data['missing'], ['ghost'])
+        self.assertEqual(Follow.objects.filter(user=self.reader).count(), 50)
+        self.assertEqual(
+            AuthorStats.objects.for_author(self.reader).following_count, 50
+        )
+        self.assertEqual(
+            AuthorStats.objects.for_author(self.authors[1]).followers_count, 1
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 50
+        )
+
+    def test_bulk_unfollow(self):
+        """Отписка списком убирает посты авторов из ленты"""
+        self.post({'follow': [self.authors[1].username]})
+        data = self.post({'unfollow': [
+            self.authors[0].username, self.authors[1].username,
+        ]}).json()
+        self.assertEqual(data['unfollowed'], 2)
+        self.assertFalse(Follow.objects.filter(user=self.reader).exists())
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists()
+        )
+        self.assertEqual(
+            AuthorStats.objects.for_author(self.authors[0]).followers_count, 0
+        )
+
+    @override_settings(THROTTLE_RATES={'follow_bulk': '1/m'})
+    def test_bulk_follow_is_throttled(self):
+        """Массовая подписка ограничена, как и остальные записи"""
+        self.assertEqual(self.post({'follow': []}).status_code, 200)
+        response = self.post({'follow': [self.authors[1].username]})
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(
+            Follow.objects.filter(author=self.authors[1]).exists()
+        )
+
+    def test_bad_payload(self):
+        self.assertEqual(self.post({'follow': 'author_1'}).status_code, 400)
+        self.assertEqual(self.post([]).status_code, 400)
+        response = Client().post(
+            reverse('posts:api_follow_bulk'), '{}',
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 401)
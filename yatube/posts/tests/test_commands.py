@@ -0,0 +1,199 @@
+import itertools
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import models
+from django.test import TestCase, override_settings
+
+from .. import search
+from ..importer import Importer, read_records
+from ..models import (AuthorStats, Comment, Follow, Group, Post,
+                      TimelineEntry)
+
+User = get_user_model()
+
+
+class SeedDataTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.media, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_seed_data_builds_consistent_graph(self):
+        """seed_data создаёт данные и согласованные счётчики и ленты"""
+        with override_settings(MEDIA_ROOT=self.media):
+            call_command(
+                'seed_data', users=30, groups=3, posts=200, comments=100,
+                follows=5, stdout=StringIO(),
+            )
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        self.assertFalse(Follow.objects.filter(
+            user=models.F('author')
+        ).exists())
+        top = AuthorStats.objects.order_by('-posts_count').first()
+        self.assertEqual(top.posts_count, top.author.posts.count())
+        reader = Follow.objects.first().user
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=reader).count(),
+            Post.objects.filter(author__following__user=reader).count(),
+        )
+        dates = Post.objects.order_by('pk').values_list('pub_date', flat=True)
+        self.assertEqual(list(dates), sorted(dates))
+        self.assertGreater(len(set(dates)), 1)
+        self.assertFalse(Comment.objects.filter(
+            created__lt=models.F('post__pub_date')
+        ).exists())
+
+
+class ImportFollowsTest(TestCase):
+    def test_import_follows_from_csv(self):
+        """import_follows читает CSV пачками и обновляет счётчики"""
+        for name in ('reader', 'auth', 'other'):
+            User.objects.create_user(username=name)
+        Post.objects.create(text='Тестовый пост', author=User.objects.get(
+            username='auth'
+        ))
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as file:
+            file.write('user,author\nreader,auth\nreader,other\n'
+                       'reader,ghost\nbroken\nother,auth\nreader,auth\n')
+            file.flush()
+            call_command(
+                'import_follows', file.name, chunk_size=2, stdout=StringIO()
+            )
+        self.assertEqual(Follow.objects.count(), 3)
+        auth = User.objects.get(username='auth')
+        self.assertEqual(
+            AuthorStats.objects.for_author(auth).followers_count, 2
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(post__author=auth).count(), 2
+        )
+
+
+class ImportPostsTest(TestCase):
+    SMALL_GIF = (
+        b'\x47\x49\x46\x38\x39\x61\x02\x00'
+        b'\x01\x00\x80\x00\x00\x00\x00\x00'
+        b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+        b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+        b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+        b'\x0A\x00\x3B'
+    )
+    RECORDS = (
+        {'type': 'post', 'id': 1, 'author': 'auth', 'text': 'Первый пост',
+         'group': 'test-slug', 'pub_date': '2020-01-02T03:04:05'},
+        {'type': 'post', 'id': 2, 'author': 'migrant', 'text': 'С картинкой',
+         'image': 'small.gif'},
+        {'type': 'post', 'id': 3, 'author': 'auth', 'text': ''},
+        {'type': 'post', 'id': 4, 'author': 'auth', 'text': 'Битая',
+         'image': 'missing.gif'},
+        {'type': 'comment', 'post': 1, 'author': 'migrant',
+         'text': 'Комментарий', 'created': '2020-01-03T00:00:00'},
+        {'type': 'comment', 'post': 3, 'author': 'auth', 'text': 'В пустоту'},
+        {'type': 'following', 'username': 'auth'},
+    )
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        with open(os.path.join(self.directory, 'small.gif'), 'wb') as file:
+            file.write(self.SMALL_GIF)
+        self.dump = os.path.join(self.directory, 'dump.ndjson')
+        with open(self.dump, 'w', encoding='utf-8') as file:
+            for record in self.RECORDS:
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            file.write('{broken\n')
+        User.objects.create_user(username='auth')
+        Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def import_posts(self, **options):
+        stdout = StringIO()
+        with override_settings(MEDIA_ROOT=self.directory):
+            call_command(
+                'import_posts', self.dump, images_dir=self.directory,
+                batch_size=2, workers=0, create_missing=True, stdout=stdout,
+                stderr=StringIO(), **options,
+            )
+        return stdout.getvalue()
+
+    def test_import_validates_and_keeps_dates(self):
+        """import_posts проверяет записи и сохраняет даты источника"""
+        output = self.import_posts()
+        self.assertIn('постов 2, комментариев 1', output)
+        self.assertIn('ошибок 4', output)
+        post = Post.objects.get(text='Первый пост')
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.group.slug, 'test-slug')
+        self.assertEqual(post.comments.get().created.day, 3)
+        migrant = User.objects.get(username='migrant')
+        self.assertFalse(migrant.has_usable_password())
+        self.assertTrue(migrant.posts.get().image.name.startswith('posts/'))
+        self.assertEqual(
+            AuthorStats.objects.for_author(migrant).comments_count, 1
+        )
+        self.assertEqual(search.post_ids('первые', 10), [post.pk])
+
+    def test_import_is_resumable(self):
+        """Повторный импорт продолжает с контрольной точки без дублей"""
+        records = read_records(self.dump)
+
+        def interrupted():
+            for record in itertools.islice(records, 3):
+                yield record
+            raise KeyboardInterrupt
+
+        importer = Importer(
+            'dump.ndjson', images_dir=self.directory, batch_size=2,
+            create_missing=True,
+        )
+        with override_settings(MEDIA_ROOT=self.directory):
+            with self.assertRaises(KeyboardInterrupt):
+                importer.run(interrupted())
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertIn('постов 0, комментариев 1', self.import_posts())
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertIn('постов 0, комментариев 0', self.import_posts())
+
+    def test_import_fans_out_with_new_ids(self):
+        """Новые посты попадают в ленты подписчиков и не занимают
+        ключи удалённых постов"""
+        auth = User.objects.get(username='auth')
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=auth)
+        deleted = Post.objects.create(text='Удалённый пост', author=auth).pk
+        Post.objects.filter(pk=deleted).delete()
+        self.import_posts()
+        post = Post.objects.get(text='Первый пост')
+        self.assertGreater(post.pk, deleted)
+        self.assertEqual(
+            list(TimelineEntry.objects.posts_for(reader)), [post]
+        )
+
+    def test_failed_batch_removes_images(self):
+        """Картинки пачки, которая не записалась, удаляются"""
+        with mock.patch.object(
+            Importer, 'create_posts', side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                self.import_posts()
+        self.assertEqual(
+            os.listdir(os.path.join(self.directory, 'posts')), []
+        )
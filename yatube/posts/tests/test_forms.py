@@ -1,7 +1,11 @@
+import io
 import shutil
 import tempfile
+from unittest import mock
+from PIL import Image
+from posts import thumbnails
 from posts.forms import PostForm
-from posts.models import Post, Group, Comment
+from posts.models import Post, Group, Comment, ThumbnailJob
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -137,3 +141,96 @@ class PostFormsTests(TestCase):
         self.assertRedirects(response, reverse('posts:post_detail',
                              kwargs={'post_id': self.post.id}))
         self.assertEqual(Comment.objects.count(), comment_count + 1)
+
+    def test_post_image_thumbnail_is_queued(self):
+        """Картинка нового поста ставит миниатюру в очередь,
+        до готовности лента показывает заглушку"""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с картинкой',
+                'image': self.small_gif_creation('small_queue'),
+            },
+        )
+        post = Post.objects.get(text='Пост с картинкой')
+        job = ThumbnailJob.objects.get(post=post)
+        self.assertEqual(job.status, ThumbnailJob.PENDING)
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'img/placeholder.svg')
+        thumbnails.process(post.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ThumbnailJob.DONE)
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'img/placeholder.svg')
+
+    def test_image_without_job_is_queued_on_render(self):
+        """Картинку без задачи (старый пост, админка) лента ставит в
+        очередь и показывает заглушку, не готовя миниатюры в запросе"""
+        post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.auth,
+            image=self.small_gif_creation('small_no_job'),
+        )
+        with mock.patch.object(thumbnails, 'get_thumbnail') as thumbnail:
+            response = self.authorized_client.get(reverse('posts:index'))
+        thumbnail.assert_not_called()
+        self.assertContains(response, 'img/placeholder.svg')
+        job = ThumbnailJob.objects.get(post=post)
+        self.assertEqual(job.status, ThumbnailJob.PENDING)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1)
+    def test_post_image_pixel_limit(self):
+        """Картинка больше предела пикселей не принимается"""
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Огромная картинка',
+                'image': self.small_gif_creation('small_huge'),
+            },
+        )
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка 2×1 слишком велика'
+        )
+        self.assertFalse(
+            Post.objects.filter(text='Огромная картинка').exists()
+        )
+
+    @override_settings(POST_IMAGE_MAX_SIDE=200)
+    def test_post_image_is_optimized(self):
+        """Фоновая задача поворачивает оригинал по EXIF, убирает
+        метаданные, ужимает его и готовит миниатюры для srcset"""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        buffer = io.BytesIO()
+        Image.new('RGB', (400, 300), 'red').save(
+            buffer, 'JPEG', exif=exif.tobytes()
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с фотографией',
+                'image': SimpleUploadedFile(
+                    'photo.jpg', buffer.getvalue(), content_type='image/jpeg'
+                ),
+            },
+        )
+        post = Post.objects.get(text='Пост с фотографией')
+        original = post.image.name
+        thumbnails.process(post.id)
+        post.refresh_from_db()
+        self.assertTrue(post.image.name.endswith(
+            thumbnails.EXTENSIONS[thumbnails.IMAGE_FORMAT]
+        ))
+        self.assertNotEqual(post.image.name, original)
+        self.assertFalse(post.image.storage.exists(original))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (150, 200))
+            self.assertNotIn('exif', image.info)
+        job = ThumbnailJob.objects.get(post=post)
+        self.assertEqual(job.optimized_bytes, post.image.size)
+        self.assertEqual(
+            ThumbnailJob.objects.bytes_saved(),
+            job.original_bytes - job.optimized_bytes,
+        )
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'srcset=')
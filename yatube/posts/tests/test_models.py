@@ -1,7 +1,16 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
 
-from ..models import Group, Post, Comment, Follow
+from .. import trending
+from ..func import CursorPaginator
+from ..models import (AuthorStats, Group, GroupStats, Post, Comment, Follow,
+                      SuggestedAuthor, TimelineEntry)
 
 User = get_user_model()
 
@@ -85,3 +94,371 @@ class PostModelTest(TestCase):
         for field, help_text in field_help_text.items():
             with self.subTest(help_text=help_text):
                 self.assertEqual(field, help_text, 'Ошибка в help_text')
+
+
+class AuthorStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='auth')
+        cls.user = User.objects.create_user(username='user')
+
+    def stats(self, user):
+        return AuthorStats.objects.for_author(user)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении записей."""
+        post = Post.objects.create(author=self.auth, text='Тестовый пост')
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.user, author=self.auth)
+        self.assertEqual(self.stats(self.auth).posts_count, 1)
+        self.assertEqual(self.stats(self.auth).followers_count, 1)
+        self.assertEqual(self.stats(self.user).comments_count, 1)
+        self.assertEqual(self.stats(self.user).following_count, 1)
+        follow.delete()
+        comment.delete()
+        post.delete()
+        for user in (self.auth, self.user):
+            stats = self.stats(user)
+            for field in AuthorStats.objects.COUNTERS:
+                with self.subTest(user=user, field=field):
+                    self.assertEqual(getattr(stats, field), 0)
+
+    def test_rebuild_command(self):
+        """Команда восстанавливает статистику по исходным таблицам."""
+        Post.objects.bulk_create(
+            Post(author=self.auth, text='Тестовый пост') for _ in range(3)
+        )
+        AuthorStats.objects.all().delete()
+        call_command('rebuild_author_stats', stdout=StringIO())
+        self.assertEqual(self.stats(self.auth).posts_count, 3)
+        self.assertEqual(self.stats(self.user).posts_count, 0)
+
+
+class AtomicCountersTest(TransactionTestCase):
+    def test_failed_handler_rolls_back_write(self):
+        """Сбой обработчика после записи откатывает и запись, и счётчик"""
+        auth = User.objects.create_user(username='auth')
+        with mock.patch.object(
+            TimelineEntry.objects, 'fan_out', side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                Post.objects.create(author=auth, text='Тестовый пост')
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual(AuthorStats.objects.for_author(auth).posts_count, 0)
+
+
+class GroupStatsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.auth = User.objects.create_user(username='auth')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.second = Group.objects.create(
+            title='Вторая группа',
+            slug='second-slug',
+            description='Тестовое описание',
+        )
+
+    def stats(self, group):
+        return GroupStats.objects.get(group=group)
+
+    def test_counters_follow_posts(self):
+        """Статистика группы следует за созданием, правкой и удалением"""
+        posts = [
+            Post.objects.create(
+                text='Пост', author=self.auth, group=self.group
+            )
+            for _ in range(2)
+        ]
+        latest = Post.objects.create(
+            text='Пост', author=self.other, group=self.group
+        )
+        stats = self.stats(self.group)
+        self.assertEqual(stats.posts_count, 3)
+        self.assertEqual(stats.last_post_at, latest.pub_date)
+        self.assertEqual(stats.top_authors_list(), [
+            {'username': 'auth', 'posts': 2},
+            {'username': 'other', 'posts': 1},
+        ])
+        latest = Post.objects.get(pk=latest.pk)
+        latest.group = self.second
+        latest.save()
+        posts[0].delete()
+        stats = self.stats(self.group)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.last_post_at, posts[1].pub_date)
+        self.assertEqual(
+            stats.top_authors_list(), [{'username': 'auth', 'posts': 1}]
+        )
+        self.assertEqual(self.stats(self.second).posts_count, 1)
+
+    def test_deferred_group_is_not_a_move(self):
+        """Сохранение поста без загруженной группы не трогает счётчики"""
+        post = Post.objects.create(
+            text='Пост', author=self.auth, group=self.group
+        )
+        post = Post.objects.only('text').get(pk=post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(self.stats(self.group).posts_count, 1)
+
+    def test_group_deletion_keeps_posts(self):
+        """Удаление группы оставляет посты без группы и убирает статистику"""
+        post = Post.objects.create(
+            text='Пост', author=self.auth, group=self.second
+        )
+        self.second.delete()
+        self.assertFalse(GroupStats.objects.filter(group_id=self.second.pk))
+        post.refresh_from_db()
+        self.assertIsNone(post.group_id)
+
+    def test_rebuild_matches_counters(self):
+        """Пересчёт совпадает со счётчиками, которые ведут сигналы"""
+        for author in (self.auth, self.other, self.auth):
+            Post.objects.create(text='Пост', author=author, group=self.group)
+        fields = ('group_id', 'posts_count', 'last_post_at', 'top_authors')
+        before = list(GroupStats.objects.order_by('group').values(*fields))
+        call_command('rebuild_group_stats', stdout=StringIO())
+        after = list(GroupStats.objects.order_by('group').values(*fields))
+        self.assertEqual(before, after)
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='auth')
+        cls.user = User.objects.create_user(username='user')
+
+    def timeline(self):
+        return list(TimelineEntry.objects.posts_for(self.user))
+
+    def test_fan_out_and_unfollow(self):
+        """Новый пост попадает в ленту подписчика, отписка её чистит."""
+        old_post = Post.objects.create(author=self.auth, text='Старый')
+        Follow.objects.create(user=self.user, author=self.auth)
+        new_post = Post.objects.create(author=self.auth, text='Новый')
+        self.assertCountEqual(self.timeline(), [old_post, new_post])
+        Follow.objects.filter(user=self.user, author=self.auth).delete()
+        self.assertEqual(self.timeline(), [])
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_timeline_is_trimmed(self):
+        """В ленте хранится не больше TIMELINE_LENGTH записей."""
+        Follow.objects.create(user=self.user, author=self.auth)
+        for _ in range(4):
+            Post.objects.create(author=self.auth, text='Пост')
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 2
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_prolific_author_is_read_on_demand(self):
+        """Посты популярного автора подмешиваются при чтении."""
+        Follow.objects.create(user=self.user, author=self.auth)
+        post = Post.objects.create(author=self.auth, text='Пост')
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.timeline(), [post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_sources_are_merged_by_date(self):
+        """Лента и посты популярного автора сливаются по дате,
+        курсорные страницы идут без повторов и пропусков."""
+        star = User.objects.create_user(username='star')
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=fan, author=star)
+        Follow.objects.create(user=self.user, author=star)
+        Follow.objects.create(user=self.user, author=self.auth)
+        posts = [
+            Post.objects.create(author=author, text='Пост')
+            for author in [self.auth, star, star, self.auth, star] * 3
+        ]
+        expected = sorted(
+            posts, key=lambda post: (post.pub_date, post.pk), reverse=True
+        )
+        self.assertEqual(self.timeline(), expected)
+        feed = TimelineEntry.objects.posts_for(self.user)
+        paginator = CursorPaginator(feed, 4)
+        pages, cursor = [], None
+        while True:
+            pages.extend(paginator.get_page(cursor))
+            cursor = paginator.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(pages, expected)
+        self.assertEqual(feed.count(), len(posts))
+        self.assertEqual(feed.newest(), expected[0].pub_date)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_author_below_limit_is_backfilled(self):
+        """Посты, написанные автором в популярности, попадают в ленты
+        подписчиков, когда он перестаёт быть популярным."""
+        fan = User.objects.create_user(username='fan')
+        unfollow = {
+            'signal': lambda: Follow.objects.filter(user=fan).delete(),
+            'bulk': lambda: Follow.objects.remove_edges(
+                fan.pk, [self.auth.pk]
+            ),
+        }
+        for name, remove in unfollow.items():
+            with self.subTest(unfollow=name):
+                TimelineEntry.objects.all().delete()
+                for reader in (self.user, fan):
+                    Follow.objects.get_or_create(
+                        user=reader, author=self.auth
+                    )
+                post = Post.objects.create(author=self.auth, text='Пост')
+                self.assertFalse(TimelineEntry.objects.exists())
+                remove()
+                self.assertIn(
+                    (self.user.pk, post.pk),
+                    TimelineEntry.objects.values_list('user', 'post'),
+                )
+                self.assertFalse(
+                    TimelineEntry.objects.filter(user=fan).exists()
+                )
+
+
+class TrendingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.auth = User.objects.create_user(username='auth')
+        cls.posts = [
+            Post.objects.create(text=f'Тестовый пост {i}', author=cls.auth)
+            for i in range(3)
+        ]
+
+    def comment(self, post, hours_ago=0):
+        comment = Comment.objects.create(
+            post=post, author=self.auth, text='Комментарий'
+        )
+        if hours_ago:
+            # Дату поправляем вместе с оценкой, как при импорте.
+            trending.record([comment], sign=-1)
+            comment.created -= timedelta(hours=hours_ago)
+            comment.save()
+            trending.record([comment])
+        return comment
+
+    def ranking(self):
+        return list(Post.objects.trending())
+
+    def test_fresh_comments_outrank_old_ones(self):
+        """Свежие комментарии весят больше старых"""
+        first, second, third = self.posts
+        for _ in range(3):
+            self.comment(first, hours_ago=48)
+        self.comment(second)
+        self.assertEqual(self.ranking(), [second, first])
+        self.comment(first)
+        self.assertEqual(self.ranking(), [first, second])
+
+    def test_decay_keeps_order_and_drops_faded(self):
+        """Перенос точки отсчёта не меняет порядок и убирает угасшие"""
+        first, second, third = self.posts
+        self.comment(first)
+        self.comment(first)
+        self.comment(second)
+        self.comment(third, hours_ago=24 * 7)
+        self.assertEqual(self.ranking(), [first, second, third])
+        trending.decay(timezone.now() + timedelta(hours=1))
+        self.assertEqual(self.ranking(), [first, second])
+
+    def test_rebuild_matches_incremental_scores(self):
+        """Пересчёт по комментариям совпадает с инкрементальным"""
+        first, second, _ = self.posts
+        self.comment(first, hours_ago=5)
+        self.comment(second)
+        comment = self.comment(second)
+        comment.delete()
+        now = timezone.now()
+        trending.decay(now)
+        scores = dict(Post.objects.values_list('pk', 'trending_score'))
+        call_command('update_trending', rebuild=True, stdout=StringIO())
+        for pk, score in Post.objects.values_list('pk', 'trending_score'):
+            self.assertAlmostEqual(score, scores[pk], places=2)
+
+    def test_weight_without_decay_stays_finite(self):
+        """Без update_trending годами вес комментария не переполняется"""
+        epoch = timezone.now()
+        later = trending.weight(epoch + timedelta(days=3650), epoch)
+        self.assertEqual(later, 2 ** trending.MAX_EXPONENT)
+
+    def test_edit_keeps_concurrent_score(self):
+        """Правка поста не затирает прибавку популярности"""
+        post = Post.objects.get(pk=self.posts[0].pk)
+        self.comment(post)
+        post.text = 'Новый текст'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Новый текст')
+        self.assertGreater(post.trending_score, 0)
+
+
+class SuggestedAuthorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        names = ('reader', 'friend', 'friend_of_friend', 'star', 'writer',
+                 'fan')
+        cls.users = {
+            name: User.objects.create_user(username=name) for name in names
+        }
+        users = cls.users
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for user, author in (
+            ('reader', 'friend'),
+            ('friend', 'friend_of_friend'),
+            ('fan', 'star'),
+            ('friend', 'star'),
+            ('writer', 'star'),
+        ):
+            Follow.objects.create(user=users[user], author=users[author])
+        for name in ('reader', 'writer'):
+            Post.objects.create(
+                text='Тестовый пост', author=users[name], group=cls.group
+            )
+        call_command('rebuild_suggestions', stdout=StringIO())
+
+    def suggested(self, name):
+        return {
+            suggestion.author.username: suggestion.reason
+            for suggestion in SuggestedAuthor.objects.for_user(
+                self.users[name], limit=10
+            )
+        }
+
+    def test_signals_and_popular_fallback(self):
+        """Рекомендации учитывают граф подписок, группы и популярность"""
+        suggested = self.suggested('reader')
+        self.assertEqual(
+            suggested['friend_of_friend'], SuggestedAuthor.FRIENDS
+        )
+        self.assertIn('star', suggested)
+        self.assertEqual(suggested['writer'], SuggestedAuthor.GROUPS)
+        self.assertNotIn('reader', suggested)
+        self.assertNotIn('friend', suggested)
+        # Без подписок и постов остаются только популярные авторы.
+        self.assertEqual(self.suggested('friend_of_friend'), {
+            'star': SuggestedAuthor.POPULAR,
+            'friend': SuggestedAuthor.POPULAR,
+        })
+
+    def test_followed_suggestion_is_hidden(self):
+        """После подписки автор пропадает из рекомендаций одним запросом"""
+        Follow.objects.create(
+            user=self.users['reader'], author=self.users['friend_of_friend']
+        )
+        with self.assertNumQueries(1):
+            suggested = self.suggested('reader')
+        self.assertNotIn('friend_of_friend', suggested)
@@ -0,0 +1,65 @@
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedQueriesTests(TestCase):
+    """Число запросов ленты не зависит от количества постов на странице."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(
+            username='auth', first_name='Имя', last_name='Фамилия'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for _ in range(10):
+            post = Post.objects.create(
+                text='Тестовый текст',
+                author=cls.auth,
+                group=cls.group,
+            )
+            Comment.objects.create(post=post, author=cls.reader, text='Ок')
+        Follow.objects.create(user=cls.reader, author=cls.auth)
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        cache.clear()
+
+    def test_feed_query_budget(self):
+        """Ленты укладываются в фиксированный бюджет запросов"""
+        # Сессия и пользователь — по запросу на каждую страницу
+        # авторизованного клиента; в профиле и ленте подписок ещё
+        # запрос рекомендаций авторов. Лента подписок до загрузки постов
+        # читает популярных авторов из подписок и ключи своей ленты.
+        budgets = {
+            reverse('posts:index'): 3,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}): 4,
+            reverse('posts:profile', kwargs={'username': 'auth'}): 7,
+            reverse('posts:follow_index'): 6,
+            reverse('posts:trending'): 4,
+            reverse('posts:groups'): 3,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(budget):
+                    self.reader_client.get(url)
+
+    def test_feed_rows_carry_related_data(self):
+        """Автор, группа и число комментариев приходят одним запросом"""
+        post = Post.objects.feed().first()
+        with self.assertNumQueries(0):
+            self.assertEqual(post.author.username, 'auth')
+            self.assertEqual(post.group.slug, self.group.slug)
+            self.assertEqual(post.comments_count, 1)
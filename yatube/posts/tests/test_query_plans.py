@@ -0,0 +1,164 @@
+import re
+
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from posts.func import AFTER, BEFORE, encode_cursor
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+FULL_SCAN = re.compile(r'^SCAN (?!subquery\b)\S+$')
+# Любой проход по таблице постов или лент подписок, в том числе по
+# индексу с его начала.
+FEED_TABLES = ('posts_post', 'posts_timelineentry')
+POSTS_SCAN = re.compile(r'^SCAN posts_(post|timelineentry)\b')
+POSTS_SEARCH = re.compile(
+    r'^SEARCH posts_(post|timelineentry) USING .*\bpub_date[<>]'
+)
+AUTHOR_SEARCH = re.compile(
+    r'^SEARCH posts_post USING (COVERING )?INDEX \S+ '
+    r'\(author_id=\? AND pub_date[<>]'
+)
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+class QueryPlanTests(TestCase):
+    """Горячие запросы лент идут по индексам, без полного просмотра
+    таблиц и без сортировки во временном B-дереве."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.auth = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        User.objects.bulk_create(
+            User(username=f'author_{i}') for i in range(20)
+        )
+        authors = list(User.objects.filter(username__startswith='author_'))
+        Post.objects.bulk_create(
+            Post(
+                text='Тестовый текст',
+                author=authors[i % len(authors)],
+                group=cls.group if i % 3 else None,
+            )
+            for i in range(300)
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.auth, group=cls.group
+        )
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.reader, text='Комментарий')
+            for _ in range(30)
+        )
+        for author in [cls.auth] + authors[:5]:
+            Follow.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def query_plans(self, url):
+        # План строится с параметрами, как у настоящего запроса: по
+        # подставленным литералам SQLite выбирает другие индексы.
+        cache.clear()
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            self.client.get(url)
+        for sql, params in queries:
+            if 'posts_' not in sql:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                yield sql, [row[3] for row in cursor.fetchall()]
+
+    def test_hot_queries_use_indexes(self):
+        """Запросы страниц лент не просматривают таблицы целиком"""
+        pages = {
+            'posts:index': {},
+            'posts:group_list': {'slug': self.group.slug},
+            'posts:profile': {'username': self.auth.username},
+            'posts:post_detail': {'post_id': self.post.pk},
+            'posts:follow_index': {},
+            'posts:trending': {},
+            'posts:groups': {},
+        }
+        for name, kwargs in pages.items():
+            for sql, plan in self.query_plans(reverse(name, kwargs=kwargs)):
+                with self.subTest(page=name, sql=sql):
+                    scans = [step for step in plan if FULL_SCAN.match(step)]
+                    self.assertEqual(scans, [], plan)
+                    sorts = [step for step in plan if TEMP_SORT in step]
+                    self.assertEqual(sorts, [], plan)
+
+    def test_deep_cursor_pages_search_index(self):
+        """Глубокие страницы курсорной пагинации ищут место в индексе
+        по дате, а не проходят ленту с начала"""
+        author = User.objects.get(username='author_0')
+        pages = {
+            'posts:index': ({}, Post.objects.all()),
+            'posts:group_list': (
+                {'slug': self.group.slug},
+                Post.objects.filter(group=self.group),
+            ),
+            'posts:profile': (
+                {'username': author.username},
+                Post.objects.filter(author=author),
+            ),
+            'posts:follow_index': (
+                {}, Post.objects.filter(author__following__user=self.reader)
+            ),
+        }
+        for name, (kwargs, posts) in pages.items():
+            posts = posts.order_by('-pub_date', '-id')
+            middle = posts[posts.count() // 2]
+            for direction in (AFTER, BEFORE):
+                cursor = encode_cursor(direction, middle.pub_date, middle.pk)
+                url = f'{reverse(name, kwargs=kwargs)}?cursor={cursor}'
+                plans = [
+                    step for sql, plan in self.query_plans(url)
+                    if any(table in sql for table in FEED_TABLES)
+                    for step in plan
+                ]
+                with self.subTest(page=name, direction=direction):
+                    scans = [step for step in plans if POSTS_SCAN.match(step)]
+                    self.assertEqual(scans, [], plans)
+                    self.assertTrue(
+                        any(POSTS_SEARCH.match(step) for step in plans),
+                        plans,
+                    )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_prolific_authors_read_by_author_index(self):
+        """Посты популярных авторов лента подписок читает по индексу
+        автора не дальше страницы, без сортировки всех их постов"""
+        posts = Post.objects.filter(
+            author__following__user=self.reader
+        ).order_by('-pub_date', '-id')
+        middle = posts[posts.count() // 2]
+        for direction in (AFTER, BEFORE):
+            cursor = encode_cursor(direction, middle.pub_date, middle.pk)
+            url = f'{reverse("posts:follow_index")}?cursor={cursor}'
+            plans = [
+                step for sql, plan in self.query_plans(url)
+                if 'posts_post' in sql for step in plan
+            ]
+            with self.subTest(direction=direction):
+                self.assertEqual(
+                    [step for step in plans if TEMP_SORT in step], [], plans
+                )
+                self.assertTrue(any(
+                    AUTHOR_SEARCH.match(step) for step in plans
+                ), plans)
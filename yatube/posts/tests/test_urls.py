@@ -42,6 +42,8 @@ class PostURLTests(TestCase):
             f'/group/{self.post.group.slug}/': HTTPStatus.OK,
             f'/profile/{self.post.author.username}/': HTTPStatus.OK,
             f'/posts/{self.post.id}/': HTTPStatus.OK,
+            '/groups/': HTTPStatus.OK,
+            '/trending/': HTTPStatus.OK,
             '/unexissting_page/': HTTPStatus.NOT_FOUND,
         }
         for template, answer in template_answer.items():
@@ -85,6 +87,8 @@ class PostURLTests(TestCase):
             f'/posts/{self.post.id}/': 'posts/post_detail.html',
             f'/posts/{self.post.id}/edit/': 'posts/create_post.html',
             '/create/': 'posts/create_post.html',
+            '/groups/': 'posts/groups.html',
+            '/trending/': 'posts/trending.html',
         }
         for address, template in url_names_templates.items():
             with self.subTest(address=address):
@@ -92,7 +96,8 @@ class PostURLTests(TestCase):
                 self.assertTemplateUsed(response, template)
 
     def test_index_cache(self):
-        """Проверка работы кеширования на странице index"""
+        """Лента index отдаётся из кеша, пока посты не меняются,
+        и сбрасывается при удалении поста"""
         object_to_delete = Post.objects.create(
             text='Тестовый текст',
             author=self.user,
@@ -100,9 +105,18 @@ class PostURLTests(TestCase):
         )
         response = self.authorized_client.get(reverse('posts:index'))
         page_content = response.content
-        object_to_delete.delete()
-        response = self.authorized_client.get(reverse('posts:index'))
+        # Сессия и пользователь; посты берутся из кеша
+        with self.assertNumQueries(2):
+            response = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(page_content, response.content)
-        cache.clear()
+        object_to_delete.delete()
         response = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(page_content, response.content)
+
+    def test_cached_index_keeps_user_header(self):
+        """Закешированная лента не подменяет шапку другого пользователя"""
+        self.authorized_client.get(reverse('posts:index'))
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertNotContains(
+            response, f'Пользователь: {self.user.username}'
+        )
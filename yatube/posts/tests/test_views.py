@@ -1,11 +1,25 @@
+import io
+import json
+import shutil
+import tempfile
+import zipfile
+
+from django.conf import settings
 from django.core.cache import cache
 from django import forms
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from posts.models import Post, Group
+from posts import feed_cache
+from posts.func import elided_page_range
+from posts.models import (AuthorStats, Comment, Follow, Group, GroupStats,
+                          Post)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 User = get_user_model()
 
@@ -230,3 +244,310 @@ class PaginatorViewsTest(TestCase):
             with self.subTest(page_name):
                 response = self.client.get(template + '?page=2')
                 self.assertEqual(len(response.context['page_obj']), 3)
+
+
+class PageRangeTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.auth = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.auth, group=cls.group)
+            for i in range(250)
+        )
+        AuthorStats.objects.rebuild()
+        GroupStats.objects.rebuild()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_page_range_is_elided(self):
+        """Навигация — края и окно вокруг текущей страницы"""
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'auth'}),
+            {'page': 12},
+        )
+        page = response.context['page_obj']
+        self.assertEqual(
+            elided_page_range(page), [1, None, 10, 11, 12, 13, 14, None, 25]
+        )
+        self.assertContains(response, '&hellip;', count=2)
+        self.assertNotContains(response, 'page=20"')
+
+    def test_feeds_skip_count(self):
+        """Номера страниц берут число постов из счётчиков и кеша"""
+        urls = (
+            reverse('posts:profile', kwargs={'username': 'auth'}),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:index'),
+        )
+        self.client.get(reverse('posts:index'), {'page': 2})
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, {'page': 2})
+                self.assertEqual(
+                    response.context['page_obj'].paginator.num_pages, 25
+                )
+                self.assertFalse(any(
+                    'COUNT(*)' in query['sql'] for query in queries
+                ))
+
+
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='auth')
+        for _ in range(13):
+            Post.objects.create(text='Тестовый текст', author=cls.auth)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_navigation(self):
+        """Курсоры ведут на следующую и обратно на первую страницу"""
+        url = reverse('posts:profile', kwargs={'username': 'auth'})
+        first = self.client.get(url).context['page_obj']
+        self.assertEqual(len(first), 10)
+        self.assertIsNone(first.paginator.previous_cursor)
+        second = self.client.get(
+            url, {'cursor': first.paginator.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second), 3)
+        self.assertIsNone(second.paginator.next_cursor)
+        back = self.client.get(
+            url, {'cursor': second.paginator.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            [post.pk for post in back], [post.pk for post in first]
+        )
+
+    def test_broken_cursor_shows_first_page(self):
+        """Битый курсор открывает первую страницу"""
+        response = self.client.get(reverse('posts:index'), {'cursor': '!!'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+
+@override_settings(COMMENTS_COUNT=5)
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.auth)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.auth, text=f'Комментарий {i}')
+            for i in range(7)
+        )
+
+    def test_post_detail_shows_first_comments_page(self):
+        """post_detail выводит одну страницу комментариев"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 5)
+        self.assertContains(response, 'Показать ещё')
+
+    def test_load_more_returns_next_page(self):
+        """Фрагмент «Показать ещё» отдаёт оставшиеся комментарии"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        first = self.client.get(url).context['comments']
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+            {'cursor': first.paginator.next_cursor},
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        self.assertEqual(len(response.context['comments']), 2)
+        self.assertNotContains(response, 'Показать ещё')
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            text='Гуляли с котами по набережной', author=cls.auth
+        )
+        Post.objects.create(text='Собака ждёт хозяина', author=cls.auth)
+
+    def search(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_search_matches_word_forms(self):
+        """Поиск находит пост по другой форме слова"""
+        response = self.client.get(reverse('posts:search'), {'q': 'кот'})
+        self.assertTemplateUsed(response, 'posts/search.html')
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [self.post.pk],
+        )
+        self.assertEqual(self.search('набережная гулять'), [self.post.pk])
+        self.assertEqual(self.search('кот хозяин'), [])
+
+    def test_index_follows_edit_and_delete(self):
+        """Индекс обновляется при правке и удалении поста"""
+        post = Post.objects.create(text='Первая версия', author=self.auth)
+        self.assertEqual(self.search('версии'), [post.pk])
+        post.text = 'Исправленный текст'
+        post.save()
+        self.assertEqual(self.search('версии'), [])
+        self.assertEqual(self.search('исправленные'), [post.pk])
+        post.delete()
+        self.assertEqual(self.search('исправленные'), [])
+
+    def test_empty_query_shows_form(self):
+        """Пустой запрос показывает только форму поиска"""
+        response = self.client.get(reverse('posts:search'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+
+class GroupDirectoryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.auth = User.objects.create_user(username='auth')
+        cls.groups = [
+            Group.objects.create(
+                title=f'Группа {i}', slug=f'group-{i}',
+                description='Тестовое описание',
+            )
+            for i in range(3)
+        ]
+        for i, group in enumerate(cls.groups):
+            for _ in range(i):
+                Post.objects.create(
+                    text='Тестовый текст', author=cls.auth, group=group
+                )
+
+    def test_directory_lists_groups_by_activity(self):
+        """Каталог групп показывает все группы, самые активные первыми"""
+        response = self.client.get(reverse('posts:groups'))
+        stats = list(response.context['stats'])
+        self.assertEqual(
+            [stat.group for stat in stats], self.groups[::-1]
+        )
+        self.assertEqual(stats[0].posts_count, 2)
+        self.assertContains(response, 'Чаще всех пишут')
+
+
+class TrendingViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.auth = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(text=f'Тестовый текст {i}', author=cls.auth)
+            for i in range(15)
+        )
+        cls.posts = list(Post.objects.order_by('pk'))
+        for i, post in enumerate(cls.posts[:12]):
+            for _ in range(i + 1):
+                Comment.objects.create(
+                    post=post, author=cls.auth, text='Комментарий'
+                )
+
+    def test_trending_orders_by_discussion(self):
+        """Популярное — посты с комментариями, самые обсуждаемые первыми"""
+        response = self.client.get(reverse('posts:trending'))
+        page = response.context['page_obj']
+        self.assertEqual(page.paginator.count, 12)
+        self.assertEqual(page[0], self.posts[11])
+        self.assertEqual(page[9], self.posts[2])
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.auth = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.auth)
+
+    def setUp(self):
+        cache.clear()
+
+    def card_key(self):
+        post = Post.objects.feed().get(pk=self.post.pk)
+        return feed_cache.card_key(post)
+
+    def test_page_is_assembled_from_cached_cards(self):
+        """Сдвиг ленты новым постом не рендерит заново старые карточки"""
+        response = self.client.get(reverse('posts:index'))
+        key = self.card_key()
+        self.assertIn(cache.get(key), response.content.decode())
+        cache.set(key, '<p>Карточка из кеша</p>')
+        Post.objects.create(text='Новый пост', author=self.auth)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Карточка из кеша')
+        self.assertContains(response, 'Новый пост')
+
+    def test_card_version_follows_content(self):
+        """Новый комментарий меняет версию карточки"""
+        key = self.card_key()
+        Comment.objects.create(
+            post=self.post, author=self.auth, text='Комментарий'
+        )
+        self.assertNotEqual(self.card_key(), key)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Комментариев: 1')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ExportViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        Post.objects.bulk_create(
+            Post(text=f'Тестовый текст {i}', author=cls.auth)
+            for i in range(5)
+        )
+        cls.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=cls.auth,
+            image=SimpleUploadedFile(
+                name='export.gif', content=b'GIF89a', content_type='image/gif'
+            ),
+        )
+        Comment.objects.create(post=cls.post, author=cls.auth, text='Ответ')
+        Follow.objects.create(user=cls.reader, author=cls.auth)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.auth)
+
+    def export(self, format):
+        response = self.client.get(reverse('posts:export'), {'format': format})
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_ndjson_export(self):
+        """Архив NDJSON содержит посты, комментарии и подписчиков"""
+        records = [
+            json.loads(line) for line in self.export('ndjson').splitlines()
+        ]
+        types = [record['type'] for record in records]
+        self.assertEqual(types.count('post'), 6)
+        self.assertEqual(types.count('comment'), 1)
+        self.assertIn({'type': 'follower', 'username': 'reader'}, records)
+        self.assertEqual(records[5]['image'], self.post.image.name)
+
+    def test_zip_export_includes_images(self):
+        """ZIP-архив содержит файлы NDJSON и картинки постов"""
+        with zipfile.ZipFile(io.BytesIO(self.export('zip'))) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(
+                len(archive.read('posts.ndjson').splitlines()), 6
+            )
+            self.assertEqual(archive.read(self.post.image.name), b'GIF89a')
+
+    def test_export_requires_login(self):
+        self.client.logout()
+        response = self.client.get(reverse('posts:export'))
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,224 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Очередь хранится в таблице ThumbnailJob: задача ставится при сохранении
+картинки через PostForm и выполняется пулом потоков после коммита.
+Картинки без задачи (старые посты, админка) ставятся в очередь при
+первом показе в ленте.
+Пока миниатюра не готова, шаблоны показывают заглушку, а не режут
+оригинал внутри запроса. Пул живёт в процессе сервера: задачи, которые
+не успели выполниться до перезапуска, остаются в очереди, пока их не
+доделает ``regenerate_thumbnails --pending``.
+
+Задача сначала сжимает сам оригинал: поворачивает его по EXIF, убирает
+метаданные, ужимает до POST_IMAGE_MAX_SIDE и перекодирует в WebP, а если
+Pillow собран без него — в прогрессивный JPEG. Затем готовит миниатюры
+всех ширин POST_THUMBNAIL_WIDTHS для srcset.
+"""
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from PIL import Image, ImageOps, features
+from sorl.thumbnail import delete, get_thumbnail
+
+from . import feed_cache
+from .models import Post, ThumbnailJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+IMAGE_FORMAT = 'WEBP' if features.check('webp') else 'JPEG'
+EXTENSIONS = {'WEBP': '.webp', 'JPEG': '.jpg'}
+# Перекодированный оригинал без поворота и уменьшения заменяет исходный,
+# только если заметно меньше его: повторное сжатие не должно копить
+# потери качества.
+MIN_GAIN = 0.9
+
+
+def geometry(width):
+    """Геометрия sorl для ширины ``width`` с пропорциями ленты."""
+    base_width, base_height = map(
+        int, settings.POST_THUMBNAIL_GEOMETRY.split('x')
+    )
+    return f'{width}x{round(width * base_height / base_width)}'
+
+
+def thumbnail(image, width=None):
+    """Миниатюра в размерах лент; создаётся, если её ещё нет.
+
+    Миниатюры шире основной не растягивают маленький оригинал.
+    """
+    base_width = int(settings.POST_THUMBNAIL_GEOMETRY.split('x')[0])
+    width = width or base_width
+    options = dict(
+        settings.POST_THUMBNAIL_OPTIONS,
+        format=IMAGE_FORMAT,
+        quality=settings.POST_IMAGE_QUALITY,
+    )
+    if width > base_width:
+        options['upscale'] = False
+    return get_thumbnail(image, geometry(width), **options)
+
+
+def variants(image):
+    """Миниатюры всех ширин srcset без повторов, от узкой к широкой."""
+    found = {}
+    for width in sorted(settings.POST_THUMBNAIL_WIDTHS):
+        variant = thumbnail(image, width)
+        found.setdefault(variant.width, variant)
+    return list(found.values())
+
+
+def encode(image):
+    """Картинка в IMAGE_FORMAT без метаданных."""
+    buffer = io.BytesIO()
+    if IMAGE_FORMAT == 'JPEG':
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.save(
+            buffer, 'JPEG', quality=settings.POST_IMAGE_QUALITY,
+            optimize=True, progressive=True,
+        )
+    else:
+        image.save(
+            buffer, 'WEBP', quality=settings.POST_IMAGE_QUALITY, method=6
+        )
+    return buffer.getvalue()
+
+
+def optimize(post):
+    """Сжимает оригинал картинки поста и подменяет его в хранилище.
+
+    Возвращает размеры оригинала до и после в байтах. Если один файл
+    делят несколько постов, новое имя получают все они.
+    """
+    name = post.image.name
+    storage = post.image.storage
+    with storage.open(name) as source:
+        data = source.read()
+    with Image.open(io.BytesIO(data)) as original:
+        if getattr(original, 'is_animated', False):
+            return len(data), len(data)
+        has_exif = 'exif' in original.info
+        image = ImageOps.exif_transpose(original)
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    resized = max(image.size) > max_side
+    if resized:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    encoded = encode(image)
+    if not (resized or has_exif) and len(encoded) > len(data) * MIN_GAIN:
+        return len(data), len(data)
+    root = os.path.splitext(name)[0]
+    new_name = storage.save(
+        root + EXTENSIONS[IMAGE_FORMAT], ContentFile(encoded)
+    )
+    if Post.objects.filter(image=name).update(image=new_name):
+        # Старый файл уходит вместе с его миниатюрами.
+        delete(name)
+        post.image.name = new_name
+    else:
+        # Оригинал уже подменила параллельная задача.
+        storage.delete(new_name)
+        post.image.name = Post.objects.values_list(
+            'image', flat=True
+        ).get(pk=post.pk)
+    return len(data), len(encoded)
+
+
+def schedule(post_id):
+    """Запускает задачу миниатюры поста после коммита."""
+    if settings.THUMBNAIL_WORKERS:
+        transaction.on_commit(lambda: get_executor().submit(run, post_id))
+    else:
+        transaction.on_commit(lambda: run(post_id))
+
+
+def enqueue(post):
+    """Ставит миниатюру поста в очередь и запускает её после коммита."""
+    ThumbnailJob.objects.update_or_create(
+        post=post, defaults={'status': ThumbnailJob.PENDING}
+    )
+    schedule(post.pk)
+
+
+def enqueue_many(post_ids):
+    """То же для новых постов из массового импорта."""
+    ThumbnailJob.objects.bulk_create(
+        (ThumbnailJob(post_id=pk) for pk in post_ids),
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    for pk in post_ids:
+        schedule(pk)
+
+
+def enqueue_missing(post):
+    """Ставит в очередь миниатюру поста, у которого задачи ещё нет:
+    старые посты, правка в админке. Уже созданную задачу не трогает."""
+    _, created = ThumbnailJob.objects.get_or_create(post_id=post.pk)
+    if created:
+        schedule(post.pk)
+
+
+def process(post_id):
+    """Сжимает оригинал, готовит миниатюры и отмечает результат."""
+    post = Post.objects.filter(pk=post_id).only(
+        'image', 'author_id', 'group_id'
+    ).first()
+    if post is None:
+        return
+    status = ThumbnailJob.DONE
+    sizes = {}
+    try:
+        if post.image:
+            optimized = ThumbnailJob.objects.filter(
+                post_id=post_id, optimized_bytes__isnull=False
+            ).exists()
+            if not optimized:
+                # Старые миниатюры удаляются вместе с оригиналом: до
+                # новых ленты показывают заглушку.
+                ThumbnailJob.objects.filter(post_id=post_id).update(
+                    status=ThumbnailJob.PENDING
+                )
+                before, after = optimize(post)
+                sizes = {'original_bytes': before, 'optimized_bytes': after}
+            variants(post.image)
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюру поста %s', post_id)
+        status = ThumbnailJob.FAILED
+    ThumbnailJob.objects.filter(post_id=post_id).update(
+        status=status, attempts=F('attempts') + 1, **sizes
+    )
+    feed_cache.bump(*feed_cache.post_scopes(post.author_id, post.group_id))
+
+
+def run(post_id):
+    # Потоки пула живут долго: соединение с базой каждого задания
+    # закрывается, как в конце обычного запроса.
+    close_old_connections()
+    try:
+        process(post_id)
+    finally:
+        close_old_connections()
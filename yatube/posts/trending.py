@@ -0,0 +1,102 @@
+"""Лента популярного: посты, которые активно комментируют сейчас.
+
+Каждый комментарий весит 2 ** ((created - epoch) / TRENDING_HALF_LIFE),
+а популярность поста — сумма весов его комментариев в поле
+``Post.trending_score``. Вес считается от общей точки отсчёта (epoch), а
+не от текущего момента, поэтому со временем не меняется и порядок постов
+без новых комментариев: новый комментарий лишь прибавляет свой вес к
+посту одним UPDATE, а лента читает начало частичного индекса по
+``trending_score``.
+
+Веса свежих комментариев растут с удалением от точки отсчёта, поэтому
+команда ``update_trending`` периодически переносит её в настоящее:
+умножает все оценки на один множитель (порядок при этом не меняется) и
+обнуляет угасшие, чтобы они выпали из индекса. Если команда долго не
+запускалась, показатель степени ограничен MAX_EXPONENT: веса новых
+комментариев перестают расти, но запись комментария не падает.
+"""
+import math
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Comment, Post, TrendingEpoch
+
+# 2 ** 1024 уже не помещается во float; с запасом, чтобы сумма весов
+# многих комментариев тоже оставалась конечной.
+MAX_EXPONENT = 512
+
+
+def current_epoch():
+    epoch = TrendingEpoch.objects.values_list('epoch', flat=True).first()
+    if epoch is None:
+        epoch = TrendingEpoch.objects.create(epoch=timezone.now()).epoch
+    return epoch
+
+
+def weight(created, epoch):
+    age = (created - epoch).total_seconds()
+    return 2 ** min(age / settings.TRENDING_HALF_LIFE, MAX_EXPONENT)
+
+
+def record(comments, sign=1):
+    """Прибавляет веса комментариев к их постам (``sign=-1`` — вычитает)."""
+    with transaction.atomic():
+        epoch = current_epoch()
+        scores = Counter()
+        for comment in comments:
+            scores[comment.post_id] += sign * weight(comment.created, epoch)
+        for post_id, delta in scores.items():
+            Post.objects.filter(pk=post_id).update(
+                trending_score=Greatest(F('trending_score') + delta, 0.0)
+            )
+
+
+def decay(now=None):
+    """Переносит точку отсчёта в ``now`` и убирает угасшие посты.
+
+    Возвращает число постов, выпавших из ленты.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        factor = 1 / weight(now, current_epoch())
+        Post.objects.filter(trending_score__gt=0).update(
+            trending_score=F('trending_score') * factor
+        )
+        faded = Post.objects.filter(
+            trending_score__gt=0,
+            trending_score__lt=settings.TRENDING_MIN_SCORE,
+        ).update(trending_score=0)
+        TrendingEpoch.objects.all().delete()
+        TrendingEpoch.objects.create(epoch=now)
+    return faded
+
+
+def rebuild(now=None):
+    """Пересчитывает оценки по комментариям с новой точкой отсчёта.
+
+    Учитываются комментарии, чей вес ещё не упал ниже порога.
+    """
+    now = now or timezone.now()
+    half_lives = math.log2(1 / settings.TRENDING_MIN_SCORE)
+    horizon = now - timedelta(
+        seconds=settings.TRENDING_HALF_LIFE * half_lives
+    )
+    scores = Counter()
+    for post_id, created in Comment.objects.filter(
+        created__gte=horizon
+    ).values_list('post_id', 'created').iterator():
+        scores[post_id] += weight(created, now)
+    with transaction.atomic():
+        Post.objects.filter(trending_score__gt=0).update(trending_score=0)
+        for post_id, score in scores.items():
+            if score >= settings.TRENDING_MIN_SCORE:
+                Post.objects.filter(pk=post_id).update(trending_score=score)
+        TrendingEpoch.objects.all().delete()
+        TrendingEpoch.objects.create(epoch=now)
+    return len(scores)
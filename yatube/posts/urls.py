@@ -1,10 +1,11 @@
 from django.urls import path
-from . import views
+from . import api, export, views
 
 app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('groups/', views.group_list, name='groups'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
@@ -12,7 +13,12 @@ urlpatterns = [
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
+    path('posts/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
+    path('search/', views.search_posts, name='search'),
+    path('trending/', views.trending, name='trending'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('export/', export.export_data, name='export'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -23,4 +29,11 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
+    path('api/posts/', api.index, name='api_index'),
+    path('api/group/<slug:slug>/', api.group_posts, name='api_group_list'),
+    path('api/profile/<str:username>/', api.profile, name='api_profile'),
+    path('api/posts/<int:post_id>/', api.post_detail,
+         name='api_post_detail'),
+    path('api/follow/', api.follow_index, name='api_follow_index'),
+    path('api/follow/bulk/', api.follow_bulk, name='api_follow_bulk'),
 ]
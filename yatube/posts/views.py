@@ -1,63 +1,158 @@
+from django.conf import settings
+from django.core.paginator import Paginator
 from django.shortcuts import render, get_object_or_404
-from .models import Post, Group, User, Follow
+from .models import (AuthorStats, Post, Group, GroupStats, User, Follow,
+                     SuggestedAuthor, TimelineEntry)
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import urlencode
+from core.db_router import reads_replica, writes_primary
+from core.throttle import throttle
+from . import feed_cache, search
 from .forms import PostForm, CommentForm
-from .func import make_paginator
-from django.views.decorators.cache import cache_page
+from .func import cached_count, make_comments_page, make_paginator
 
 
-@cache_page(20, key_prefix='index_page')
+@reads_replica
 def index(request):
-    post_list = Post.objects.all()
-    page_obj = make_paginator(request, post_list)
+    post_list = Post.objects.feed()
+    page_obj = make_paginator(
+        request, post_list,
+        count=lambda: cached_count(Post.objects.all(), feed_cache.INDEX),
+    )
     context = {
         'page_obj': page_obj,
+        **feed_cache.fragment_context(request, feed_cache.INDEX),
     }
     return render(request, 'posts/index.html', context)
 
 
+def group_list(request):
+    # Каталог читает готовую статистику одним запросом по индексу.
+    stats = GroupStats.objects.select_related('group').order_by(
+        '-posts_count', 'group'
+    )
+    return render(request, 'posts/groups.html', {'stats': stats})
+
+
+def group_count(group):
+    """Число постов группы из статистики, без неё — COUNT(*)."""
+    try:
+        return group.stats.posts_count
+    except GroupStats.DoesNotExist:
+        return Post.objects.filter(group=group).count()
+
+
+@reads_replica
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = Post.objects.select_related('group').filter(group=group)
-    page_obj = make_paginator(request, posts)
+    group = get_object_or_404(
+        Group.objects.select_related('stats'), slug=slug
+    )
+    posts = Post.objects.feed().filter(group=group)
+    page_obj = make_paginator(request, posts, count=lambda: group_count(group))
     context = {
         'group': group,
         'page_obj': page_obj,
+        **feed_cache.fragment_context(
+            request, feed_cache.group_scope(group.pk)
+        ),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@reads_replica
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    posts = (Post.objects.select_related('author')
-             .filter(author__username=username))
-    page_obj = make_paginator(request, posts)
+    posts = Post.objects.feed().filter(author=author)
+    stats = SimpleLazyObject(lambda: AuthorStats.objects.for_author(author))
+    # Число постов автора ведётся при записи, COUNT(*) не нужен.
+    page_obj = make_paginator(
+        request, posts, count=lambda: stats.posts_count
+    )
     context = {
         'author': author,
+        'stats': stats,
         'page_obj': page_obj,
+        **feed_cache.fragment_context(
+            request, feed_cache.author_scope(author.pk)
+        ),
     }
     if request.user.is_authenticated:
         context['following'] = (
             Follow.objects.filter(user=request.user, author=author).exists()
         )
+        context['suggestions'] = [
+            suggestion for suggestion
+            in SuggestedAuthor.objects.for_user(request.user)
+            if suggestion.author_id != author.pk
+        ]
     return render(request, 'posts/profile.html', context)
 
 
+@reads_replica
 def post_detail(request, post_id):
-    post = Post.objects.get(id=post_id)
-    count = (Post.objects.select_related('author')
-             .filter(author__username=post.author).count())
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group')
+        .with_thumbnail_state(),
+        id=post_id,
+    )
+    count = AuthorStats.objects.for_author(post.author).posts_count
     form = CommentForm()
     context = {
         'count': count,
         'post': post,
         'form': form,
+        'comments': make_comments_page(request, post),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    context = {
+        'post': post,
+        'comments': make_comments_page(request, post),
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
+def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    ids = search.post_ids(query, settings.SEARCH_RESULTS_LIMIT)
+    page_obj = Paginator(ids, settings.POSTS_COUNT).get_page(
+        request.GET.get('page')
+    )
+    posts = Post.objects.feed().in_bulk(page_obj.object_list)
+    page_obj.object_list = [
+        posts[pk] for pk in page_obj.object_list if pk in posts
+    ]
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'extra_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def trending(request):
+    # Начало частичного индекса по популярности; страницы — как в поиске.
+    ids = list(Post.objects.trending().values_list(
+        'pk', flat=True
+    )[:settings.TRENDING_SIZE])
+    page_obj = Paginator(ids, settings.POSTS_COUNT).get_page(
+        request.GET.get('page')
+    )
+    posts = Post.objects.feed().in_bulk(page_obj.object_list)
+    page_obj.object_list = [
+        posts[pk] for pk in page_obj.object_list if pk in posts
+    ]
+    return render(request, 'posts/trending.html', {'page_obj': page_obj})
+
+
 @login_required
+@throttle('post_create')
+@writes_primary
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if request.method == 'POST':
@@ -73,6 +168,7 @@ def post_create(request):
 
 
 @login_required
+@writes_primary
 def post_edit(request, post_id):
     post = Post.objects.get(id=post_id)
     if post.author.username != request.user.username:
@@ -95,6 +191,8 @@ def post_edit(request, post_id):
 
 
 @login_required
+@throttle('add_comment')
+@writes_primary
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -107,16 +205,20 @@ def add_comment(request, post_id):
 
 
 @login_required
+@reads_replica
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
+    post_list = TimelineEntry.objects.posts_for(request.user).feed()
     page_obj = make_paginator(request, post_list)
     context = {
         'page_obj': page_obj,
+        'suggestions': SuggestedAuthor.objects.for_user(request.user),
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@throttle('profile_follow', methods=None)
+@writes_primary
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if (
@@ -129,6 +231,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@writes_primary
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
@@ -2,6 +2,57 @@ import os
 
 # Constants
 POSTS_COUNT = 10
+COMMENTS_COUNT = 20
+# Длина материализованной ленты подписок одного пользователя
+TIMELINE_LENGTH = 800
+# Посты авторов с большим числом подписчиков не раскладываются по лентам,
+# а подмешиваются при чтении
+TIMELINE_FANOUT_LIMIT = 10000
+# Миниатюры картинок постов готовятся заранее в фоновых потоках;
+# 0 — синхронно после сохранения
+THUMBNAIL_WORKERS = int(os.environ.get('YATUBE_THUMBNAIL_WORKERS', 2))
+POST_THUMBNAIL_GEOMETRY = '960x339'
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+# Ширины миниатюры для srcset; больше основной картинки не растягиваются
+POST_THUMBNAIL_WIDTHS = (480, 960, 1440)
+# Загружаемые картинки: предельный размер файла и число пикселей.
+# Оригинал в фоне поворачивается по EXIF, теряет метаданные, ужимается
+# до POST_IMAGE_MAX_SIDE по длинной стороне и перекодируется.
+POST_IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 50_000_000
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_QUALITY = 82
+# Время жизни фрагментов лент; актуальность обеспечивают версии ключей
+FEED_CACHE_TIMEOUT = 60 * 60
+# Сколько самых релевантных постов показывает поиск
+SEARCH_RESULTS_LIMIT = 1000
+# Сколько имён принимает массовая подписка за один запрос
+BULK_FOLLOW_LIMIT = 1000
+# Рекомендации авторов: сколько хранить на читателя и сколько показывать
+SUGGESTIONS_PER_USER = 20
+SUGGESTIONS_SHOWN = 5
+# Ограничение записей по пользователю и по IP: '<число>/<s|m|h|d>' на
+# представление, см. core.throttle
+THROTTLE_RATES = {
+    'post_create': '20/h',
+    'add_comment': '10/m',
+    'profile_follow': '30/m',
+    'follow_bulk': '10/m',
+}
+# Заголовок с адресом клиента от доверенного обратного прокси (например
+# HTTP_X_FORWARDED_FOR) и число прокси, дописывающих в него адрес; без
+# заголовка бакет по IP строится по REMOTE_ADDR
+THROTTLE_IP_HEADER = os.environ.get('YATUBE_THROTTLE_IP_HEADER') or None
+THROTTLE_TRUSTED_PROXIES = int(
+    os.environ.get('YATUBE_THROTTLE_TRUSTED_PROXIES', 1)
+)
+# Популярное: за сколько секунд вес комментария падает вдвое, порог
+# угасания (вес одного комментария десять периодов назад) и длина ленты
+TRENDING_HALF_LIFE = 6 * 60 * 60
+TRENDING_MIN_SCORE = 2 ** -10
+TRENDING_SIZE = 100
+# Сколько самых активных авторов показывать в каталоге групп
+GROUP_TOP_AUTHORS = 3
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -39,6 +90,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,11 +103,24 @@ MIDDLEWARE = [
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+# Боевой режим шаблонов: скомпилированные шаблоны хранятся в памяти
+# процесса и все компилируются заранее при запуске (core.apps). При
+# разработке шаблоны перечитываются с диска на каждый запрос.
+TEMPLATE_CACHE = os.environ.get(
+    'YATUBE_TEMPLATE_CACHE', '0' if DEBUG else '1'
+) == '1'
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if TEMPLATE_CACHE:
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+    ]
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.instrumented.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -64,6 +129,7 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
             ],
+            'loaders': TEMPLATE_LOADERS,
         },
     },
 ]
@@ -76,11 +142,44 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # sqlite3 Django с PRAGMA и режимом транзакций из OPTIONS
+        'ENGINE': 'core.db_backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение воркера переживает запросы, а с ним и кеш страниц
+        'CONN_MAX_AGE': int(os.environ.get('YATUBE_CONN_MAX_AGE', 600)),
+        'OPTIONS': {
+            # WAL пускает читателей параллельно с писателем, писатель ждёт
+            # блокировку до busy_timeout мс, mmap_size и cache_size
+            # (отрицательный — в КиБ) держат горячие страницы в памяти
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'busy_timeout': 5000,
+                'mmap_size': 256 * 1024 * 1024,
+                'cache_size': -64 * 1024,
+                'temp_store': 'MEMORY',
+            },
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Реплики для чтения: YATUBE_REPLICAS=2 добавляет replica_1 и replica_2 —
+# файлы-копии основной базы, которые обновляет команда sync_replicas.
+# Представления лент читают с реплик, см. core.db_router.
+REPLICA_COUNT = int(os.environ.get('YATUBE_REPLICAS', 0))
+DATABASE_REPLICAS = []
+for number in range(1, REPLICA_COUNT + 1):
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'NAME': os.path.join(BASE_DIR, f'db.replica_{number}.sqlite3'),
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+# Сколько секунд после записи пользователь читает с основной базы;
+# не меньше интервала sync_replicas
+REPLICA_STICKY_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -141,8 +240,21 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 # Cache
+# locmem — отдельный кеш в каждом процессе (разработка),
+# sqlite — общий файл для всех воркеров на одном хосте
+CACHE_BACKEND = os.environ.get('YATUBE_CACHE_BACKEND', 'locmem')
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'core.cache_backends.locmem.LocMemCache',
+    },
+    'sqlite': {
+        'BACKEND': 'core.cache_backends.sqlite.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    'default': CACHE_BACKENDS[CACHE_BACKEND],
 }
@@ -3,8 +3,12 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import instrumentation_report
+
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
+    path('admin/instrumentation/', instrumentation_report,
+         name='instrumentation'),
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),